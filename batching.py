@@ -0,0 +1,108 @@
+# batching.py
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from model_executor import run_in_model_executor
+
+
+class MicroBatcher:
+    """
+    Agrupa las peticiones que llegan dentro de una ventana corta (`max_wait_ms`),
+    hasta `max_batch_size`, y las resuelve con una sola llamada a `batch_fn`
+    en el pool de inferencia. Cada llamador recibe el resultado de su elemento.
+
+    `batch_fn` recibe una lista de elementos y devuelve una secuencia de
+    resultados en el mismo orden.
+    """
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int, max_wait_ms: float):
+        self.name = name
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Estadísticas
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._total_batch_time = 0.0
+
+    async def start(self):
+        """Lanza la tarea que arma y procesa los lotes."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name=f"batcher-{self.name}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, item: Any) -> Any:
+        """Encola un elemento y espera el resultado de su lote."""
+        if self._task is None:
+            # Por si se usa fuera del lifespan de la app.
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.monotonic()))
+        return await future
+
+    async def _collect_batch(self) -> List[tuple]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        # Lo que ya esté esperando entra en este mismo lote sin esperar más.
+        while len(batch) < self._max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            started_at = time.monotonic()
+            for _, _, enqueued_at in batch:
+                wait = started_at - enqueued_at
+                self._total_queue_wait += wait
+                self._max_queue_wait = max(self._max_queue_wait, wait)
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = await run_in_model_executor(self._batch_fn, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
+            self._batches += 1
+            self._items += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._total_batch_time += time.monotonic() - started_at
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño de los lotes y tiempos de espera en cola."""
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "avg_queue_wait_ms": round(self._total_queue_wait / self._items * 1000, 2) if self._items else 0.0,
+            "max_queue_wait_ms": round(self._max_queue_wait * 1000, 2),
+            "avg_batch_ms": round(self._total_batch_time / self._batches * 1000, 2) if self._batches else 0.0,
+        }
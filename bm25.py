@@ -0,0 +1,61 @@
+# bm25.py
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+# Vectores dispersos estilo BM25 para la búsqueda híbrida.
+# Cada término se mapea a un índice con un hash estable (igual en todos los procesos).
+# El documento guarda la parte de frecuencia de BM25; el IDF lo calcula Qdrant
+# con el modificador IDF de la colección, así no hay que mantener estadísticas del corpus.
+K1 = 1.2
+B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a al ante bajo con contra de del desde durante e el ella en entre es esa ese eso esta este esto hasta
+la las le les lo los mas me mi no o para pero por que se segun si sin sobre su sus tambien te tu un una
+uno unos unas y ya como cual cuales cuando donde quien son fue ser ha han hay
+""".split())
+
+SparseVector = Tuple[List[int], List[float]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes y sin palabras vacías. Conserva siglas y números ("rsp", "7125")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN_PATTERN.findall(text) if len(token) > 1 and token not in STOPWORDS]
+
+
+def _index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse(weights: Counter) -> SparseVector:
+    # Dos términos distintos pueden compartir índice; sus pesos se suman.
+    merged: Counter = Counter()
+    for token, weight in weights.items():
+        merged[_index(token)] += weight
+    indices = sorted(merged)
+    return indices, [float(merged[i]) for i in indices]
+
+
+def encode_document(text: str, avg_doc_length: float) -> SparseVector:
+    """Pesos de frecuencia BM25 de los términos del documento."""
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    length_norm = K1 * (1 - B + B * len(tokens) / avg_doc_length)
+    weights = Counter({
+        token: tf * (K1 + 1) / (tf + length_norm)
+        for token, tf in Counter(tokens).items()
+    })
+    return _to_sparse(weights)
+
+
+def encode_query(text: str) -> SparseVector:
+    """Cada término de la consulta pesa 1; Qdrant aplica el IDF."""
+    return _to_sparse(Counter({token: 1.0 for token in tokenize(text)}))
@@ -0,0 +1,174 @@
+# caching.py
+import asyncio
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un texto para usarlo como clave de caché (minúsculas y espacios colapsados)."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class LRUCache:
+    """
+    Caché en memoria con desalojo LRU, acotada por cantidad de entradas y,
+    opcionalmente, por memoria (`max_bytes`) y por antigüedad (`ttl_seconds`).
+    Es segura entre hilos y lleva contadores de aciertos y fallos.
+    """
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+    ):
+        self.name = name
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        # clave -> (valor, tamaño en bytes, vencimiento)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        size = self._sizeof(value)
+        if self._max_bytes is not None and size > self._max_bytes:
+            return
+        expires_at = time.monotonic() + self._ttl if self._ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._data) > self._max_entries or (
+                self._max_bytes is not None and self._bytes > self._max_bytes
+            ):
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self._evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Indica si la clave está vigente, sin afectar el orden ni los contadores."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[2] is None or entry[2] >= time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self._max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+        }
+
+
+class _LeaderCancelled(Exception):
+    """La computación compartida se canceló junto con el pedido que la encabezaba."""
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas en curso ("single flight"): si ya hay una computación
+    con la misma clave, las siguientes esperan su resultado (o su excepción) en
+    lugar de repetirla. No guarda nada: al terminar, la clave queda libre.
+    Si se cancela el pedido que encabeza la computación, los que esperaban no se
+    cancelan: vuelven a intentar (uno de ellos pasa a encabezarla).
+    Se usa desde el event loop (no es segura entre hilos).
+    """
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._calls = 0
+        self._coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self._calls += 1
+        if not self.enabled:
+            return await fn()
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._coalesced += 1
+        while future is not None:
+            try:
+                # shield: si se cancela quien espera, la computación compartida sigue.
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                future = self._in_flight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        # Marca la excepción como leída aunque nadie más espere (evita el aviso de asyncio).
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # No se cancela el future: eso cancelaría a los que esperan, que no lo pidieron.
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self._calls,
+            "coalesced": self._coalesced,
+            "coalesced_rate": round(self._coalesced / self._calls, 4) if self._calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
@@ -16,6 +16,23 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini") # 'gemini' por defecto
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST")
+# Límite de generaciones simultáneas y timeout (segundos) por proveedor
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", 2))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 120))
+# Tiempo que Ollama mantiene el modelo en memoria tras cada pedido ("30m", o segundos; -1 = siempre).
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Opciones del modelo (0 = default de Ollama): ventana de contexto, hilos de CPU y
+# máximo de tokens a generar. num_ctx debe alcanzar para PROMPT_CONTEXT_MAX_TOKENS más la respuesta.
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", 4096))
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", 0))
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", 0))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 60))
+
+# Contexto del prompt: presupuesto de tokens para los chunks (0 = sin límite)
+# y caracteres por token con los que se estiman (~3.5 en español).
+PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", 1500))
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", 3.5))
 
 # --- Rutas de Archivos ---
 CHROMA_DATA_PATH = "chroma_db"
@@ -28,6 +45,133 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 # Puedes cambiarlo por otros modelos de SentenceTransformers si lo deseas.
 # https://www.sbert.net/docs/pretrained_models.html
 EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+# Micro-batching de embeddings de consultas: tamaño máximo del lote y
+# ventana (ms) para juntar peticiones concurrentes.
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+# Caché de embeddings de consultas (LRU). TTL en segundos; 0 = sin vencimiento.
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 10000))
+QUERY_EMBEDDING_CACHE_MAX_MB = float(os.getenv("QUERY_EMBEDDING_CACHE_MAX_MB", 32))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 0))
+
+# --- Escáner de inyección de prompts ---
+# Lote de escaneos concurrentes en una sola pasada del modelo.
+INJECTION_BATCH_MAX_SIZE = int(os.getenv("INJECTION_BATCH_MAX_SIZE", 16))
+INJECTION_BATCH_MAX_WAIT_MS = float(os.getenv("INJECTION_BATCH_MAX_WAIT_MS", 5))
+# Caché de veredictos por texto escaneado (exacto, distingue mayúsculas). TTL en segundos; 0 = sin vencimiento.
+INJECTION_CACHE_MAX_ENTRIES = int(os.getenv("INJECTION_CACHE_MAX_ENTRIES", 10000))
+INJECTION_CACHE_TTL = float(os.getenv("INJECTION_CACHE_TTL", 0))
+# Largo máximo (caracteres) del texto que se pasa al modelo; 0 = sin límite.
+INJECTION_SCAN_MAX_CHARS = int(os.getenv("INJECTION_SCAN_MAX_CHARS", 2000))
+
+# --- Caché de respuestas del RAG ---
+# Se invalida en cada ingesta. TTL en segundos; 0 = sin vencimiento.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 86400))
+# Similitud coseno mínima para reutilizar la respuesta de una consulta casi idéntica
+# (con el mismo filtro de metadatos). 0 = solo coincidencia exacta.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0))
+# Preguntas idénticas (normalizadas) que llegan mientras otra igual se está respondiendo
+# esperan esa respuesta en lugar de repetir escaneo, búsqueda y LLM.
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+# --- Almacén vectorial ---
+# "qdrant" (servidor) o "numpy" (índice local en el mismo proceso, para despliegues chicos).
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "qdrant").lower()
+LOCAL_VECTOR_STORE_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", "data/vector_store")
+# Desde esta cantidad de puntos, la búsqueda local sin filtros usa IVF (0 = siempre exacta)
+# y recorre las NPROBE listas más cercanas a la consulta.
+LOCAL_VECTOR_STORE_IVF_MIN_POINTS = int(os.getenv("LOCAL_VECTOR_STORE_IVF_MIN_POINTS", 100000))
+LOCAL_VECTOR_STORE_IVF_NPROBE = int(os.getenv("LOCAL_VECTOR_STORE_IVF_NPROBE", 8))
+
+# --- Qdrant ---
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+# Búsqueda híbrida: vectores densos + dispersos (BM25) combinados con RRF.
+# Solo aplica a colecciones creadas con esta opción activa.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Candidatos que aporta cada búsqueda (densa y dispersa) antes de la fusión.
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", 20))
+# Largo medio (en términos) de un chunk, para normalizar las frecuencias BM25.
+BM25_AVG_DOC_LENGTH = float(os.getenv("BM25_AVG_DOC_LENGTH", 150))
+# Cuantización de los vectores densos: "none", "int8" (4x menos memoria) o "binary" (32x).
+# Con re-puntuación, los candidatos se reordenan con los vectores originales
+# (se traen `oversampling` veces más candidatos).
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+# Cuantil de los valores que define el rango de int8 (los extremos se recortan).
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", 0.99))
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", 2.0))
+# Índice HNSW: enlaces por nodo y tamaño de la búsqueda al construir / al consultar (0 = default de Qdrant).
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 100))
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", 0))
+# Vectores originales y payloads en disco (mmap) en lugar de RAM. Payloads en disco es el default de Qdrant.
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+QDRANT_PAYLOAD_ON_DISK = os.getenv("QDRANT_PAYLOAD_ON_DISK", "true").lower() == "true"
+# Texto de los chunks en un almacén local (mmap) en lugar del payload de Qdrant.
+# Aplica a lo que se ingiera con la opción activa; lo anterior sigue leyéndose del payload.
+CHUNK_TEXT_STORE = os.getenv("CHUNK_TEXT_STORE", "false").lower() == "true"
+CHUNK_TEXT_STORE_DIR = os.getenv("CHUNK_TEXT_STORE_DIR", "data/chunk_texts")
+# Cada cuántos segundos se refrescan en segundo plano los datos de la colección
+# (cantidad de puntos) que usan las búsquedas.
+COLLECTION_STATS_REFRESH_SECONDS = float(os.getenv("COLLECTION_STATS_REFRESH_SECONDS", 30))
+
+# --- Concurrencia ---
+# Hilos dedicados a la inferencia de modelos (embeddings, escáner de inyección)
+# para que no bloqueen el event loop. Acotado para no saturar la CPU.
+MODEL_EXECUTOR_WORKERS = int(os.getenv("MODEL_EXECUTOR_WORKERS", 2))
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
\ No newline at end of file
+TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+
+# --- Cola de mensajes de Telegram ---
+# Workers que procesan mensajes en segundo plano (los de un mismo chat, en orden).
+TELEGRAM_WORKERS = int(os.getenv("TELEGRAM_WORKERS", 4))
+# Máximo de mensajes encolados; por encima el webhook responde 503 y Telegram reintenta.
+TELEGRAM_QUEUE_MAX_PENDING = int(os.getenv("TELEGRAM_QUEUE_MAX_PENDING", 1000))
+
+# --- Envíos a Telegram ---
+# Cliente HTTP compartido (keep-alive + HTTP/2)
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", 20))
+TELEGRAM_HTTP_TIMEOUT = float(os.getenv("TELEGRAM_HTTP_TIMEOUT", 10))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+# Límites de envío de Telegram: ~30 mensajes/s en total, 1/s por chat y 20/min por grupo.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))
+TELEGRAM_GROUP_CHAT_INTERVAL = float(os.getenv("TELEGRAM_GROUP_CHAT_INTERVAL", 3.0))
+# Respuestas progresivas: el mensaje "Procesando⏳" se edita a medida que el LLM genera texto.
+TELEGRAM_STREAMING = os.getenv("TELEGRAM_STREAMING", "true").lower() == "true"
+# Segundos mínimos entre ediciones del mensaje durante el streaming.
+TELEGRAM_STREAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_STREAM_EDIT_INTERVAL", 1.5))
+
+# --- Pipeline de ingesta ---
+# Procesos para parsear PDFs, tamaño de los lotes de embeddings (mezclando documentos),
+# tamaño de cada upsert a Qdrant y cuántos upserts pueden estar en vuelo a la vez.
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", 64))
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", 256))
+INGEST_UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", 2))
+# Cada PDF del ZIP se lee a memoria hasta este tamaño (MB); por encima se vuelca a disco.
+INGEST_SPOOL_MAX_MB = int(os.getenv("INGEST_SPOOL_MAX_MB", 16))
+# Ingesta incremental: los archivos sin cambios se saltean y los embeddings de
+# chunks ya conocidos se reutilizan. El manifiesto (SQLite) guarda ambos datos.
+INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "data/ingestion_manifest.db")
+
+# --- Extracción de texto de PDFs ---
+# Backend: "pypdf" o "pymupdf" (más rápido, requiere `pip install pymupdf`).
+PDF_EXTRACTION_BACKEND = os.getenv("PDF_EXTRACTION_BACKEND", "pypdf")
+# Texto extraído guardado por hash del archivo; vacío = sin caché.
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", "data/pdf_text_cache")
+# Tamaño máximo de esa caché (MB); al superarlo se borran las entradas usadas hace más tiempo. 0 = sin límite.
+PDF_TEXT_CACHE_MAX_MB = float(os.getenv("PDF_TEXT_CACHE_MAX_MB", 512))
+# Procesos para extraer en paralelo las páginas de un mismo PDF grande (1 = desactivado;
+# la ingesta ya reparte los documentos entre INGEST_PARSE_WORKERS procesos).
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 200))
+# Trabajos de ingesta en segundo plano: cuántos corren a la vez y cuántos se recuerdan.
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 1))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 100))
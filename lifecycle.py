@@ -0,0 +1,73 @@
+# lifecycle.py
+import asyncio
+import time
+from typing import Any, Dict
+
+import vector_db
+from llm_handler import llm_registry
+from vector_store import setup_vector_store, vector_store
+from model_executor import run_in_model_executor
+from services import prevent_injection_service
+
+# Componentes que deben estar listos antes de recibir tráfico (ver /readyz).
+components: Dict[str, Dict[str, Any]] = {
+    name: {"ready": False, "error": None, "seconds": None}
+    for name in ("embedding_model", "injection_scanner", "vector_store")
+}
+
+async def _init_component(name: str, coro):
+    started_at = time.monotonic()
+    try:
+        await coro
+        components[name]["ready"] = True
+    except Exception as e:
+        components[name]["error"] = str(e)
+        print(f"❌ Error inicializando '{name}': {e}")
+    finally:
+        components[name]["seconds"] = round(time.monotonic() - started_at, 2)
+
+async def _load_embedding_model():
+    model = await run_in_model_executor(vector_db.get_embedding_model)
+    # Inferencia de calentamiento: la primera pasada es mucho más lenta que las siguientes.
+    await run_in_model_executor(model.encode, ["calentamiento"])
+
+async def _load_injection_scanner():
+    scanner = await run_in_model_executor(prevent_injection_service.get_scanner)
+    await run_in_model_executor(scanner.scan, "calentamiento")
+
+async def _setup_vector_store(embedding_model_loaded: asyncio.Task):
+    # El tamaño de los vectores depende del modelo: se espera a que termine de cargar.
+    await embedding_model_loaded
+    # Si la carga falló, pedir el modelo acá lo volvería a cargar bloqueando el event loop.
+    if not components["embedding_model"]["ready"]:
+        raise RuntimeError("no se pudo cargar el modelo de embeddings")
+    model = vector_db.get_embedding_model()
+    await setup_vector_store(model.get_sentence_embedding_dimension())
+
+async def initialize_components():
+    """
+    Carga los modelos y prepara el almacén vectorial en paralelo. Se lanza en segundo plano
+    desde el lifespan, así la app responde /healthz mientras tanto.
+    """
+    print("🔄 Inicializando modelos y base de datos...")
+    embedding_task = asyncio.create_task(_init_component("embedding_model", _load_embedding_model()))
+    await asyncio.gather(
+        embedding_task,
+        _init_component("injection_scanner", _load_injection_scanner()),
+        _init_component("vector_store", _setup_vector_store(embedding_task)),
+    )
+    if all(component["ready"] for component in components.values()):
+        print("✅ Todos los componentes están listos.")
+    # El LLM no es requisito para /readyz (si falla, el primer pedido carga el modelo).
+    await llm_registry.preload()
+
+async def readiness() -> Dict[str, Any]:
+    """Estado de cada componente y si el almacén vectorial responde en este momento."""
+    store_reachable = await vector_store.is_reachable()
+    ready = store_reachable and all(component["ready"] for component in components.values())
+    return {
+        "ready": ready,
+        "vector_store": vector_store.name,
+        "vector_store_reachable": store_reachable,
+        "components": components,
+    }
@@ -1,30 +1,69 @@
 # llm_handler.py
+import asyncio
+import threading
+import time
 import config
 import google.generativeai as genai
+import httpx
 import ollama
 from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional
+
+from metrics import LatencyRecorder
 
 # ------------------- DEFINICIÓN DE LA INTERFAZ (CLASE ABSTRACTA) -------------------
+class StreamError(str):
+    """
+    Mensaje de error que entrega `generate_stream` cuando la generación falla,
+    aunque ya se hayan enviado fragmentos. Se muestra como cualquier fragmento,
+    pero quien arma la respuesta completa puede detectarlo (p. ej. para no cachearla).
+    """
+
 class LLM(ABC):
     """
     Clase Base Abstracta que define la interfaz para cualquier modelo de lenguaje.
     Cualquier nuevo LLM que se agregue deberá heredar de esta clase.
     """
     @abstractmethod
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, system: Optional[str] = None) -> str:
         """
         Método que toma un prompt y devuelve la respuesta generada por el modelo.
+        `system` son las instrucciones fijas, que van antes del prompt.
         """
         pass
 
+    @abstractmethod
+    async def agenerate(self, prompt: str, system: Optional[str] = None) -> str:
+        """
+        Versión asíncrona de `generate`. Debe usar un cliente asíncrono para
+        no bloquear el event loop mientras se espera al modelo.
+        """
+        pass
+
+    async def generate_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Devuelve la respuesta en fragmentos a medida que el modelo los genera.
+        Por defecto entrega la respuesta completa de una vez; los proveedores
+        que soportan streaming sobrescriben este método. Si la generación falla,
+        el último fragmento es un `StreamError` con el mensaje para el usuario.
+        """
+        yield await self.agenerate(prompt, system)
+
+    async def preload(self, system: Optional[str] = None):
+        """Deja el modelo listo antes del primer pedido. Por defecto no hace nada."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
 # ------------------- IMPLEMENTACIÓN PARA GEMINI -------------------
 class GeminiLLM(LLM):
     """Implementación concreta para el modelo de Google Gemini."""
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, timeout: float = 60):
         if not api_key:
             raise ValueError("No se proporcionó la API Key de Google Gemini.")
         
         genai.configure(api_key=api_key)
+        self.request_options = {"timeout": timeout}
         
         generation_config = {
             "temperature": 0.2,
@@ -45,72 +84,305 @@ class GeminiLLM(LLM):
             safety_settings=safety_settings
         )
 
-    def generate(self, prompt: str) -> str:
+    @staticmethod
+    def _contents(prompt: str, system: Optional[str]) -> str:
+        # Las instrucciones se envían delante del prompt, como siempre.
+        return f"{system}\n{prompt}" if system else prompt
+
+    def generate(self, prompt: str, system: Optional[str] = None) -> str:
+        try:
+            response = self.model.generate_content(self._contents(prompt, system), request_options=self.request_options)
+            return response.text
+        except Exception as e:
+            print(f"Error al contactar la API de Gemini: {e}")
+            return "Hubo un error al generar la respuesta con Gemini. Por favor, intenta de nuevo más tarde."
+
+    async def agenerate(self, prompt: str, system: Optional[str] = None) -> str:
         try:
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(
+                self._contents(prompt, system), request_options=self.request_options
+            )
             return response.text
         except Exception as e:
             print(f"Error al contactar la API de Gemini: {e}")
             return "Hubo un error al generar la respuesta con Gemini. Por favor, intenta de nuevo más tarde."
 
+    async def generate_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        try:
+            response = await self.model.generate_content_async(
+                self._contents(prompt, system), stream=True, request_options=self.request_options
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Error al contactar la API de Gemini: {e}")
+            yield StreamError("Hubo un error al generar la respuesta con Gemini. Por favor, intenta de nuevo más tarde.")
+
 # ------------------- IMPLEMENTACIÓN PARA OLLAMA -------------------
 class OllamaLLM(LLM):
-    """Implementación concreta para modelos servidos a través de Ollama."""
-    def __init__(self, model: str, host: str = None):
+    """
+    Implementación concreta para modelos servidos a través de Ollama.
+    - Las instrucciones fijas van como mensaje de sistema, idéntico y al principio
+      en todos los pedidos: Ollama reutiliza la caché KV de ese prefijo y solo
+      procesa (prefill) el contexto y la pregunta.
+    - `keep_alive` mantiene el modelo cargado entre ráfagas de mensajes.
+    - `options` (num_ctx, num_thread, num_predict) se envían en cada pedido; num_ctx
+      debe ser siempre el mismo, porque cambiarlo obliga a Ollama a recargar el modelo.
+    """
+    def __init__(
+        self, model: str, host: str = None, timeout: float = 120, max_connections: int = 4,
+        keep_alive=None, options: Optional[Dict[str, Any]] = None,
+    ):
         self.model = model
-        # Si se especifica un host, se crea un cliente para ese host.
-        # De lo contrario, usará el host por defecto (localhost:11434).
-        self.client = ollama.Client(host=host) if host else ollama.Client()
+        self.keep_alive = keep_alive
+        self.options = options or None
+        # Si no se especifica un host, se usa el host por defecto (localhost:11434).
+        # Los clientes se crean una sola vez y reutilizan su pool de conexiones.
+        client_options = {
+            "timeout": timeout,
+            "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        }
+        self.client = ollama.Client(host=host, **client_options)
+        self.async_client = ollama.AsyncClient(host=host, **client_options)
+        # Tiempos que informa Ollama en cada respuesta.
+        self.prefill_latency = LatencyRecorder()
+        self._stats_lock = threading.Lock()
+        self._prompt_tokens = 0
+        self._responses = 0
+        self._model_loads = 0
+
+    def _request(self, prompt: str, system: Optional[str]) -> Dict[str, Any]:
+        messages = [{'role': 'system', 'content': system}] if system else []
+        messages.append({'role': 'user', 'content': prompt})
+        return {"model": self.model, "messages": messages, "options": self.options, "keep_alive": self.keep_alive}
+
+    def _record(self, response):
+        """Registra el prefill (prompt_eval) y si hubo que cargar el modelo."""
+        prompt_eval_ns = getattr(response, 'prompt_eval_duration', None)
+        if prompt_eval_ns is not None:
+            self.prefill_latency.record(prompt_eval_ns / 1e9)
+        with self._stats_lock:
+            self._responses += 1
+            self._prompt_tokens += getattr(response, 'prompt_eval_count', None) or 0
+            # Una carga de más de un segundo indica que el modelo no estaba en memoria.
+            if (getattr(response, 'load_duration', None) or 0) > 1e9:
+                self._model_loads += 1
 
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, system: Optional[str] = None) -> str:
         try:
-            response = self.client.chat(
-                model=self.model,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
+            response = self.client.chat(**self._request(prompt, system))
+            self._record(response)
+            return response['message']['content']
+        except Exception as e:
+            print(f"Error al contactar el servidor de Ollama: {e}")
+            return "Hubo un error al generar larespuesta con Ollama. Asegúrate de que el servidor de Ollama esté en ejecución."
+
+    async def agenerate(self, prompt: str, system: Optional[str] = None) -> str:
+        try:
+            response = await self.async_client.chat(**self._request(prompt, system))
+            self._record(response)
             return response['message']['content']
         except Exception as e:
             print(f"Error al contactar el servidor de Ollama: {e}")
             return "Hubo un error al generar larespuesta con Ollama. Asegúrate de que el servidor de Ollama esté en ejecución."
 
+    async def generate_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        try:
+            stream = await self.async_client.chat(**self._request(prompt, system), stream=True)
+            async for part in stream:
+                content = part['message']['content']
+                if content:
+                    yield content
+                if part.get('done'):
+                    self._record(part)
+        except Exception as e:
+            print(f"Error al contactar el servidor de Ollama: {e}")
+            yield StreamError("Hubo un error al generar larespuesta con Ollama. Asegúrate de que el servidor de Ollama esté en ejecución.")
+
+    async def preload(self, system: Optional[str] = None):
+        """Carga el modelo y deja en la caché KV el prefijo de sistema (genera un solo token)."""
+        started_at = time.monotonic()
+        request = self._request("Hola", system)
+        request["options"] = {**(self.options or {}), "num_predict": 1}
+        await self.async_client.chat(**request)
+        print(f"✅ Modelo de Ollama '{self.model}' precargado en {time.monotonic() - started_at:.1f}s.")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            responses, prompt_tokens, model_loads = self._responses, self._prompt_tokens, self._model_loads
+        return {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "options": self.options,
+            "responses": responses,
+            "avg_prompt_tokens": round(prompt_tokens / responses, 1) if responses else 0.0,
+            "model_loads": model_loads,
+            "prefill": self.prefill_latency.stats(),
+        }
+
+# ------------------- LÍMITE DE CONCURRENCIA POR PROVEEDOR -------------------
+class ConcurrencyLimitedLLM(LLM):
+    """
+    Envuelve un LLM y limita cuántas generaciones pueden estar en curso a la vez.
+    Las llamadas que exceden el límite esperan su turno en lugar de saturar al proveedor.
+    """
+    def __init__(self, llm: LLM, max_concurrency: int):
+        self.llm = llm
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = asyncio.Semaphore(max_concurrency)
+
+    def generate(self, prompt: str, system: Optional[str] = None) -> str:
+        with self._sync_slots:
+            return self.llm.generate(prompt, system)
+
+    async def agenerate(self, prompt: str, system: Optional[str] = None) -> str:
+        async with self._async_slots:
+            return await self.llm.agenerate(prompt, system)
+
+    async def generate_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        # El turno se mantiene ocupado mientras dure el streaming.
+        async with self._async_slots:
+            async for chunk in self.llm.generate_stream(prompt, system):
+                yield chunk
+
+    async def preload(self, system: Optional[str] = None):
+        await self.llm.preload(system)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.llm.stats()
+
 # ------------------- FÁBRICA (FACTORY) PARA SELECCIONAR EL LLM -------------------
-def get_llm_instance() -> LLM:
+def ollama_keep_alive():
+    """Ollama acepta una duración ("30m") o segundos (-1 = siempre cargado). Vacío = default del servidor."""
+    value = config.OLLAMA_KEEP_ALIVE
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def ollama_options() -> Dict[str, int]:
+    """Opciones de Ollama definidas en config.py (0 = default del modelo)."""
+    options = {
+        "num_ctx": config.OLLAMA_NUM_CTX,
+        "num_thread": config.OLLAMA_NUM_THREAD,
+        "num_predict": config.OLLAMA_NUM_PREDICT,
+    }
+    return {key: value for key, value in options.items() if value}
+
+def create_llm_instance(provider: str) -> LLM:
     """
-    Lee la configuración y devuelve una instancia del LLM correspondiente.
+    Crea una nueva instancia del LLM indicado, ya envuelta con su límite de concurrencia.
     Este es el único lugar que necesitas modificar si agregas un nuevo proveedor.
     """
-    provider = config.LLM_PROVIDER.lower()
+    provider = provider.lower()
     
     if provider == 'gemini':
-        return GeminiLLM(api_key=config.GOOGLE_API_KEY)
+        llm = GeminiLLM(api_key=config.GOOGLE_API_KEY, timeout=config.GEMINI_TIMEOUT)
+        return ConcurrencyLimitedLLM(llm, config.GEMINI_MAX_CONCURRENCY)
     elif provider == 'ollama':
-        return OllamaLLM(model=config.OLLAMA_MODEL, host=config.OLLAMA_HOST)
+        llm = OllamaLLM(
+            model=config.OLLAMA_MODEL,
+            host=config.OLLAMA_HOST,
+            timeout=config.OLLAMA_TIMEOUT,
+            max_connections=config.OLLAMA_MAX_CONCURRENCY,
+            keep_alive=ollama_keep_alive(),
+            options=ollama_options(),
+        )
+        return ConcurrencyLimitedLLM(llm, config.OLLAMA_MAX_CONCURRENCY)
     else:
         raise ValueError(f"Proveedor de LLM no soportado: {provider}")
 
-# ------------------- FUNCIÓN PRINCIPAL (SIN CAMBIOS EN SU LÓGICA) -------------------
-def generate_answer_from_context(query: str, full_context_with_sources: str) -> str:
+# ------------------- REGISTRO DE PROVEEDORES -------------------
+class LLMRegistry:
     """
-    Construye el prompt y usa el LLM configurado para generar una respuesta.
+    Registro de instancias de LLM de larga duración, seguro entre hilos.
+    Cada proveedor se construye una sola vez (cliente, configuración y pool
+    de conexiones) y se reutiliza en todas las peticiones.
     """
-    if not full_context_with_sources:
-        return "No se encontró información relevante en los documentos para responder."
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instances: Dict[str, LLM] = {}
+
+    def get(self, provider: str) -> LLM:
+        provider = provider.lower()
+        instance = self._instances.get(provider)
+        if instance is None:
+            with self._lock:
+                # Se vuelve a comprobar dentro del lock por si otro hilo ya lo creó.
+                instance = self._instances.get(provider)
+                if instance is None:
+                    instance = create_llm_instance(provider)
+                    self._instances[provider] = instance
+                    print(f"✅ Proveedor de LLM '{provider}' inicializado.")
+        return instance
 
+    def warmup(self):
+        """Crea de antemano el proveedor configurado. Se llama al iniciar la app."""
+        try:
+            self.get(config.LLM_PROVIDER)
+        except Exception as e:
+            # No se impide el arranque: cada petición volverá a intentarlo y reportará el error.
+            print(f"⚠️ No se pudo inicializar el proveedor de LLM '{config.LLM_PROVIDER}': {e}")
+
+    async def preload(self):
+        """Precarga el modelo del proveedor configurado con las instrucciones fijas (ver SYSTEM_PROMPT)."""
+        try:
+            await self.get(config.LLM_PROVIDER).preload(SYSTEM_PROMPT)
+        except Exception as e:
+            # Igual que en warmup: el primer pedido cargará el modelo.
+            print(f"⚠️ No se pudo precargar el modelo del LLM '{config.LLM_PROVIDER}': {e}")
+
+llm_registry = LLMRegistry()
+
+def get_llm_instance() -> LLM:
+    """Devuelve la instancia compartida del LLM configurado en config.LLM_PROVIDER."""
+    return llm_registry.get(config.LLM_PROVIDER)
+
+# ------------------- FUNCIÓN PRINCIPAL (SIN CAMBIOS EN SU LÓGICA) -------------------
+# Instrucciones fijas: se envían como prefijo de sistema, siempre idéntico, para
+# que el proveedor pueda reutilizar lo ya procesado (caché KV de Ollama).
+SYSTEM_PROMPT = (
+    "Eres un asistente experto de la Dirección General de Rentas de Salta, Argentina. Tu tarea es responder la pregunta del usuario basándote estricta y únicamente en el contexto proporcionado.\n"
+    "Si la respuesta no se encuentra en el contexto, di explícitamente: 'Basado en la información proporcionada, no puedo responder a esa pregunta.'\n"
+    "Sé conciso y responde en el mismo idioma que la pregunta."
+)
+
+def build_prompt(query: str, full_context_with_sources: str) -> str:
+    """Construye el mensaje del usuario a partir de la pregunta y el contexto ya formateado."""
     # La construcción del prompt es independiente del LLM, por lo que se mantiene igual.
-    prompt = (
-        "Eres un asistente experto de la Dirección General de Rentas de Salta, Argentina. Tu tarea es responder la pregunta del usuario basándote estricta y únicamente en el contexto proporcionado.\n"
-        "Si la respuesta no se encuentra en el contexto, di explícitamente: 'Basado en la información proporcionada, no puedo responder a esa pregunta.'\n"
-        "Sé conciso y responde en el mismo idioma que la pregunta.\n"
+    return (
         f"**Contexto Proporcionado:**\n'''\n{full_context_with_sources}\n'''\n\n"
         f"**Pregunta del Usuario:**\n{query}\n\n"
         "**Respuesta:**"
     )
-    
+
+async def generate_answer(prompt: str) -> str:
+    """
+    Usa el LLM configurado para generar una respuesta al prompt
+    (armado con build_prompt, ver services/context_packing.py).
+    """
     try:
         # Obtenemos la instancia del LLM configurado (Gemini, Ollama, etc.)
         llm = get_llm_instance()
-        # Generamos la respuesta usando la interfaz común (.generate)
-        return llm.generate(prompt)
+        # Generamos la respuesta usando la interfaz asíncrona común (.agenerate)
+        return await llm.agenerate(prompt, SYSTEM_PROMPT)
+    except Exception as e:
+        print(f"Error al obtener la instancia del LLM o al generar la respuesta: {e}")
+        return "Hubo un error general en el sistema de generación de respuestas."
+
+async def generate_answer_stream(prompt: str) -> AsyncIterator[str]:
+    """
+    Igual que `generate_answer`, pero entrega la respuesta en
+    fragmentos a medida que el LLM los genera. Si la generación falla,
+    el último fragmento es un `StreamError`.
+    """
+    try:
+        llm = get_llm_instance()
+        async for chunk in llm.generate_stream(prompt, SYSTEM_PROMPT):
+            yield chunk
     except Exception as e:
         print(f"Error al obtener la instancia del LLM o al generar la respuesta: {e}")
-        return "Hubo un error general en el sistema de generación de respuestas."
\ No newline at end of file
+        yield StreamError("Hubo un error general en el sistema de generación de respuestas.")
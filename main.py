@@ -1,15 +1,51 @@
+import asyncio
 import os
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 import config
-from routers import document_router, test_router, webhook_router
+from lifecycle import initialize_components
+from llm_handler import llm_registry
+from routers import document_router, health_router, stats_router, test_router, webhook_router
+from services import close_telegram_client, start_telegram_client, telegram_queue
+from services.ingestion_jobs import ingestion_jobs
+from services.prevent_injection_service import injection_batcher
+from vector_db import embedding_batcher
+from vector_store import collection_stats
+
+# --- CICLO DE VIDA ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Modelos y colección de Qdrant se inicializan en segundo plano (ver /readyz)
+    init_task = asyncio.create_task(initialize_components())
+    # Proveedor de LLM (cliente y pool de conexiones) creado una sola vez
+    llm_registry.warmup()
+    # Lote dinámico de embeddings para las consultas
+    await embedding_batcher.start()
+    await injection_batcher.start()
+    # Datos de la colección en caché, refrescados en segundo plano
+    await collection_stats.start()
+    # Cliente HTTP compartido para la API de Telegram
+    await start_telegram_client()
+    # Arranca los workers que procesan los mensajes de Telegram en segundo plano
+    await telegram_queue.start()
+    yield
+    init_task.cancel()
+    await asyncio.gather(init_task, return_exceptions=True)
+    await telegram_queue.stop()
+    await close_telegram_client()
+    await embedding_batcher.stop()
+    await injection_batcher.stop()
+    await collection_stats.stop()
+    ingestion_jobs.shutdown()
 
 # --- INICIALIZACIÓN DE LA APP ---
 app = FastAPI(
     title="Servicio RAG con FastAPI y OpenAI",
     description="Sube PDFs y haz preguntas sobre su contenido usando un LLM.",
     version="3.0.0",
+    lifespan=lifespan,
 )
 
 os.makedirs(config.TEMP_UPLOAD_DIR, exist_ok=True)
@@ -18,6 +54,8 @@ os.makedirs(config.TEMP_UPLOAD_DIR, exist_ok=True)
 app.include_router(document_router.router)
 app.include_router(test_router.router)
 app.include_router(webhook_router.router)
+app.include_router(stats_router.router)
+app.include_router(health_router.router)
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -26,4 +64,4 @@ def read_root():
 
 # --- EJECUCIÓN ---
 if __name__ == "__main__":
-    uvicorn.run(app, host=config.HOST, port=config.PORT)
\ No newline at end of file
+    uvicorn.run(app, host=config.HOST, port=config.PORT)
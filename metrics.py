@@ -0,0 +1,40 @@
+# metrics.py
+import threading
+from collections import deque
+from typing import Any, Dict
+
+
+class LatencyRecorder:
+    """
+    Guarda las últimas `window` latencias (en segundos) y calcula percentiles.
+    Es segura entre hilos.
+    """
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Cantidad total de mediciones y percentiles (ms) de la ventana reciente."""
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {"count": count, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+
+        def percentile(p: float) -> float:
+            index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+            return round(samples[index] * 1000, 2)
+
+        return {
+            "count": count,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 2),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
@@ -0,0 +1,18 @@
+# model_executor.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import config
+
+# Pool acotado donde se ejecuta la inferencia de modelos (CPU-bound).
+# Así el event loop queda libre para atender otros webhooks mientras tanto.
+executor = ThreadPoolExecutor(
+    max_workers=config.MODEL_EXECUTOR_WORKERS,
+    thread_name_prefix="model-inference"
+)
+
+async def run_in_model_executor(func, *args, **kwargs):
+    """Ejecuta una función bloqueante en el pool de inferencia y espera su resultado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
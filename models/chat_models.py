@@ -18,6 +18,8 @@ class GeneratedAnswer(BaseModel):
     # Reemplazamos 'context' por 'sources' para que coincida con lo que
     # devuelve el endpoint /ask y para que la API sea más clara.
     sources: List[Dict[str, Any]]
+    # Tokens estimados del prompt enviado al LLM (None si la respuesta vino de la caché).
+    prompt_tokens: Optional[int] = None
 
 class FilterPayload(BaseModel):
     tipo_documento: Optional[str] = None
@@ -1,50 +1,55 @@
 import os
 import shutil
 from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 
 import config
-from services import process_pdfs_from_zip
-from vector_db import client
+from services.ingestion_jobs import ingestion_jobs
 
 router = APIRouter(
     prefix="/documents",
     tags=["Documents"]
 )
 
-@router.post("/upload/", summary="Cargar ZIP con PDFs")
-async def upload_documents(file: UploadFile = File(...)):
+async def _enqueue_upload(file: UploadFile, is_context: bool):
+    """Guarda el ZIP subido y crea un trabajo de ingesta en segundo plano."""
     if file.content_type != "application/zip":
         raise HTTPException(status_code=400, detail="El archivo debe ser de tipo .zip")
 
-    file_path = os.path.join(config.TEMP_UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    processed_count = process_pdfs_from_zip(file_path)
+    filename = os.path.basename(file.filename)
+    file_path = os.path.join(config.TEMP_UPLOAD_DIR, f"{os.urandom(8).hex()}_{filename}")
+
+    def save():
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+    await run_in_threadpool(save)
 
-    # Obtiene la información de la colección para el conteo
-    collection_info = client.get_collection(collection_name=config.COLLECTION_NAME)
-    
+    job = ingestion_jobs.submit(file_path, filename, is_context)
     return {
-        "message": f"{processed_count} archivos PDF procesados exitosamente.",
-        "collection_count": f"La colección ahora tiene {collection_info.points_count} documentos.",
+        "message": f"Archivo '{filename}' recibido. La ingesta continúa en segundo plano.",
+        "job_id": job.id,
+        "status_url": f"{router.prefix}/jobs/{job.id}",
     }
 
-@router.post("/upload-context/", summary="Cargar ZIP con PDFs con contexto")
-async def upload_context_documents(file: UploadFile = File(...)):
-    if file.content_type != "application/zip":
-        raise HTTPException(status_code=400, detail="El archivo debe ser de tipo .zip")
-
-    file_path = os.path.join(config.TEMP_UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    processed_count = process_pdfs_from_zip(file_path, True)
+@router.post("/upload/", status_code=202, summary="Cargar ZIP con PDFs")
+async def upload_documents(file: UploadFile = File(...)):
+    return await _enqueue_upload(file, is_context=False)
 
-    # Obtiene la información de la colección para el conteo
-    collection_info = client.get_collection(collection_name=config.COLLECTION_NAME)
-    
-    return {
-        "message": f"{processed_count} archivos PDF procesados exitosamente.",
-        "collection_count": f"La colección ahora tiene {collection_info.points_count} documentos.",
-    }
\ No newline at end of file
+@router.post("/upload-context/", status_code=202, summary="Cargar ZIP con PDFs con contexto")
+async def upload_context_documents(file: UploadFile = File(...)):
+    return await _enqueue_upload(file, is_context=True)
+
+@router.get("/jobs", summary="Listar trabajos de ingesta")
+async def list_ingestion_jobs():
+    return [
+        {key: value for key, value in job.to_dict().items() if key not in ("files", "pipeline")}
+        for job in ingestion_jobs.list()
+    ]
+
+@router.get("/jobs/{job_id}", summary="Estado de un trabajo de ingesta")
+async def get_ingestion_job(job_id: str):
+    """Avance por archivo, chunks, rendimiento y errores de una carga."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de ingesta no encontrado.")
+    return job.to_dict()
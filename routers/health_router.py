@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+import lifecycle
+
+router = APIRouter(tags=["Health"])
+
+@router.get("/healthz", summary="Liveness")
+async def healthz():
+    """El proceso está vivo y el event loop responde. No depende de modelos ni del almacén vectorial."""
+    return {"status": "ok"}
+
+@router.get("/readyz", summary="Readiness")
+async def readyz():
+    """
+    Devuelve 200 solo cuando los modelos están cargados y el almacén vectorial (Qdrant) es alcanzable.
+    Mientras tanto responde 503 para que el orquestador no envíe tráfico.
+    """
+    status = await lifecycle.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
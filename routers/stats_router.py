@@ -0,0 +1,88 @@
+from fastapi import APIRouter
+
+import config
+import llm_handler
+from services import telegram_queue
+from services.search_service import query_embedding_cache, search_latency
+from services.answer_cache import answer_cache, rag_requests
+from services.chunk_text_store import chunk_text_store
+from services.context_packing import context_packer
+from services.ingestion_manifest import get_ingestion_manifest
+from services.prevent_injection_service import injection_scanner_stats
+from vector_db import embedding_batcher
+from vector_store import collection_stats, vector_store
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"]
+)
+
+@router.get("/telegram-queue", summary="Estado de la cola de mensajes de Telegram")
+async def telegram_queue_stats():
+    """Profundidad de la cola, mensajes en curso y tiempos de espera."""
+    return telegram_queue.stats()
+
+@router.get("/embeddings", summary="Micro-batching de embeddings de consultas")
+async def embedding_batcher_stats():
+    """Tamaño de los lotes de `encode` y tiempos de espera en cola."""
+    return embedding_batcher.stats()
+
+@router.get("/embedding-cache", summary="Caché de embeddings de consultas")
+async def embedding_cache_stats():
+    """Aciertos, fallos y uso de memoria de la caché de embeddings."""
+    return query_embedding_cache.stats()
+
+@router.get("/answer-cache", summary="Caché de respuestas del RAG")
+async def answer_cache_stats():
+    """Aciertos exactos y semánticos, entradas e invalidaciones por ingesta."""
+    return answer_cache.stats()
+
+@router.get("/coalescing", summary="Preguntas idénticas agrupadas mientras se respondían")
+async def coalescing_stats():
+    """Llamadas al RAG y cuántas esperaron una respuesta idéntica que ya estaba en curso."""
+    return rag_requests.stats()
+
+@router.get("/injection-scanner", summary="Escáner de inyección de prompts")
+async def injection_stats():
+    """Latencia de escaneo, aciertos de la caché de veredictos y tamaño de los lotes."""
+    return injection_scanner_stats()
+
+@router.get("/ingestion-manifest", summary="Manifiesto de la ingesta incremental")
+async def ingestion_manifest_stats():
+    """Archivos registrados y embeddings de chunks guardados para reutilizar."""
+    return get_ingestion_manifest().stats()
+
+@router.get("/collection", summary="Datos de la colección en caché")
+async def collection_cache_stats():
+    """Cantidad de puntos y estado de la colección, con la cantidad de refrescos e invalidaciones."""
+    return collection_stats.stats()
+
+@router.get("/search", summary="Latencia de búsqueda y memoria estimada de la colección")
+async def search_stats():
+    """
+    Percentiles de latencia de las consultas al almacén vectorial, con los parámetros
+    y la RAM estimada del backend en uso (Qdrant: vectores, cuantización y HNSW;
+    numpy: matriz de vectores, bitmaps e IVF).
+    """
+    points = (await collection_stats.get())["points_count"]
+    return {
+        "backend": vector_store.name,
+        "latency": search_latency.stats(),
+        "settings": vector_store.settings(),
+        "memory_estimate": vector_store.estimate_memory(points),
+    }
+
+@router.get("/chunk-text-store", summary="Almacén local de textos de chunks")
+async def chunk_text_store_stats():
+    """Textos guardados y tamaño del archivo (si CHUNK_TEXT_STORE está activo)."""
+    return {"enabled": config.CHUNK_TEXT_STORE, **chunk_text_store.stats()}
+
+@router.get("/prompt", summary="Tamaño de los prompts enviados al LLM")
+async def prompt_stats():
+    """Tokens estimados por prompt y chunks descartados (repetidos o fuera del presupuesto)."""
+    return context_packer.stats()
+
+@router.get("/llm", summary="Proveedor de LLM: prefill y carga del modelo")
+async def llm_stats():
+    """Tokens del prompt y tiempo de prefill que informa el proveedor (Ollama), y recargas del modelo."""
+    return {"provider": config.LLM_PROVIDER, **llm_handler.get_llm_instance().stats()}
@@ -1,21 +1,38 @@
+import json
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 
 from services import perform_similarity_search
 import llm_handler
 from models.chat_models import FilterPayload, Question, GeneratedAnswer
 from services.search_service import search_with_filters
+from caching import normalize_text
+from services.answer_cache import answer_cache, rag_requests
+from services.context_packing import context_packer
 
 router = APIRouter(
     prefix="/test",
     tags=["Test"]
 )
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Metadatos que pide cada endpoint a Qdrant (el texto de los chunks viene aparte).
+ASK_PAYLOAD_FIELDS = ["tipo_documento", "numero_documento", "fecha_publicacion", "articulo", "subtema", "nombre_archivo"]
+DEBUG_PAYLOAD_FIELDS = ["tipo_documento", "numero_documento", "articulo", "subtema", "nombre_archivo", "pagina"]
+NO_RESULTS_ANSWER = "Lo siento, no pude encontrar información relevante en mi base de datos para responder a tu pregunta."
+
+def _sse_event(event: str, data) -> str:
+    """Serializa un evento en formato Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/", summary="Enviar un mensaje al chat (Modo Depuración)")
 async def handle_chat_message(question: Question):
     """
     Endpoint de depuración para ver los resultados de la búsqueda sin llamar al LLM.
     """
-    search_results = perform_similarity_search(question.query, question.n_results)
+    search_results = await perform_similarity_search(
+        question.query, question.n_results, payload_fields=DEBUG_PAYLOAD_FIELDS
+    )
     
     # Devuelve los resultados crudos para revisión
     return {
@@ -29,44 +46,89 @@ async def ask_llm(question: Question):
     """
     Realiza un proceso completo de RAG:
     1. Busca contexto y metadatos relevantes en la base de datos vectorial.
-    2. Construye un contexto enriquecido con la información de las fuentes.
+    2. Construye un contexto enriquecido con la información de las fuentes,
+       sin chunks repetidos y dentro del presupuesto de tokens (ver context_packing).
     3. Pasa la pregunta y el contexto a un LLM para generar una respuesta citada.
+    Las respuestas se guardan en caché hasta la próxima ingesta, y las preguntas
+    idénticas que llegan mientras una se responde esperan esa misma respuesta.
     """
-    # Obtenemos los resultados de la búsqueda
-    search_results = perform_similarity_search(question.query, question.n_results)
+    flight_key = ("ask", normalize_text(question.query), question.n_results)
+    return await rag_requests.run(flight_key, lambda: _answer_question(question))
+
+async def _answer_question(question: Question) -> GeneratedAnswer:
+    cached = await answer_cache.lookup(question.query, question.n_results)
+    if cached:
+        return GeneratedAnswer(**cached)
+    generation = answer_cache.generation
 
-    context_docs = search_results.get('documents', [[]])[0]
-    context_metadatas = search_results.get('metadatas', [[]])[0]
+    # Obtenemos los resultados de la búsqueda
+    search_results = await perform_similarity_search(
+        question.query, question.n_results, payload_fields=ASK_PAYLOAD_FIELDS
+    )
 
-    if not context_docs:
+    packed = context_packer.build_prompt(question.query, search_results)
+    if not packed:
         return GeneratedAnswer(
-            answer="Lo siento, no pude encontrar información relevante en mi base de datos para responder a tu pregunta.",
+            answer=NO_RESULTS_ANSWER,
             sources=[]
         )
 
-    formatted_context_parts = []
-    for doc, meta in zip(context_docs, context_metadatas):
-        source_info = (
-            f"---\n"
-            f"Fuente: {meta.get('tipo_documento', 'N/A')} {meta.get('numero_documento', 'N/A')}\n"
-            f"Publicación: {meta.get('fecha_publicacion', 'N/A')}\n"
-            f"Artículo: {meta.get('articulo', 'N/A')}\n"
-            f"Contenido: {doc}\n"
-            f"---"
-        )
-        formatted_context_parts.append(source_info)
-    
-    full_context = "\n\n".join(formatted_context_parts)
-
-    # Se llama al handler del LLM, pero ahora con el contexto ya formateado
-    generated_text = llm_handler.generate_answer_from_context(question.query, full_context)
+    # Se llama al handler del LLM con el prompt ya armado
+    generated_text = await llm_handler.generate_answer(packed["prompt"])
+    await answer_cache.store(question.query, question.n_results, generated_text, packed["sources"], generation)
     
     # Devolvemos la respuesta y también los metadatos como fuentes
     return GeneratedAnswer(
         answer=generated_text,
-        sources=context_metadatas
+        sources=packed["sources"],
+        prompt_tokens=packed["prompt_tokens"],
     )
 
+@router.post("/ask/stream", summary="Preguntar al LLM usando RAG, con la respuesta en streaming (SSE)")
+async def ask_llm_stream(question: Question):
+    """
+    Igual que /ask, pero devuelve la respuesta como Server-Sent Events a medida
+    que el LLM la genera:
+    - `sources`: metadatos de las fuentes usadas (se envía primero).
+    - `token`: cada fragmento de texto generado.
+    - `done`: fin de la respuesta, con los tokens estimados del prompt.
+    """
+    cached = await answer_cache.lookup(question.query, question.n_results)
+    if cached:
+        async def cached_stream():
+            yield _sse_event("sources", cached["sources"])
+            yield _sse_event("token", cached["answer"])
+            yield _sse_event("done", {})
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+    generation = answer_cache.generation
+
+    search_results = await perform_similarity_search(
+        question.query, question.n_results, payload_fields=ASK_PAYLOAD_FIELDS
+    )
+
+    packed = context_packer.build_prompt(question.query, search_results)
+
+    async def event_stream():
+        if not packed:
+            yield _sse_event("sources", [])
+            yield _sse_event("token", NO_RESULTS_ANSWER)
+            yield _sse_event("done", {})
+            return
+
+        yield _sse_event("sources", packed["sources"])
+        chunks = []
+        failed = False
+        async for chunk in llm_handler.generate_answer_stream(packed["prompt"]):
+            chunks.append(chunk)
+            failed = failed or isinstance(chunk, llm_handler.StreamError)
+            yield _sse_event("token", chunk)
+        yield _sse_event("done", {"prompt_tokens": packed["prompt_tokens"]})
+        # Una respuesta cortada por un error no se cachea.
+        if not failed:
+            await answer_cache.store(question.query, question.n_results, "".join(chunks), packed["sources"], generation)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # --- ENDPOINT PARA TESTEAR FILTROS ---
 @router.post("/test-filter", summary="TEST: Probar filtros de metadatos directamente")
 async def test_filter_documents(payload: FilterPayload):
@@ -82,10 +144,11 @@ async def test_filter_documents(payload: FilterPayload):
     }
     
     # Llamamos a la nueva función de servicio
-    search_results = search_with_filters(
+    search_results = await search_with_filters(
         filters=filters, 
         n_results=payload.n_results, 
-        query=payload.query
+        query=payload.query,
+        payload_fields=DEBUG_PAYLOAD_FIELDS,
     )
     
     # Devolvemos un resultado claro para el testeo
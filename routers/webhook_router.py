@@ -4,7 +4,7 @@ import config
 from fastapi import APIRouter, Response
 
 from models.telegram_models import TelegramUpdate
-from services import send_telegram_message, get_rag_response_for_telegram, is_valid_prompt, welcome_message
+from services import telegram_queue
 
 router = APIRouter(
     prefix="/telegram",
@@ -14,8 +14,9 @@ router = APIRouter(
 @router.post(f"/webhook/{config.TELEGRAM_BOT_TOKEN}")
 async def telegram_webhook(update: TelegramUpdate):
     """
-    Recibe los mensajes de Telegram, los procesa con la lógica RAG
-    y devuelve una respuesta con fuentes.
+    Recibe los mensajes de Telegram y los encola para que los workers
+    los procesen con la lógica RAG. Responde de inmediato para que
+    Telegram no reintente el envío.
     """
     if update.message and update.message.text:
         chat_id = update.message.chat.id
@@ -23,27 +24,9 @@ async def telegram_webhook(update: TelegramUpdate):
         
         print(f"Mensaje recibido de Chat ID {chat_id}: {user_message}")
 
-        # Se fija si es un mensaje valido
-        is_valid = is_valid_prompt(user_message)
-        response_text = ""
-        if not is_valid:
-            response_text = "Basado en la información proporcionada, no puedo responder a esa pregunta"
-            await send_telegram_message(chat_id, response_text)
-            return Response(status_code=200)
-        
-        # Se fija si es un mensaje inicial
-        response_text = welcome_message(user_message)
-        if response_text != "":
-            await send_telegram_message(chat_id, response_text)
-            return Response(status_code=200)
-        
-        await send_telegram_message(chat_id, "Procesando⏳")
-        
-        # 1. Obtener la respuesta completa del servicio RAG
-        # Esta función ahora hace todo el trabajo pesado.
-        response_text = get_rag_response_for_telegram(user_message)
-        
-        # 2. Enviar la respuesta formateada de vuelta al usuario
-        await send_telegram_message(chat_id, response_text)
+        if not telegram_queue.enqueue(chat_id, user_message):
+            # Cola llena: Telegram reintentará la entrega más tarde.
+            print(f"⚠️ Cola de Telegram llena. Mensaje de Chat ID {chat_id} rechazado.")
+            return Response(status_code=503)
     
-    return Response(status_code=200)
\ No newline at end of file
+    return Response(status_code=200)
@@ -3,5 +3,7 @@
 from .ingestion_service import process_pdfs_from_zip
 from .search_service import perform_similarity_search, search_with_filters
 from .prevent_injection_service import is_valid_prompt
-from .telegram_service import send_telegram_message, get_rag_response_for_telegram
+from .telegram_client import start_telegram_client, close_telegram_client
+from .telegram_service import send_telegram_message, get_rag_response_for_telegram, process_telegram_message
+from .telegram_queue import telegram_queue
 from .welcome_service import welcome_message
\ No newline at end of file
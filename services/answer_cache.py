@@ -0,0 +1,146 @@
+# services/answer_cache.py
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from caching import LRUCache, SingleFlight, normalize_text
+from services.search_service import build_metadata_conditions, embed_query
+
+# Respuestas que no deben guardarse (errores del LLM o del sistema).
+_ERROR_PREFIX = "Hubo un error"
+
+
+class AnswerCache:
+    """
+    Caché de respuestas finales del RAG (texto + fuentes).
+    - Coincidencia exacta por consulta normalizada.
+    - Opcional (`similarity_threshold` > 0): coincidencia con consultas casi
+      idénticas, cuyo embedding supera el umbral de similitud y que resuelven
+      al mismo filtro de metadatos.
+    Se vacía completa cuando la ingesta modifica la colección.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float], similarity_threshold: float):
+        self._answers = LRUCache(name="answers", max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._threshold = similarity_threshold
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # (n_results, filtro) -> {clave exacta: embedding normalizado}
+        self._semantic_index: Dict[Tuple, Dict[Tuple, np.ndarray]] = {}
+        self._index_size = 0
+        self._generation = 0
+        self._semantic_hits = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Versión de la colección. Cambia en cada invalidación."""
+        return self._generation
+
+    @staticmethod
+    def _exact_key(query: str, n_results: int) -> Tuple:
+        return (n_results, normalize_text(query))
+
+    @staticmethod
+    def _group_key(query: str, n_results: int) -> Tuple:
+        return (n_results, tuple(sorted(build_metadata_conditions(query).items())))
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, query: str, n_results: int) -> Optional[Dict[str, Any]]:
+        """Devuelve {"answer", "sources"} si hay una respuesta guardada para la consulta."""
+        if not config.ANSWER_CACHE_ENABLED:
+            return None
+
+        exact_key = self._exact_key(query, n_results)
+        cached = self._answers.get(exact_key)
+        if cached is not None or self._threshold <= 0:
+            return cached
+
+        group = self._semantic_index.get(self._group_key(query, n_results))
+        if not group:
+            return None
+
+        query_vector = self._unit(await embed_query(query))
+        with self._lock:
+            keys = list(group.keys())
+            matrix = np.stack([group[key] for key in keys])
+        similarities = matrix @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self._threshold:
+            return None
+
+        cached = self._answers.get(keys[best])
+        if cached is None:
+            # La entrada ya fue desalojada de la caché principal.
+            with self._lock:
+                group.pop(keys[best], None)
+            return None
+        self._semantic_hits += 1
+        return cached
+
+    async def store(self, query: str, n_results: int, answer: str, sources: List[Dict[str, Any]], generation: int):
+        """
+        Guarda una respuesta. `generation` es la que se leyó antes de calcularla:
+        si hubo una ingesta mientras tanto, la respuesta se descarta.
+        """
+        if not config.ANSWER_CACHE_ENABLED or not answer or answer.startswith(_ERROR_PREFIX):
+            return
+
+        exact_key = self._exact_key(query, n_results)
+        query_vector = self._unit(await embed_query(query)) if self._threshold > 0 else None
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._answers.put(exact_key, {"answer": answer, "sources": sources})
+            if query_vector is not None:
+                group = self._semantic_index.setdefault(self._group_key(query, n_results), {})
+                group[exact_key] = query_vector
+                self._index_size += 1
+                if self._index_size > 2 * self._max_entries:
+                    self._prune_semantic_index()
+
+    def _prune_semantic_index(self):
+        """Quita del índice semántico las claves que la LRU ya desalojó."""
+        for group_key in list(self._semantic_index):
+            group = self._semantic_index[group_key]
+            for key in [k for k in group if k not in self._answers]:
+                del group[key]
+            if not group:
+                del self._semantic_index[group_key]
+        self._index_size = sum(len(group) for group in self._semantic_index.values())
+
+    def invalidate(self):
+        """Vacía la caché. Se llama cuando la ingesta cambia la colección."""
+        with self._lock:
+            self._generation += 1
+            self._answers.clear()
+            self._semantic_index.clear()
+            self._index_size = 0
+            self._invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._answers.stats()
+        stats.update({
+            "semantic_hits": self._semantic_hits,
+            "similarity_threshold": self._threshold,
+            "invalidations": self._invalidations,
+        })
+        return stats
+
+
+answer_cache = AnswerCache(
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ANSWER_CACHE_TTL or None,
+    similarity_threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
+
+# Respuestas en curso: la caché cubre las preguntas ya respondidas y esto las que
+# se están respondiendo (ráfagas de la misma pregunta en un grupo, por ejemplo).
+rag_requests = SingleFlight(name="rag", enabled=config.REQUEST_COALESCING)
@@ -0,0 +1,197 @@
+# services/chunk_text_store.py
+import mmap
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+
+# Primera línea del índice: nombre del archivo de textos vigente (tras una compactación).
+DATA_HEADER = "#data"
+# Línea del índice que marca un id borrado.
+DELETED = -1
+
+
+class ChunkTextStore:
+    """
+    Almacén local del texto de los chunks, por id de punto, para no guardar
+    el campo `texto` en los payloads de Qdrant.
+    - Archivo de textos (`texts.bin`): los textos en UTF-8, uno detrás de otro (solo se agregan).
+    - `index.tsv`: id, posición y largo de cada texto; la última línea de un id manda
+      (posición -1 = borrado).
+    El archivo de textos se lee con mmap y todo se carga recién en el primer uso.
+    Los textos borrados o reemplazados ocupan lugar hasta la próxima compactación
+    (`maybe_compact`), que reescribe los vivos en un archivo nuevo y lo publica
+    reemplazando el índice de una sola vez.
+    """
+    def __init__(self, directory: str, compact_min_bytes: int = 1024 * 1024, compact_garbage_ratio: float = 0.5):
+        self._index_path = os.path.join(directory, "index.tsv")
+        self._directory = directory
+        self._data_name = "texts.bin"
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_garbage_ratio = compact_garbage_ratio
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Tuple[int, int]]] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._compactions = 0
+
+    @property
+    def _data_path(self) -> str:
+        return os.path.join(self._directory, self._data_name)
+
+    def _load(self):
+        if self._index is not None:
+            return
+        index: Dict[str, Tuple[int, int]] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding="utf-8") as f:
+                for line in f:
+                    point_id, offset, length = line.rstrip("\n").split("\t")
+                    if point_id == DATA_HEADER:
+                        self._data_name = offset
+                    elif int(offset) == DELETED:
+                        index.pop(point_id, None)
+                    else:
+                        index[point_id] = (int(offset), int(length))
+        # Tras un corte, el índice puede nombrar textos que no llegaron al archivo: se ignoran.
+        size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        truncated = [point_id for point_id, (offset, length) in index.items() if offset + length > size]
+        for point_id in truncated:
+            del index[point_id]
+        if truncated:
+            print(f"⚠️ {len(truncated)} textos del índice no están en '{self._data_name}': se ignoran.")
+        self._index = index
+
+    def _close_view(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _view(self, end: int) -> mmap.mmap:
+        """Mapa del archivo de textos; se vuelve a mapear si creció desde la última vez."""
+        if self._mmap is None or len(self._mmap) < end:
+            self._close_view()
+            with open(self._data_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def get_many(self, point_ids: Iterable[str]) -> Dict[str, str]:
+        with self._lock:
+            self._load()
+            return self._get_unlocked(point_ids)
+
+    def put_many(self, items: List[Tuple[str, str]]):
+        """Guarda los textos. Los que ya están guardados sin cambios no se repiten."""
+        with self._lock:
+            self._load()
+            existing = self._get_unlocked(point_id for point_id, _ in items)
+            new_items = [(point_id, text) for point_id, text in items if existing.get(point_id) != text]
+            if not new_items:
+                return
+            os.makedirs(self._directory, exist_ok=True)
+            entries = []
+            # Primero los textos en disco y después el índice que los nombra.
+            with open(self._data_path, "ab") as data:
+                offset = data.tell()
+                for point_id, text in new_items:
+                    encoded = text.encode("utf-8")
+                    data.write(encoded)
+                    entries.append((point_id, offset, len(encoded)))
+                    offset += len(encoded)
+                data.flush()
+                os.fsync(data.fileno())
+            with open(self._index_path, "a", encoding="utf-8") as index:
+                for point_id, offset, length in entries:
+                    index.write(f"{point_id}\t{offset}\t{length}\n")
+                index.flush()
+                os.fsync(index.fileno())
+            for point_id, offset, length in entries:
+                self._index[point_id] = (offset, length)
+
+    def delete_many(self, point_ids: Iterable[str]):
+        """Olvida los textos de esos ids; el espacio se recupera al compactar."""
+        with self._lock:
+            self._load()
+            deleted = [point_id for point_id in point_ids if self._index.pop(point_id, None) is not None]
+            if not deleted:
+                return
+            with open(self._index_path, "a", encoding="utf-8") as index:
+                for point_id in deleted:
+                    index.write(f"{point_id}\t{DELETED}\t0\n")
+
+    def _get_unlocked(self, point_ids: Iterable[str]) -> Dict[str, str]:
+        entries = {point_id: self._index[point_id] for point_id in point_ids if point_id in self._index}
+        end = max((offset + length for offset, length in entries.values()), default=0)
+        if end == 0:
+            return {point_id: "" for point_id in entries}
+        view = self._view(end)
+        return {
+            point_id: view[offset:offset + length].decode("utf-8")
+            for point_id, (offset, length) in entries.items()
+        }
+
+    def _garbage_bytes(self) -> int:
+        size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        return size - sum(length for _, length in self._index.values())
+
+    def maybe_compact(self) -> bool:
+        """Compacta si los textos muertos superan `compact_min_bytes` y `compact_garbage_ratio` del archivo."""
+        with self._lock:
+            self._load()
+            garbage = self._garbage_bytes()
+            size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+            if garbage < self.compact_min_bytes or garbage < size * self.compact_garbage_ratio:
+                return False
+            self._compact_unlocked()
+            return True
+
+    def _compact_unlocked(self):
+        """
+        Copia los textos vivos a un archivo nuevo y escribe un índice que lo nombra.
+        Reemplazar el índice es el único paso que publica el cambio: si el proceso se
+        corta antes, sigue vigente el par anterior (el archivo nuevo queda huérfano).
+        """
+        new_name = f"texts.{time.time_ns()}.bin"
+        new_path = os.path.join(self._directory, new_name)
+        index_tmp = f"{self._index_path}.tmp"
+        new_index: Dict[str, Tuple[int, int]] = {}
+        end = max((offset + length for offset, length in self._index.values()), default=0)
+        view = self._view(end) if end else None
+        with open(new_path, "wb") as data, open(index_tmp, "w", encoding="utf-8") as index:
+            index.write(f"{DATA_HEADER}\t{new_name}\t0\n")
+            offset = 0
+            for point_id, (old_offset, length) in self._index.items():
+                if length:
+                    data.write(view[old_offset:old_offset + length])
+                index.write(f"{point_id}\t{offset}\t{length}\n")
+                new_index[point_id] = (offset, length)
+                offset += length
+            data.flush()
+            os.fsync(data.fileno())
+            index.flush()
+            os.fsync(index.fileno())
+        before = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        self._close_view()
+        os.replace(index_tmp, self._index_path)
+        self._data_name = new_name
+        self._index = new_index
+        self._compactions += 1
+        # El archivo anterior y los que hayan quedado de compactaciones interrumpidas.
+        for entry in os.scandir(self._directory):
+            if entry.name.startswith("texts") and entry.name.endswith(".bin") and entry.name != new_name:
+                os.remove(entry.path)
+        print(f"🧹 Almacén de textos compactado: {before} -> {offset} bytes.")
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        with self._lock:
+            return {
+                "loaded": self._index is not None,
+                "texts": len(self._index) if self._index is not None else None,
+                "bytes": os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0,
+                "garbage_bytes": self._garbage_bytes() if self._index is not None else None,
+                "compactions": self._compactions,
+            }
+
+
+chunk_text_store = ChunkTextStore(directory=config.CHUNK_TEXT_STORE_DIR)
@@ -0,0 +1,128 @@
+# services/chunking.py
+import bisect
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Inicio de un artículo. Es el mismo corte que hacía
+# re.split(r'(?=Artículo\s*[\dºª]+\b)', texto), pero sin cargar todo el texto.
+ARTICLE_BOUNDARY = re.compile(r'Artículo\s*[\dºª]+\b', re.IGNORECASE)
+ARTICLE_NUMBER = re.compile(r"Artículo (\d+)", re.IGNORECASE)
+MIN_ARTICLE_LENGTH = 50 # Mínimo de caracteres para que un chunk sea válido
+# Versión de los cortes: subirla al cambiar cómo se divide el texto, así la ingesta
+# incremental vuelve a procesar los archivos ya cargados (ver pipeline_fingerprint).
+CHUNKER_VERSION = 2
+# Separa la superposición (final del chunk anterior) del texto nuevo de un chunk semántico.
+OVERLAP_SEPARATOR = " ... "
+
+
+class _PageTracker:
+    """Recuerda dónde empieza cada página para ubicar una posición del texto."""
+    def __init__(self):
+        self._starts: List[int] = []
+
+    def add(self, offset: int):
+        self._starts.append(offset)
+
+    def page_at(self, offset: int) -> int:
+        return max(1, bisect.bisect_right(self._starts, offset))
+
+
+def iter_article_chunks(pages: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Divide un documento legal por artículos a medida que llegan sus páginas.
+    Produce {"text", "article", "page"}: el texto del artículo (sin espacios en
+    los extremos), su número (o None si no se reconoce) y la página donde empieza.
+    Solo guarda en memoria el artículo en curso y la página nueva.
+    """
+    tracker = _PageTracker()
+    buffer = ""
+    buffer_start = 0 # posición de `buffer` dentro del texto completo
+
+    def emit(segment: str, start: int):
+        chunk = segment.strip()
+        if not chunk or len(chunk) <= MIN_ARTICLE_LENGTH:
+            return None
+        chunk_start = start + len(segment) - len(segment.lstrip())
+        # Primer "Artículo N" del chunk: normalmente su encabezado.
+        match = ARTICLE_NUMBER.search(chunk)
+        return {
+            "text": chunk,
+            "article": match.group(1) if match else None,
+            "page": tracker.page_at(chunk_start),
+        }
+
+    def split(final: bool) -> Iterator[Dict[str, Any]]:
+        nonlocal buffer, buffer_start
+        cut = 0
+        for match in ARTICLE_BOUNDARY.finditer(buffer, 1):
+            # Un encabezado pegado al final puede continuar en la página siguiente.
+            if match.end() == len(buffer) and not final:
+                break
+            chunk = emit(buffer[cut:match.start()], buffer_start + cut)
+            if chunk:
+                yield chunk
+            cut = match.start()
+        buffer_start += cut
+        buffer = buffer[cut:]
+
+    for page in pages:
+        tracker.add(buffer_start + len(buffer))
+        buffer += page
+        yield from split(final=False)
+
+    yield from split(final=True)
+    chunk = emit(buffer, buffer_start)
+    if chunk:
+        yield chunk
+
+
+def _iter_paragraphs(pages: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Párrafos (separados por una línea en blanco) con la página donde empiezan."""
+    tracker = _PageTracker()
+    buffer = ""
+    buffer_start = 0
+    for page in pages:
+        tracker.add(buffer_start + len(buffer))
+        buffer += page
+        *paragraphs, buffer_tail = buffer.split('\n\n')
+        for paragraph in paragraphs:
+            stripped = paragraph.strip()
+            if stripped:
+                yield stripped, tracker.page_at(buffer_start + len(paragraph) - len(paragraph.lstrip()))
+            buffer_start += len(paragraph) + 2
+        buffer = buffer_tail
+    stripped = buffer.strip()
+    if stripped:
+        yield stripped, tracker.page_at(buffer_start + len(buffer) - len(buffer.lstrip()))
+
+
+def iter_semantic_chunks(pages: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[Dict[str, Any]]:
+    """
+    Divide un texto en chunks de tamaño aproximado `chunk_size` con superposición,
+    priorizando los cortes por párrafo para mantener el contexto.
+    Produce {"text", "page"}, con la página del primer párrafo nuevo del chunk.
+    """
+    parts: List[str] = []
+    length = 0
+    page = None
+
+    for paragraph, paragraph_page in _iter_paragraphs(pages):
+        # Si añadir el nuevo párrafo excede el tamaño, se emite el chunk actual
+        if length + len(paragraph) + 1 > chunk_size and parts:
+            chunk = "".join(parts)
+            yield {"text": chunk, "page": page}
+            # El nuevo chunk empieza con superposición (última parte del chunk anterior)
+            overlap = chunk[-chunk_overlap:]
+            parts = [overlap, OVERLAP_SEPARATOR, paragraph]
+            length = len(overlap) + len(OVERLAP_SEPARATOR) + len(paragraph)
+            page = paragraph_page
+        elif parts:
+            parts += ["\n\n", paragraph]
+            length += 2 + len(paragraph)
+        else:
+            parts = [paragraph]
+            length = len(paragraph)
+            page = paragraph_page
+
+    if parts:
+        yield {"text": "".join(parts), "page": page}
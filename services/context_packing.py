@@ -0,0 +1,187 @@
+# services/context_packing.py
+import threading
+from typing import Any, Dict, List, Optional
+
+import config
+import llm_handler
+from caching import normalize_text
+from services.chunking import OVERLAP_SEPARATOR
+
+NO_VALUE = "N/A"
+
+
+class ContextPacker:
+    """
+    Arma el contexto del LLM a partir de los resultados de la búsqueda, en un solo lugar
+    para Telegram y /test/ask:
+    - Descarta chunks repetidos o contenidos en otro ya elegido.
+    - Quita la superposición entre chunks consecutivos del mismo documento
+      (el texto anterior a " ... " que ya aparece en otro chunk elegido).
+    - Agrupa los chunks de una misma fuente bajo un solo encabezado.
+    - Respeta un presupuesto de tokens, eligiendo los chunks por puntaje.
+    Los tokens se estiman por caracteres (`chars_per_token`): alcanza para
+    acotar el prompt sin depender del tokenizador de cada proveedor.
+    """
+    def __init__(self, max_tokens: int, chars_per_token: float):
+        self.max_tokens = max_tokens
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+        self._prompts = 0
+        self._prompt_tokens = 0
+        self._max_prompt_tokens = 0
+        self._chunks_in = 0
+        self._chunks_used = 0
+        self._duplicates = 0
+        self._dropped_by_budget = 0
+        self._overlap_chars_removed = 0
+
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token + 0.5)
+
+    @staticmethod
+    def _header(meta: Dict[str, Any]) -> str:
+        lines = [f"Fuente: {meta.get('tipo_documento', NO_VALUE)} {meta.get('numero_documento', NO_VALUE)}"]
+        if "fecha_publicacion" in meta:
+            lines.append(f"Publicación: {meta['fecha_publicacion']}")
+        lines.append(f"Artículo: {meta.get('articulo', NO_VALUE)}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _overlap_prefix(text: str) -> str:
+        """Texto que el chunk repite del chunk anterior (ver chunking.iter_semantic_chunks)."""
+        index = text.find(OVERLAP_SEPARATOR)
+        return text[:index] if index > 0 else ""
+
+    def _strip_overlap(self, text: str, others: List[str]) -> str:
+        prefix = self._overlap_prefix(text)
+        if prefix and any(prefix in other for other in others):
+            return text[len(prefix) + len(OVERLAP_SEPARATOR):]
+        return text
+
+    def pack(
+        self, documents: List[str], metadatas: List[Dict[str, Any]], scores: Optional[List[Optional[float]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Devuelve {"context", "sources", "context_tokens", ...}: el contexto formateado,
+        los metadatos de los chunks que entraron y contadores de lo descartado.
+        """
+        order = list(range(len(documents)))
+        if scores:
+            # Los resultados sin puntaje (búsqueda exacta) conservan su orden.
+            order.sort(key=lambda i: -(scores[i] if scores[i] is not None else 0.0))
+
+        blocks: Dict[str, List[str]] = {} # encabezado -> textos, en orden de puntaje
+        sources = []
+        seen = []
+        duplicates = dropped = overlap_removed = 0
+        used_tokens = 0
+        budget = self.max_tokens or None
+
+        for i in order:
+            text, meta = documents[i].strip(), metadatas[i]
+            normalized = normalize_text(text)
+            if not normalized or any(normalized in other for other in seen):
+                duplicates += 1
+                continue
+
+            selected = [part for parts in blocks.values() for part in parts]
+            trimmed = self._strip_overlap(text, selected)
+            overlap = len(text) - len(trimmed)
+            header = self._header(meta)
+            header_cost = 0 if header in blocks else self.estimate_tokens(header) + 4
+            cost = self.estimate_tokens(trimmed) + header_cost
+            if budget is not None and used_tokens + cost > budget:
+                if blocks:
+                    dropped += 1
+                    continue
+                # Ni el mejor chunk entra completo: se recorta al presupuesto.
+                trimmed = trimmed[:max(0, int((budget - header_cost) * self.chars_per_token))]
+                cost = budget
+
+            # Los chunks ya elegidos que repiten el comienzo del nuevo también se recortan.
+            for parts in blocks.values():
+                for j, part in enumerate(parts):
+                    stripped = self._strip_overlap(part, [trimmed])
+                    if stripped != part:
+                        overlap_removed += len(part) - len(stripped)
+                        used_tokens -= self.estimate_tokens(part) - self.estimate_tokens(stripped)
+                        parts[j] = stripped
+
+            overlap_removed += overlap
+            blocks.setdefault(header, []).append(trimmed)
+            sources.append(meta)
+            seen.append(normalized)
+            used_tokens += cost
+
+        context = "\n\n".join(
+            f"---\n{header}\nContenido: " + "\n[...]\n".join(parts) + "\n---"
+            for header, parts in blocks.items()
+        )
+        return {
+            "context": context,
+            "sources": sources,
+            "context_tokens": self.estimate_tokens(context),
+            "chunks_in": len(documents),
+            "chunks_used": len(sources),
+            "duplicates": duplicates,
+            "dropped_by_budget": dropped,
+            "overlap_chars_removed": overlap_removed,
+        }
+
+    def build_prompt(self, query: str, search_results: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Prompt para el LLM a partir de la salida de perform_similarity_search.
+        Devuelve None si la búsqueda no trajo nada (o solo chunks sin texto); si no,
+        lo de `pack` más "prompt" y "prompt_tokens".
+        """
+        documents = search_results.get('documents', [[]])[0]
+        if not documents:
+            return None
+        packed = self.pack(
+            documents,
+            search_results.get('metadatas', [[]])[0],
+            search_results.get('scores', [[]])[0] or None,
+        )
+        if not packed["sources"]:
+            return None
+        prompt = llm_handler.build_prompt(query, packed["context"])
+        packed["prompt"] = prompt
+        packed["prompt_tokens"] = self.estimate_tokens(llm_handler.SYSTEM_PROMPT) + self.estimate_tokens(prompt)
+        self._record(packed)
+        print(
+            f"🧮 Prompt de ~{packed['prompt_tokens']} tokens: {packed['chunks_used']}/{packed['chunks_in']} chunks "
+            f"({packed['duplicates']} repetidos, {packed['dropped_by_budget']} fuera del presupuesto)."
+        )
+        return packed
+
+    def _record(self, packed: Dict[str, Any]):
+        with self._lock:
+            self._prompts += 1
+            self._prompt_tokens += packed["prompt_tokens"]
+            self._max_prompt_tokens = max(self._max_prompt_tokens, packed["prompt_tokens"])
+            self._chunks_in += packed["chunks_in"]
+            self._chunks_used += packed["chunks_used"]
+            self._duplicates += packed["duplicates"]
+            self._dropped_by_budget += packed["dropped_by_budget"]
+            self._overlap_chars_removed += packed["overlap_chars_removed"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "chars_per_token": self.chars_per_token,
+                "prompts": self._prompts,
+                "avg_prompt_tokens": round(self._prompt_tokens / self._prompts, 1) if self._prompts else 0.0,
+                "max_prompt_tokens": self._max_prompt_tokens,
+                "chunks_in": self._chunks_in,
+                "chunks_used": self._chunks_used,
+                "duplicates": self._duplicates,
+                "dropped_by_budget": self._dropped_by_budget,
+                "overlap_chars_removed": self._overlap_chars_removed,
+            }
+
+
+context_packer = ContextPacker(
+    max_tokens=config.PROMPT_CONTEXT_MAX_TOKENS,
+    chars_per_token=config.PROMPT_CHARS_PER_TOKEN,
+)
@@ -0,0 +1,158 @@
+# services/ingestion_jobs.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import config
+from services.ingestion_service import process_pdfs_from_zip
+from vector_store import collection_stats
+
+
+class IngestionJob:
+    """
+    Estado de una carga de documentos en segundo plano.
+    El pipeline de ingesta le informa el avance por archivo.
+    """
+    def __init__(self, filename: str, zip_path: str, is_context: bool):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.zip_path = zip_path
+        self.is_context = is_context
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.pipeline_stats: Optional[Dict[str, Any]] = None
+        self.collection_count: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # --- Avisos del pipeline ---
+    def files_found(self, filenames: List[str]):
+        with self._lock:
+            for name in filenames:
+                self.files[name] = {"status": "pending", "chunks": 0, "points_upserted": 0, "error": None}
+
+    def document_parsed(self, filename: str, chunks: int, error: Optional[str]):
+        with self._lock:
+            file = self.files.setdefault(filename, {"points_upserted": 0, "error": None})
+            file["chunks"] = chunks
+            if error:
+                file.update(status="failed", error=error)
+            else:
+                file["status"] = "completed" if chunks == 0 else "embedding"
+
+    def document_unchanged(self, filename: str):
+        with self._lock:
+            self.files[filename] = {"status": "unchanged", "chunks": 0, "points_upserted": 0, "error": None}
+
+    def points_upserted(self, counts: Dict[str, int]):
+        with self._lock:
+            for filename, count in counts.items():
+                file = self.files[filename]
+                file["points_upserted"] += count
+                if file["status"] != "failed" and file["points_upserted"] >= file["chunks"]:
+                    file["status"] = "completed"
+
+    def upsert_failed(self, counts: Dict[str, int], error: str):
+        with self._lock:
+            for filename in counts:
+                self.files[filename].update(status="failed", error=error)
+
+    def pipeline_finished(self, stats: Dict[str, Any]):
+        self.pipeline_stats = stats
+
+    # --- Reporte ---
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            files = {name: dict(file) for name, file in self.files.items()}
+        chunks = sum(file.get("chunks", 0) for file in files.values())
+        upserted = sum(file.get("points_upserted", 0) for file in files.values())
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "is_context": self.is_context,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 2),
+            "files_total": len(files),
+            "files_done": sum(1 for file in files.values() if file["status"] in ("completed", "failed", "unchanged")),
+            "files_failed": sum(1 for file in files.values() if file["status"] == "failed"),
+            "files_unchanged": sum(1 for file in files.values() if file["status"] == "unchanged"),
+            "chunks": chunks,
+            "points_upserted": upserted,
+            "chunks_per_second": round(upserted / elapsed, 2) if elapsed else 0.0,
+            "collection_count": self.collection_count,
+            "files": files,
+            "pipeline": self.pipeline_stats,
+        }
+
+
+class IngestionJobManager:
+    """
+    Ejecuta las ingestas en un pool acotado de hilos (INGEST_JOB_WORKERS), de modo
+    que las cargas nunca bloquean el event loop ni acaparan los endpoints de chat.
+    Conserva el estado de los últimos INGEST_JOB_HISTORY trabajos.
+    """
+    def __init__(self, max_workers: int, history: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._history = history
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, zip_path: str, filename: str, is_context: bool) -> IngestionJob:
+        job = IngestionJob(filename=filename, zip_path=zip_path, is_context=is_context)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        return list(reversed(self._jobs.values()))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _trim(self):
+        # Se descartan los trabajos terminados más antiguos.
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self._history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        print(f"🚚 Iniciando trabajo de ingesta {job.id} ({job.filename}).")
+        try:
+            process_pdfs_from_zip(job.zip_path, job.is_context, progress=job)
+            job.collection_count = collection_stats.refresh_sync()["points_count"]
+            job.status = "completed"
+        except HTTPException as e:
+            job.status, job.error = "failed", e.detail
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            print(f"❌ Error en el trabajo de ingesta {job.id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            print(f"🏁 Trabajo de ingesta {job.id} terminado: {job.status}.")
+
+
+ingestion_jobs = IngestionJobManager(
+    max_workers=config.INGEST_JOB_WORKERS,
+    history=config.INGEST_JOB_HISTORY,
+)
@@ -0,0 +1,142 @@
+# services/ingestion_manifest.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import config
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class IngestionManifest:
+    """
+    Registro persistente (SQLite) de lo que ya se ingirió, para que volver a
+    subir un corpus casi igual no repita el trabajo:
+    - Por archivo: hash del contenido, huella del pipeline con que se procesó
+      (ver ingestion_service.pipeline_fingerprint) y los ids de sus puntos.
+      Un archivo con el mismo hash y la misma huella se saltea; si cambió alguno,
+      se vuelve a procesar y los ids que ya no aparecen se borran de la colección.
+    - Por chunk: el embedding de cada texto (por hash y modelo), para no
+      volver a calcular los de artículos que no cambiaron.
+    """
+    def __init__(self, path: str, model_name: str):
+        self._model = model_name
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " collection TEXT, filename TEXT, content_hash TEXT, point_ids TEXT, updated_at REAL,"
+                " fingerprint TEXT, PRIMARY KEY (collection, filename))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+            if "fingerprint" not in columns:
+                # Manifiestos anteriores: sin huella, sus archivos se vuelven a procesar una vez.
+                self._conn.execute("ALTER TABLE files ADD COLUMN fingerprint TEXT")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT, text_hash TEXT, vector BLOB,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    # --- Archivos ---
+    def file_hashes(self, fingerprint: str) -> Dict[str, str]:
+        """Hash conocido de cada archivo de la colección actual procesado con la huella `fingerprint`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, content_hash FROM files WHERE collection = ? AND fingerprint = ?",
+                (config.COLLECTION_NAME, fingerprint),
+            ).fetchall()
+        return dict(rows)
+
+    def file_point_ids(self, filename: str) -> List[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT point_ids FROM files WHERE collection = ? AND filename = ?",
+                (config.COLLECTION_NAME, filename),
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def record_file(self, filename: str, file_hash: str, fingerprint: str, point_ids: Sequence[str]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files"
+                " (collection, filename, content_hash, point_ids, updated_at, fingerprint)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (config.COLLECTION_NAME, filename, file_hash, json.dumps(list(point_ids)), time.time(), fingerprint),
+            )
+
+    def forget_files(self):
+        """Olvida los archivos de la colección actual (p. ej. si la colección se vació)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE collection = ?", (config.COLLECTION_NAME,))
+
+    # --- Embeddings ---
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return content_hash(text.encode("utf-8"))
+
+    def get_embeddings(self, text_hashes: Iterable[str]) -> Dict[str, List[float]]:
+        hashes = list(set(text_hashes))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite limita la cantidad de parámetros por consulta.
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    (self._model, *part),
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_embeddings(self, embeddings: Dict[str, Sequence[float]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (self._model, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for text_hash, vector in embeddings.items()
+                ],
+            )
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        with self._lock:
+            files = self._conn.execute(
+                "SELECT COUNT(*) FROM files WHERE collection = ?", (config.COLLECTION_NAME,)
+            ).fetchone()[0]
+            embeddings = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self._model,)
+            ).fetchone()[0]
+        return {"files": files, "embeddings": embeddings}
+
+
+# El manifiesto se abre de forma diferida (ver get_ingestion_manifest): los procesos
+# de parseo importan la ingesta y no deben crear directorios ni abrir SQLite.
+_ingestion_manifest: Optional[IngestionManifest] = None
+_ingestion_manifest_lock = threading.Lock()
+
+def get_ingestion_manifest() -> IngestionManifest:
+    """Devuelve el manifiesto, abriéndolo la primera vez (seguro entre hilos)."""
+    global _ingestion_manifest
+    if _ingestion_manifest is None:
+        with _ingestion_manifest_lock:
+            if _ingestion_manifest is None:
+                _ingestion_manifest = IngestionManifest(
+                    path=config.INGEST_MANIFEST_PATH,
+                    model_name=config.EMBEDDING_MODEL,
+                )
+    return _ingestion_manifest
@@ -1,54 +1,69 @@
 # services/ingestion.py
+import multiprocessing
 import os
 import re
+import hashlib
+import json
 import shutil
+import tempfile
+import threading
+import time
 import uuid
 import zipfile
-from typing import Dict, Any, List
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import chain, islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException
-from pypdf import PdfReader
-from qdrant_client.http.models import PointStruct
-
+import bm25
 import config
-from vector_db import client, embedding_model
+import vector_db
+from vector_db import get_embedding_model
+from vector_store import StorePoint, collection_stats, vector_store
+from services.answer_cache import answer_cache
+from services.ingestion_manifest import IngestionManifest, get_ingestion_manifest
+from services.chunk_text_store import chunk_text_store
+from services.chunking import CHUNKER_VERSION, MIN_ARTICLE_LENGTH, iter_article_chunks, iter_semantic_chunks
+from services.pdf_extraction import pdf_extractor
+
+# Caracteres del inicio del documento donde se buscan sus metadatos.
+METADATA_HEADER_CHARS = 20000
+# Tamaño y superposición de los chunks de los documentos de contexto.
+CONTEXT_CHUNK_SIZE = 1200
+CONTEXT_CHUNK_OVERLAP = 200
+# Versión de los campos del payload de los puntos: subirla al agregar o cambiar campos.
+PAYLOAD_SCHEMA_VERSION = 2
+
+def pipeline_fingerprint(is_context: bool) -> str:
+    """
+    Huella de todo lo que, además del contenido del PDF, decide qué puntos se
+    escriben: tipo de documento, cortes, extracción, embeddings, vectores
+    dispersos, dónde va el texto y versión del payload. La ingesta incremental
+    solo saltea un archivo si su hash y esta huella coinciden con los registrados.
+    """
+    settings = {
+        "payload_schema": PAYLOAD_SCHEMA_VERSION,
+        "is_context": is_context,
+        "chunker": [CHUNKER_VERSION, CONTEXT_CHUNK_SIZE, CONTEXT_CHUNK_OVERLAP, MIN_ARTICLE_LENGTH, METADATA_HEADER_CHARS],
+        "pdf_backend": pdf_extractor.backend.name,
+        "embedding_model": config.EMBEDDING_MODEL,
+        "vector_store": vector_store.name,
+        "sparse_vectors": vector_store.name == "qdrant" and vector_db.is_hybrid_enabled(),
+        "bm25_avg_doc_length": config.BM25_AVG_DOC_LENGTH,
+        "chunk_text_store": config.CHUNK_TEXT_STORE,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
 
 # --- FUNCIÓN AUXILIAR PARA CHUNKING ---
 def split_text_into_chunks(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
     """
     Divide un texto largo en chunks de tamaño aproximado `chunk_size` con superposición.
-    Prioriza dividir por párrafos para mantener el contexto.
+    Prioriza dividir por párrafos para mantener el contexto (ver chunking.iter_semantic_chunks).
     """
     if not text:
         return []
-
-    # Primero, divide el texto en párrafos
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = ""
-
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-
-        # Si añadir el nuevo párrafo excede el tamaño, guardamos el chunk actual
-        if len(current_chunk) + len(paragraph) + 1 > chunk_size and current_chunk:
-            chunks.append(current_chunk)
-            # Empezamos un nuevo chunk con superposición (última parte del chunk anterior)
-            overlap_text = current_chunk[-chunk_overlap:]
-            current_chunk = overlap_text + " ... " + paragraph
-        else:
-            if current_chunk:
-                current_chunk += "\n\n" + paragraph
-            else:
-                current_chunk = paragraph
-
-    # No olvides añadir el último chunk que se estaba construyendo
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
+    return [chunk["text"] for chunk in iter_semantic_chunks([text], chunk_size, chunk_overlap)]
 
 def extract_document_metadata(text: str) -> Dict[str, Any]:
     """Extrae metadatos clave directamente del texto de un documento legal."""
@@ -68,170 +83,478 @@ def extract_document_metadata(text: str) -> Dict[str, Any]:
         metadata["organismo_emisor"] = f"Ministerio de {match_org.group(1).strip()}"
     return metadata
 
-def process_and_embed_pdf(pdf_path: str, original_filename: str):
-    """Procesa un PDF ESTRUCTURADO (ley, decreto), lo divide por artículos y lo carga."""
-    try:
-        reader = PdfReader(pdf_path)
-        full_text = "".join(page.extract_text() for page in reader.pages if page.extract_text())
-        
-        print(f"\n--- [LEY/DECRETO] Procesando: {original_filename} ---")
-        if not full_text.strip():
-            print("❌ Error: El archivo está vacío o no se pudo extraer texto.")
-            return
-
-        print(f"✅ Texto extraído: {len(full_text)} caracteres.")
-        doc_metadata = extract_document_metadata(full_text)
-        doc_metadata["nombre_archivo"] = original_filename
+# --- ETAPA 1: EXTRACCIÓN Y CHUNKING (se ejecuta en un proceso aparte) ---
+def _make_chunk(point_key: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Arma un chunk listo para embeber: id determinista y payload (el texto va en `texto`)."""
+    return {
+        "id": str(uuid.uuid5(uuid.NAMESPACE_DNS, point_key)),
+        "payload": payload,
+    }
 
-        # Chunk logico
-        # Divide los chunks en base a articulos
-        article_pattern = r'(?=Artículo\s*[\dºª]+\b)'
-        chunks_text_raw = re.split(article_pattern, full_text, flags=re.IGNORECASE)
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    return chunk["payload"]["texto"]
 
-        min_chunk_length = 50 # Define un mínimo de caracteres para que un chunk sea válido
+def _read_header(pages: Iterator[str], min_chars: int) -> List[str]:
+    """Consume las primeras páginas hasta juntar `min_chars` caracteres."""
+    header, length = [], 0
+    for page in pages:
+        header.append(page)
+        length += len(page)
+        if length >= min_chars:
+            break
+    return header
 
-        chunks_text = [
-            chunk.strip() for chunk in chunks_text_raw 
-            if chunk.strip() and len(chunk.strip()) > min_chunk_length
-        ]
-        
-        print(f"📑 Documento dividido en {len(chunks_text)} chunks lógicos por artículo.")
-        if not chunks_text:
-            print(f"⚠️ Advertencia: No se generaron chunks válidos para '{original_filename}'.")
-            return
+def chunk_pdf(pages: Iterable[str], original_filename: str) -> Iterator[Dict[str, Any]]:
+    """
+    Procesa un PDF ESTRUCTURADO (ley, decreto) y lo divide por artículos.
+    Recibe el texto página por página y produce los chunks a medida que los
+    encuentra, sin armar el texto completo del documento.
+    """
+    print(f"\n--- [LEY/DECRETO] Procesando: {original_filename} ---")
+    pages = iter(pages)
+    # Los metadatos (número, fecha, organismo) están en el encabezado del documento.
+    header = _read_header(pages, METADATA_HEADER_CHARS)
+    doc_metadata = extract_document_metadata("".join(header)[:METADATA_HEADER_CHARS])
+    doc_metadata["nombre_archivo"] = original_filename
+    if doc_metadata.get("numero_documento") != "S/N":
+        doc_metadata["numero_normalizado"] = re.sub(r'[\.\-\/]', '', doc_metadata["numero_documento"])
+
+    text_length = 0
+    def counted(pages_iter):
+        nonlocal text_length
+        for page in pages_iter:
+            text_length += len(page)
+            yield page
+
+    # Chunk logico: un chunk por artículo, con su número ya capturado.
+    count = 0
+    for i, article in enumerate(iter_article_chunks(counted(chain(header, pages)))):
+        article_num = article["article"] or f"parrafo_{i}"
+        chunk_metadata = doc_metadata.copy()
+        chunk_metadata["articulo"] = article_num
+        chunk_metadata["pagina"] = article["page"]
+        chunk_metadata["texto"] = article["text"]
+        count += 1
+        yield _make_chunk(f"{original_filename}_{article_num}_{i}", chunk_metadata)
+
+    if text_length == 0:
+        print("❌ Error: El archivo está vacío o no se pudo extraer texto.")
+        return
+    print(f"✅ Texto extraído: {text_length} caracteres.")
+    print(f"📑 Documento dividido en {count} chunks lógicos por artículo.")
+    if not count:
+        print(f"⚠️ Advertencia: No se generaron chunks válidos para '{original_filename}'.")
 
-        embeddings = embedding_model.encode(chunks_text).tolist()
-        points_to_add = []
-        for i, chunk in enumerate(chunks_text):
-            chunk_metadata = doc_metadata.copy()
-            
-            if doc_metadata.get("numero_documento") != "S/N":
-                numero_normalizado = re.sub(r'[\.\-\/]', '', doc_metadata["numero_documento"])
-                chunk_metadata["numero_normalizado"] = numero_normalizado
-            
-            article_match = re.search(r"Artículo (\d+)", chunk, re.IGNORECASE)
-            article_num = article_match.group(1) if article_match else f"parrafo_{i}"
-            chunk_metadata["articulo"] = article_num
-            chunk_metadata["texto"] = chunk
-            
-            unique_string_id = f"{original_filename}_{article_num}_{i}"
-            point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string_id))
-
-            points_to_add.append(
-                PointStruct(id=point_id, vector=embeddings[i], payload=chunk_metadata)
-            )
-        
-        print(f"📦 Preparando para subir {len(points_to_add)} puntos a Qdrant.")
-        if points_to_add:
-            client.upsert(
-                collection_name=config.COLLECTION_NAME,
-                points=points_to_add,
-                wait=True
-            )
-            print(f"✔️ Carga a Qdrant completada para '{original_filename}'.")
+# --- FUNCIÓN DE CONTEXTO ---
+def chunk_pdf_context(pages: Iterable[str], original_filename: str) -> Iterator[Dict[str, Any]]:
+    """Procesa un PDF DE CONTEXTO y lo divide semánticamente, página por página."""
+    print(f"\n--- [CONTEXTO] Procesando: {original_filename} ---")
 
-    except Exception as e:
-        print(f"❌ Error fatal procesando el archivo {original_filename}: {e}")
+    subtema = ""
 
-# --- FUNCIÓN DE CONTEXTO ---
-def process_and_embed_pdf_context(pdf_path: str, original_filename: str):
-    """Procesa un PDF DE CONTEXTO, lo divide semánticamente y lo carga en Qdrant."""
-    try:
-        reader = PdfReader(pdf_path)
-        full_text = "".join(page.extract_text() for page in reader.pages if page.extract_text())
-        
-        print(f"\n--- [CONTEXTO] Procesando: {original_filename} ---")
-        if not full_text.strip():
-            print("❌ Error: El archivo está vacío o no se pudo extraer texto.")
-            return
+    if "Convenios" in original_filename:
+        subtema = "Convenios"
 
-        print(f"✅ Texto extraído: {len(full_text)} caracteres.")
+    if "Autoridades" in original_filename:
+        subtema = "Autoridades"
 
-        subtema = ""
+    if "Mision" in original_filename:
+        subtema = "Mision"
 
-        if "Convenios" in original_filename:
-            subtema = "Convenios"
+    if "DGR" in original_filename:
+        subtema = "DGR"
+    
+    # 1. Definir los metadatos básicos para este documento de contexto.
+    doc_metadata = {
+        "tipo_documento": "Contexto", # Metadato clave
+        "nombre_archivo": original_filename,
+        "subtema": subtema
+    }
 
-        if "Autoridades" in original_filename:
-            subtema = "Autoridades"
+    # 2. Dividir el texto usando la función semántica y crear los chunks con un ID único.
+    count = 0
+    for i, chunk in enumerate(iter_semantic_chunks(pages, CONTEXT_CHUNK_SIZE, CONTEXT_CHUNK_OVERLAP)):
+        chunk_metadata = doc_metadata.copy()
+        chunk_metadata["pagina"] = chunk["page"]
+        chunk_metadata["texto"] = chunk["text"]
+        count += 1
+        yield _make_chunk(f"{original_filename}_context_{i}", chunk_metadata)
+
+    print(f"📑 Documento dividido en {count} chunks semánticos.")
+    if not count:
+        print(f"⚠️ Advertencia: No se generaron chunks para '{original_filename}'.")
+
+def parse_pdf(
+    zip_path: str, member_name: str, original_filename: str, is_context: bool, workspace: str,
+    known_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Etapa de parseo del pipeline. Corre en el pool de procesos, por lo que
+    no toca el modelo de embeddings ni Qdrant: solo produce los chunks.
+    El PDF se lee directamente del ZIP a un archivo temporal "spooled": queda en
+    memoria hasta INGEST_SPOOL_MAX_MB y por encima pasa al workspace de la carga.
+    Los chunks se escriben a medida que salen del chunker, uno por línea, en un
+    archivo del workspace (`chunks_path`) que el proceso principal lee por lotes:
+    ni el worker ni el proceso principal tienen el documento entero en memoria.
+    Si el hash del contenido coincide con `known_hash` (el registrado con la misma
+    huella de pipeline), el archivo no cambió desde la última ingesta y no se parsea.
+    """
+    started_at = time.monotonic()
+    error, file_hash, unchanged, chunks_path = None, None, False, None
+    chunk_ids: List[str] = []
+    try:
+        with zipfile.ZipFile(zip_path) as zip_ref, \
+                tempfile.SpooledTemporaryFile(max_size=config.INGEST_SPOOL_MAX_MB * 1024 * 1024, dir=workspace) as pdf_file:
+            hasher = hashlib.sha256()
+            with zip_ref.open(member_name) as member:
+                for block in iter(lambda: member.read(1024 * 1024), b""):
+                    hasher.update(block)
+                    pdf_file.write(block)
+            file_hash = hasher.hexdigest()
+            if file_hash == known_hash:
+                unchanged = True
+                print(f"⏭️ {original_filename} no cambió desde la última ingesta.")
+            else:
+                pdf_file.seek(0)
+                pages = pdf_extractor.iter_pages(pdf_file, file_hash)
+                chunks = chunk_pdf_context(pages, original_filename) if is_context else chunk_pdf(pages, original_filename)
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=workspace, prefix="chunks_", suffix=".jsonl", delete=False,
+                ) as chunks_file:
+                    chunks_path = chunks_file.name
+                    for chunk in chunks:
+                        if config.HYBRID_SEARCH:
+                            # Vectores dispersos BM25: se calculan acá, en el pool de procesos.
+                            chunk["sparse"] = bm25.encode_document(_chunk_text(chunk), config.BM25_AVG_DOC_LENGTH)
+                        chunks_file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                        chunk_ids.append(chunk["id"])
+    except Exception as e:
+        print(f"❌ Error fatal procesando el archivo {original_filename}: {e}")
+        chunk_ids, error = [], str(e)
+        if chunks_path and os.path.exists(chunks_path):
+            os.remove(chunks_path)
+        chunks_path = None
+    return {
+        "filename": original_filename,
+        "chunks_path": chunks_path,
+        "chunk_ids": chunk_ids,
+        "error": error,
+        "hash": file_hash,
+        "unchanged": unchanged,
+        "seconds": time.monotonic() - started_at,
+    }
 
-        if "Mision" in original_filename:
-            subtema = "Mision"
+def read_chunks(chunks_path: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Chunks que dejó `parse_pdf`, de a uno. El archivo se borra al terminar de leerlo."""
+    if not chunks_path:
+        return
+    try:
+        with open(chunks_path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        os.remove(chunks_path)
 
-        if "DGR" in original_filename:
-            subtema = "DGR"
-        
-        # 1. Definir los metadatos básicos para este documento de contexto.
-        doc_metadata = {
-            "tipo_documento": "Contexto", # Metadato clave
-            "nombre_archivo": original_filename,
-            "subtema": subtema
+# --- PIPELINE DE INGESTA ---
+class IngestionPipeline:
+    """
+    Pipeline por etapas para cargar muchos PDFs:
+    1. Parseo y chunking en un pool de procesos (INGEST_PARSE_WORKERS).
+    2. Embeddings en lotes que mezclan chunks de varios documentos (INGEST_EMBED_BATCH_SIZE).
+    3. Upserts al almacén vectorial en lotes acotados (INGEST_UPSERT_BATCH_SIZE), varios en vuelo
+       a la vez (INGEST_UPSERT_CONCURRENCY), sin esperar uno al otro.
+    Las tres etapas se solapan: mientras se sube un lote ya se está embebiendo
+    el siguiente y parseando los próximos documentos.
+
+    Con un `manifest` (ver ingestion_manifest.py) la ingesta es incremental: los
+    archivos sin cambios (mismo contenido y misma huella de pipeline) se saltean,
+    los embeddings de textos ya conocidos se reutilizan y se borran los puntos
+    de artículos que desaparecieron.
+    """
+    def __init__(
+        self, parse_workers: int, embed_batch_size: int, upsert_batch_size: int, upsert_concurrency: int,
+        progress=None, manifest: Optional[IngestionManifest] = None,
+    ):
+        self.parse_workers = parse_workers
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_concurrency = upsert_concurrency
+        # Objeto opcional que recibe el avance (ver IngestionJob en ingestion_jobs.py).
+        self.progress = progress
+        self.manifest = manifest
+        self._upserts = deque()
+        # Archivos nuevos o modificados: nombre -> (hash, ids de sus puntos)
+        self._changed_files: Dict[str, Tuple[str, List[str]]] = {}
+        self._failed_files = set()
+        self._fingerprint: Optional[str] = None
+        self.stats = {
+            "documents": 0,
+            "documents_failed": 0,
+            "documents_unchanged": 0,
+            "chunks": 0,
+            "embeddings_reused": 0,
+            "points_upserted": 0,
+            "points_deleted": 0,
+            "upsert_batches_failed": 0,
+            "parse_seconds": 0.0,
+            "embed_seconds": 0.0,
+            "upsert_seconds": 0.0,
+            "wall_seconds": 0.0,
         }
-
-        # 2. Dividir el texto usando la nueva función semántica.
-        chunks_text = split_text_into_chunks(full_text, chunk_size=1200, chunk_overlap=200)
-        
-        print(f"📑 Documento dividido en {len(chunks_text)} chunks semánticos.")
-        if not chunks_text:
-            print(f"⚠️ Advertencia: No se generaron chunks para '{original_filename}'.")
-            return
-        
-        # 3. Generar embeddings y crear los puntos para Qdrant.
-        embeddings = embedding_model.encode(chunks_text).tolist()
-        points_to_add = []
-        for i, chunk in enumerate(chunks_text):
-            chunk_metadata = doc_metadata.copy()
-            chunk_metadata["texto"] = chunk
-            
-            # Generamos un ID único para cada chunk de contexto
-            unique_string_id = f"{original_filename}_context_{i}"
-            point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string_id))
-
-            points_to_add.append(
-                PointStruct(
-                    id=point_id,
-                    vector=embeddings[i],
-                    payload=chunk_metadata
+        self._stats_lock = threading.Lock()
+
+    def run(self, zip_path: str, pdf_members: List[Tuple[str, str]], is_context: bool, workspace: str) -> Dict[str, Any]:
+        """
+        Procesa los PDFs del ZIP, dados como (nombre dentro del ZIP, nombre a mostrar),
+        y devuelve las métricas por etapa. `workspace` es el directorio temporal de esta carga.
+        """
+        started_at = time.monotonic()
+        self._fingerprint = pipeline_fingerprint(is_context)
+        known_hashes = self.manifest.file_hashes(self._fingerprint) if self.manifest else {}
+        # "spawn" evita heredar hilos y locks del proceso del servidor (torch, uvicorn).
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        upsert_pool = ThreadPoolExecutor(max_workers=self.upsert_concurrency, thread_name_prefix="ingest-upsert")
+        try:
+            pending_chunks: List[Dict[str, Any]] = []
+            files = iter(pdf_members)
+            parsing = set()
+
+            def submit(member_name, filename):
+                return parse_pool.submit(
+                    parse_pdf, zip_path, member_name, filename, is_context, workspace, known_hashes.get(filename)
                 )
-            )
-
-        print(f"📦 Preparando para subir {len(points_to_add)} puntos a Qdrant.")
-        if points_to_add:
-            client.upsert(
-                collection_name=config.COLLECTION_NAME,
-                points=points_to_add,
-                wait=True
-            )
-            print(f"✔️ Carga a Qdrant completada para '{original_filename}'.")
 
-    except Exception as e:
-        print(f"❌ Error fatal procesando el archivo {original_filename}: {e}")
+            # Se mantienen como mucho 2 documentos por worker en parseo para acotar la memoria.
+            for member_name, filename in islice(files, self.parse_workers * 2):
+                parsing.add(submit(member_name, filename))
+
+            while parsing:
+                done, parsing = wait(parsing, return_when=FIRST_COMPLETED)
+                for future in done:
+                    document = future.result()
+                    next_file = next(files, None)
+                    if next_file:
+                        parsing.add(submit(*next_file))
+                    self._record_document(document)
+                    # Los chunks se leen de a lotes: en memoria solo está el lote en curso.
+                    for chunk in read_chunks(document["chunks_path"]):
+                        pending_chunks.append(chunk)
+                        if len(pending_chunks) >= self.embed_batch_size:
+                            self._embed_and_upsert(pending_chunks, upsert_pool)
+                            pending_chunks = []
+
+            if pending_chunks:
+                self._embed_and_upsert(pending_chunks, upsert_pool)
+
+            while self._upserts:
+                self._upserts.popleft().result()
+        finally:
+            parse_pool.shutdown(wait=True)
+            upsert_pool.shutdown(wait=True)
+
+        # Primero se persiste el almacén (incluidos los puntos obsoletos borrados) y recién
+        # después se registran los archivos: el manifiesto nunca declara algo que no se guardó.
+        completed = self._delete_stale_points() if self.manifest else []
+        try:
+            vector_store.flush()
+        except Exception as e:
+            print(f"❌ Error guardando el almacén vectorial: {e}")
+            # Sin registrar nada en el manifiesto, la próxima carga vuelve a procesar estos archivos.
+            raise RuntimeError(f"No se pudieron guardar los cambios del almacén vectorial: {e}") from e
+        if self.manifest:
+            self._record_files(completed)
+        try:
+            # Recupera el lugar de los textos borrados o reemplazados (ver ChunkTextStore).
+            chunk_text_store.maybe_compact()
+        except Exception as e:
+            print(f"⚠️ No se pudo compactar el almacén de textos: {e}")
+
+        self.stats["wall_seconds"] = time.monotonic() - started_at
+        return self.report()
+
+    def _record_document(self, document: Dict[str, Any]):
+        self.stats["documents"] += 1
+        self.stats["parse_seconds"] += document["seconds"]
+        if document["unchanged"]:
+            self.stats["documents_unchanged"] += 1
+            if self.progress:
+                self.progress.document_unchanged(document["filename"])
+            return
+        self.stats["chunks"] += len(document["chunk_ids"])
+        if document["error"]:
+            self.stats["documents_failed"] += 1
+        else:
+            self._changed_files[document["filename"]] = (document["hash"], document["chunk_ids"])
+        if self.progress:
+            self.progress.document_parsed(document["filename"], len(document["chunk_ids"]), document["error"])
+
+    def _embed(self, chunks: List[Dict[str, Any]]) -> List[List[float]]:
+        """Embeddings de los chunks, reutilizando los guardados en el manifiesto."""
+        texts = [_chunk_text(chunk) for chunk in chunks]
+        if not self.manifest:
+            return get_embedding_model().encode(texts, batch_size=len(texts)).tolist()
+
+        hashes = [IngestionManifest.text_hash(text) for text in texts]
+        known = self.manifest.get_embeddings(hashes)
+        missing = {h: text for h, text in zip(hashes, texts) if h not in known}
+        if missing:
+            computed = get_embedding_model().encode(list(missing.values()), batch_size=len(missing)).tolist()
+            new_embeddings = dict(zip(missing.keys(), computed))
+            self.manifest.put_embeddings(new_embeddings)
+            known.update(new_embeddings)
+        self.stats["embeddings_reused"] += len(texts) - len(missing)
+        return [known[h] for h in hashes]
+
+    def _embed_and_upsert(self, chunks: List[Dict[str, Any]], upsert_pool: ThreadPoolExecutor):
+        started_at = time.monotonic()
+        embeddings = self._embed(chunks)
+        self.stats["embed_seconds"] += time.monotonic() - started_at
+
+        payloads = [chunk["payload"] for chunk in chunks]
+        if config.CHUNK_TEXT_STORE:
+            # El texto queda en el almacén local y el payload del punto solo lleva metadatos.
+            chunk_text_store.put_many([(chunk["id"], _chunk_text(chunk)) for chunk in chunks])
+            payloads = [{key: value for key, value in payload.items() if key != "texto"} for payload in payloads]
+
+        points = [
+            {"id": chunk["id"], "vector": embedding, "sparse": chunk.get("sparse"), "payload": payload}
+            for chunk, embedding, payload in zip(chunks, embeddings, payloads)
+        ]
+        for i in range(0, len(points), self.upsert_batch_size):
+            # Límite de upserts en vuelo: se espera al más antiguo antes de enviar otro.
+            while len(self._upserts) >= self.upsert_concurrency * 2:
+                self._upserts.popleft().result()
+            self._upserts.append(upsert_pool.submit(self._upsert, points[i:i + self.upsert_batch_size]))
+
+    def _upsert(self, points: List[StorePoint]):
+        started_at = time.monotonic()
+        try:
+            vector_store.upsert(points)
+            with self._stats_lock:
+                self.stats["points_upserted"] += len(points)
+            if self.progress:
+                self.progress.points_upserted(Counter(point["payload"]["nombre_archivo"] for point in points))
+        except Exception as e:
+            print(f"❌ Error subiendo un lote de {len(points)} puntos al almacén vectorial: {e}")
+            with self._stats_lock:
+                self.stats["upsert_batches_failed"] += 1
+                self._failed_files.update(point["payload"]["nombre_archivo"] for point in points)
+            if self.progress:
+                self.progress.upsert_failed(Counter(point["payload"]["nombre_archivo"] for point in points), str(e))
+        finally:
+            with self._stats_lock:
+                self.stats["upsert_seconds"] += time.monotonic() - started_at
+
+    def _delete_stale_points(self) -> List[Tuple[str, str, List[str], List[str]]]:
+        """
+        Borra del almacén los puntos que los archivos subidos completos tenían antes y
+        ya no existen (artículos eliminados o renumerados). Devuelve esos archivos como
+        (nombre, hash, ids, ids borrados), para registrarlos después del flush.
+        Los archivos con algún lote fallido no se devuelven: se reprocesan en la próxima carga.
+        """
+        completed = []
+        for filename, (file_hash, point_ids) in self._changed_files.items():
+            if filename in self._failed_files:
+                continue
+            stale_ids = list(set(self.manifest.file_point_ids(filename)) - set(point_ids))
+            try:
+                if stale_ids:
+                    vector_store.delete(stale_ids)
+                    self.stats["points_deleted"] += len(stale_ids)
+                    print(f"🗑️ {len(stale_ids)} puntos obsoletos de {filename} eliminados.")
+                completed.append((filename, file_hash, point_ids, stale_ids))
+            except Exception as e:
+                print(f"❌ Error borrando los puntos obsoletos de {filename}: {e}")
+        return completed
+
+    def _record_files(self, completed: List[Tuple[str, str, List[str], List[str]]]):
+        """Registra en el manifiesto los archivos ya guardados en el almacén."""
+        for filename, file_hash, point_ids, stale_ids in completed:
+            try:
+                if stale_ids:
+                    # Sus textos también, si estaban en el almacén local (ver CHUNK_TEXT_STORE).
+                    chunk_text_store.delete_many(stale_ids)
+                self.manifest.record_file(filename, file_hash, self._fingerprint, point_ids)
+            except Exception as e:
+                print(f"❌ Error actualizando el manifiesto de {filename}: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        """Métricas del pipeline, con el rendimiento de cada etapa."""
+        stats = self.stats
+
+        def rate(count, seconds):
+            return round(count / seconds, 2) if seconds else 0.0
+
+        return {
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in stats.items()},
+            "parse_docs_per_second": rate(stats["documents"], stats["parse_seconds"] / self.parse_workers),
+            "embed_chunks_per_second": rate(stats["chunks"], stats["embed_seconds"]),
+            "upsert_points_per_second": rate(stats["points_upserted"], stats["upsert_seconds"] / self.upsert_concurrency),
+            "overall_chunks_per_second": rate(stats["chunks"], stats["wall_seconds"]),
+        }
 
 
-def process_pdfs_from_zip(zip_path: str, is_context: bool = False):
-    """Función principal que orquesta la extracción y procesamiento de un ZIP."""
+def list_pdf_members(zip_ref: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """
+    Lista los PDFs del ZIP, incluidos los de subdirectorios, como
+    (nombre dentro del ZIP, nombre a mostrar). El nombre a mostrar es el del
+    archivo sin directorios, salvo que se repita en el ZIP.
+    """
+    members = [
+        info.filename for info in zip_ref.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(".pdf")
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith("._")
+    ]
+    basenames = Counter(os.path.basename(name) for name in members)
+    return [
+        (name, os.path.basename(name) if basenames[os.path.basename(name)] == 1 else name)
+        for name in members
+    ]
+
+def process_pdfs_from_zip(zip_path: str, is_context: bool = False, progress=None):
+    """
+    Función principal que orquesta el procesamiento de un ZIP.
+    Los PDFs se leen directamente del ZIP, sin extraerlo a disco, y cada carga
+    usa su propio workspace temporal, así que varias cargas pueden correr a la vez.
+    `progress` recibe el avance por archivo (ver IngestionJob).
+    """
     try:
-        extraction_path = os.path.join(os.path.dirname(zip_path), "extracted")
-        if os.path.exists(extraction_path): shutil.rmtree(extraction_path)
-        os.makedirs(extraction_path)
-
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extraction_path)
+            pdf_members = list_pdf_members(zip_ref)
 
-        pdf_files = [f for f in os.listdir(extraction_path) if f.lower().endswith(".pdf")]
+        pdf_files = [filename for _, filename in pdf_members]
+        if progress:
+            progress.files_found(pdf_files)
         if not pdf_files: return 0
 
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(extraction_path, pdf_file)
-            
-            if is_context:
-                process_and_embed_pdf_context(pdf_path, pdf_file)
-            else:
-                process_and_embed_pdf(pdf_path, pdf_file)
+        manifest = get_ingestion_manifest() if config.INGEST_INCREMENTAL else None
+        if manifest and collection_stats.refresh_sync()["points_count"] == 0:
+            # La colección se vació o se recreó: el manifiesto ya no refleja lo que hay en el almacén.
+            manifest.forget_files()
+
+        pipeline = IngestionPipeline(
+            parse_workers=config.INGEST_PARSE_WORKERS,
+            embed_batch_size=config.INGEST_EMBED_BATCH_SIZE,
+            upsert_batch_size=config.INGEST_UPSERT_BATCH_SIZE,
+            upsert_concurrency=config.INGEST_UPSERT_CONCURRENCY,
+            progress=progress,
+            manifest=manifest,
+        )
+        try:
+            with tempfile.TemporaryDirectory(dir=config.TEMP_UPLOAD_DIR, prefix="workspace_") as workspace:
+                stats = pipeline.run(zip_path, pdf_members, is_context, workspace)
+            print(f"✔️ Ingesta completada: {stats}")
+            if progress:
+                progress.pipeline_finished(stats)
+        finally:
+            # La colección cambió: las respuestas guardadas y sus datos pueden estar desactualizados.
+            answer_cache.invalidate()
+            collection_stats.invalidate()
 
-        shutil.rmtree(extraction_path)
         return len(pdf_files)
     except zipfile.BadZipFile:
         raise HTTPException(status_code=400, detail="El archivo subido no es un ZIP válido.")
     finally:
-        if os.path.exists(zip_path): os.remove(zip_path)
\ No newline at end of file
+        if os.path.exists(zip_path): os.remove(zip_path)
@@ -0,0 +1,204 @@
+# services/pdf_extraction.py
+import io
+import json
+import multiprocessing
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Type
+
+import config
+
+
+# --- BACKENDS DE EXTRACCIÓN ---
+class PdfBackend(ABC):
+    """Extrae el texto de las páginas de un PDF. Cada página se procesa una sola vez."""
+    name = "base"
+
+    @abstractmethod
+    def page_count(self, pdf_file: BinaryIO) -> int:
+        pass
+
+    @abstractmethod
+    def iter_pages(self, pdf_file: BinaryIO) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def extract_pages(self, pdf_file: BinaryIO, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Texto de las páginas [start, stop)."""
+        pass
+
+
+class PypdfBackend(PdfBackend):
+    name = "pypdf"
+
+    def page_count(self, pdf_file: BinaryIO) -> int:
+        from pypdf import PdfReader
+        return len(PdfReader(pdf_file).pages)
+
+    def iter_pages(self, pdf_file: BinaryIO) -> Iterator[str]:
+        from pypdf import PdfReader
+        for page in PdfReader(pdf_file).pages:
+            yield page.extract_text() or ""
+
+    def extract_pages(self, pdf_file: BinaryIO, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        from pypdf import PdfReader
+        pages = PdfReader(pdf_file).pages
+        return [pages[i].extract_text() or "" for i in range(start, len(pages) if stop is None else stop)]
+
+
+class PyMuPDFBackend(PdfBackend):
+    """Backend más rápido basado en PyMuPDF (`pip install pymupdf`, opcional)."""
+    name = "pymupdf"
+
+    def page_count(self, pdf_file: BinaryIO) -> int:
+        import fitz
+        with fitz.open(stream=pdf_file.read(), filetype="pdf") as document:
+            return document.page_count
+
+    def iter_pages(self, pdf_file: BinaryIO) -> Iterator[str]:
+        import fitz
+        with fitz.open(stream=pdf_file.read(), filetype="pdf") as document:
+            for page in document:
+                yield page.get_text()
+
+    def extract_pages(self, pdf_file: BinaryIO, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        import fitz
+        with fitz.open(stream=pdf_file.read(), filetype="pdf") as document:
+            stop = document.page_count if stop is None else stop
+            return [document[i].get_text() for i in range(start, stop)]
+
+
+BACKENDS: Dict[str, Type[PdfBackend]] = {
+    PypdfBackend.name: PypdfBackend,
+    PyMuPDFBackend.name: PyMuPDFBackend,
+}
+
+
+def _extract_page_range(backend_name: str, pdf_bytes: bytes, start: int, stop: int) -> List[str]:
+    """Extrae un rango de páginas en un proceso aparte (extracción en paralelo)."""
+    return BACKENDS[backend_name]().extract_pages(io.BytesIO(pdf_bytes), start, stop)
+
+
+# --- EXTRACTOR ---
+class PdfTextExtractor:
+    """
+    Extracción de texto de PDFs, página por página:
+    - Cada página se extrae una sola vez y se entrega apenas está lista, así
+      el chunking avanza sin esperar (ni guardar) el documento completo.
+    - Los documentos con al menos `parallel_min_pages` páginas se reparten en
+      rangos entre `parallel_workers` procesos (si es mayor a 1).
+    - El resultado se guarda en disco por hash del archivo (una página por
+      línea), así volver a chunkear el mismo PDF no requiere parsearlo de nuevo.
+      La caché se limita a `cache_max_bytes`: al superarlo se borran las
+      entradas usadas hace más tiempo.
+    """
+    def __init__(
+        self, backend: PdfBackend, cache_dir: Optional[str], parallel_workers: int, parallel_min_pages: int,
+        cache_max_bytes: int = 0,
+    ):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.parallel_workers = parallel_workers
+        self.parallel_min_pages = parallel_min_pages
+
+    def iter_pages(self, pdf_file: BinaryIO, file_hash: Optional[str] = None) -> Iterator[str]:
+        """Texto de cada página, en orden."""
+        cache_path = self._cache_path(file_hash)
+        if cache_path and os.path.exists(cache_path):
+            # La fecha de modificación marca el último uso (ver _evict).
+            os.utime(cache_path)
+            with open(cache_path, encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+            return
+
+        if not cache_path:
+            yield from self._extract_pages(pdf_file)
+            return
+
+        # Se escribe a un temporal y se publica solo si se extrajeron todas las páginas.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for page in self._extract_pages(pdf_file):
+                    f.write(json.dumps(page, ensure_ascii=False) + "\n")
+                    yield page
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=cache_path)
+
+    def _evict(self, keep: str):
+        """Borra las entradas usadas hace más tiempo hasta que la caché entre en `cache_max_bytes`."""
+        if self.cache_max_bytes <= 0:
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".jsonl") and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if os.path.exists(keep):
+            total += os.path.getsize(keep)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # Otro proceso de parseo ya la borró.
+                pass
+            total -= size
+        if removed:
+            print(f"🧹 Caché de texto de PDFs: {removed} entradas antiguas eliminadas.")
+
+    def _cache_path(self, file_hash: Optional[str]) -> Optional[str]:
+        if not self.cache_dir or not file_hash:
+            return None
+        return os.path.join(self.cache_dir, f"{file_hash}_{self.backend.name}.jsonl")
+
+    def _extract_pages(self, pdf_file: BinaryIO) -> Iterator[str]:
+        if self.parallel_workers <= 1:
+            yield from self.backend.iter_pages(pdf_file)
+            return
+
+        page_count = self.backend.page_count(pdf_file)
+        pdf_file.seek(0)
+        if page_count < self.parallel_min_pages:
+            yield from self.backend.iter_pages(pdf_file)
+            return
+
+        pdf_bytes = pdf_file.read()
+        ranges = self._page_ranges(page_count)
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = pool.map(
+                _extract_page_range,
+                [self.backend.name] * len(ranges),
+                [pdf_bytes] * len(ranges),
+                *zip(*ranges),
+            )
+            # `map` entrega los rangos en orden a medida que terminan.
+            for part in parts:
+                yield from part
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        size = -(-page_count // self.parallel_workers)
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+pdf_extractor = PdfTextExtractor(
+    backend=BACKENDS[config.PDF_EXTRACTION_BACKEND](),
+    cache_dir=config.PDF_TEXT_CACHE_DIR or None,
+    cache_max_bytes=int(config.PDF_TEXT_CACHE_MAX_MB * 1024 * 1024),
+    parallel_workers=config.PDF_EXTRACTION_WORKERS,
+    parallel_min_pages=config.PDF_PARALLEL_MIN_PAGES,
+)
@@ -1,12 +1,152 @@
-from llm_guard.input_scanners import PromptInjection
+import threading
+import time
+from importlib import metadata
+from typing import Any, List, Optional, Tuple
 
-print("🔄 Cargando el modelo del escáner...")
-scanner = PromptInjection()
-print("✅ Modelo cargado. La función está lista para usarse.")
+import config
+from batching import MicroBatcher
+from caching import LRUCache, SingleFlight
+from metrics import LatencyRecorder
 
-def is_valid_prompt(user_input: str) -> bool:
+# El modelo del escáner se carga de forma diferida (ver get_scanner).
+_scanner = None
+_scanner_lock = threading.Lock()
+
+def get_scanner():
+    """Devuelve el escáner PromptInjection, cargándolo la primera vez (seguro entre hilos)."""
+    global _scanner
+    if _scanner is None:
+        with _scanner_lock:
+            if _scanner is None:
+                from llm_guard.input_scanners import PromptInjection
+
+                print("🔄 Cargando el modelo del escáner...")
+                _scanner = PromptInjection()
+                print("✅ Modelo cargado. La función está lista para usarse.")
+    return _scanner
+
+def is_scanner_loaded() -> bool:
+    return _scanner is not None
+
+# Veredictos ya calculados, por texto escaneado (el mismo que recibe el modelo:
+# el escáner distingue mayúsculas, así que no se normaliza).
+verdict_cache = LRUCache(
+    name="injection_verdicts",
+    max_entries=config.INJECTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.INJECTION_CACHE_TTL or None,
+)
+scan_latency = LatencyRecorder()
+# Mensajes idénticos que llegan juntos se escanean una sola vez.
+scan_requests = SingleFlight(name="injection_scans", enabled=config.REQUEST_COALESCING)
+
+def _truncate(user_input: str) -> str:
+    """
+    Limita el largo del texto antes de la inferencia (INJECTION_SCAN_MAX_CHARS).
+    Conserva el principio y el final, que es donde suelen ir las instrucciones inyectadas.
+    """
+    max_chars = config.INJECTION_SCAN_MAX_CHARS
+    if max_chars <= 0 or len(user_input) <= max_chars:
+        return user_input
+    half = max_chars // 2
+    return f"{user_input[:half]} ... {user_input[-half:]}"
+
+# Versiones de llm-guard cuyo PromptInjection se puede ejecutar en lote (ver _batch_internals).
+BATCH_SCAN_LLM_GUARD_VERSIONS = ("0.3.",)
+_internals_checked = False
+_internals: Optional[Tuple[Any, Any, float, str]] = None
+# Etiqueta de inyección que usa `PromptInjection.scan` si el modelo no configura otra.
+DEFAULT_INJECTION_LABEL = "INJECTION"
+
+def _injection_label(scanner, pipeline) -> Optional[str]:
+    """
+    Etiqueta que el modelo configurado del escáner usa para "inyección".
+    Devuelve None si el modelo no la produce (no se puede interpretar su puntaje).
+    """
+    model = getattr(scanner, "_model", None)
+    label = getattr(model, "output_label", None) or (getattr(model, "kwargs", None) or {}).get("output_label")
+    label = label or DEFAULT_INJECTION_LABEL
+    model_labels = getattr(getattr(getattr(pipeline, "model", None), "config", None), "id2label", None)
+    if model_labels and label not in model_labels.values():
+        return None
+    return label
+
+def _batch_internals() -> Optional[Tuple[Any, Any, float, str]]:
+    """
+    Pipeline, tipo de coincidencia, umbral y etiqueta de inyección del escáner,
+    para escanear en lote. Son atributos privados de llm-guard: solo se usan con
+    una versión probada y si siguen existiendo; si no, se devuelve None y se
+    escanea uno por uno.
+    """
+    global _internals_checked, _internals
+    if _internals_checked:
+        return _internals
+    scanner = get_scanner()
+    try:
+        version = metadata.version("llm-guard")
+    except metadata.PackageNotFoundError:
+        version = "desconocida"
+    pipeline = getattr(scanner, "_pipeline", None)
+    match_type = getattr(scanner, "_match_type", None)
+    threshold = getattr(scanner, "_threshold", None)
+    label = _injection_label(scanner, pipeline) if callable(pipeline) else None
+    if (
+        version.startswith(BATCH_SCAN_LLM_GUARD_VERSIONS)
+        and callable(pipeline)
+        and callable(getattr(match_type, "get_inputs", None))
+        and isinstance(threshold, (int, float))
+        and label is not None
+    ):
+        _internals = (pipeline, match_type, float(threshold), label)
+    else:
+        print(f"⚠️ llm-guard {version}: no se puede escanear en lote, se escanea mensaje por mensaje.")
+    _internals_checked = True
+    return _internals
+
+def _scan_batch(prompts: List[str]) -> List[bool]:
+    """
+    Escanea varios prompts con una sola pasada del modelo.
+    Reproduce la lógica de `PromptInjection.scan`; si la versión instalada de
+    llm-guard no es una de las probadas, escanea uno por uno con `scan`.
+    """
+    internals = _batch_internals()
+    if internals is None:
+        scanner = get_scanner()
+        return [scanner.scan(prompt)[1] for prompt in prompts]
+    pipeline, match_type, threshold, injection_label = internals
+
+    inputs = []
+    owners = []
+    for i, prompt in enumerate(prompts):
+        if prompt.strip() == "":
+            continue
+        for model_input in match_type.get_inputs(prompt):
+            inputs.append(model_input)
+            owners.append(i)
+
+    verdicts = [True] * len(prompts)
+    if not inputs:
+        return verdicts
+
+    for owner, result in zip(owners, pipeline(inputs)):
+        injection_score = round(
+            result["score"] if result["label"] == injection_label else 1 - result["score"],
+            2,
+        )
+        if injection_score > threshold:
+            verdicts[owner] = False
+    return verdicts
+
+injection_batcher = MicroBatcher(
+    name="injection_scanner",
+    batch_fn=_scan_batch,
+    max_batch_size=config.INJECTION_BATCH_MAX_SIZE,
+    max_wait_ms=config.INJECTION_BATCH_MAX_WAIT_MS,
+)
+
+async def is_valid_prompt(user_input: str) -> bool:
     """
     Analiza el texto de un usuario con LLM Guard para detectar inyección de prompts.
+    Los mensajes concurrentes se escanean en lote y los veredictos se guardan en caché.
 
     Args:
         user_input: El string de entrada proporcionado por el usuario.
@@ -15,5 +155,21 @@ def is_valid_prompt(user_input: str) -> bool:
         True si el prompt es considerado seguro (válido).
         False si se detecta un posible ataque de inyección (inválido).
     """
-    _, is_valid = scanner.scan(user_input)
-    return is_valid
\ No newline at end of file
+    started_at = time.monotonic()
+    text = _truncate(user_input)
+    is_valid = verdict_cache.get(text)
+    if is_valid is None:
+        # El escáner es un modelo transformer: se ejecuta en lote en el pool de inferencia.
+        is_valid = await scan_requests.run(text, lambda: injection_batcher.submit(text))
+        verdict_cache.put(text, is_valid)
+    scan_latency.record(time.monotonic() - started_at)
+    return is_valid
+
+def injection_scanner_stats():
+    """Latencia de escaneo, caché de veredictos y tamaño de los lotes."""
+    return {
+        "latency": scan_latency.stats(),
+        "cache": verdict_cache.stats(),
+        "batching": injection_batcher.stats(),
+        "coalescing": scan_requests.stats(),
+    }
@@ -1,12 +1,31 @@
 # services/search.py
 import re
+import time
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException
 
-from qdrant_client.http import models
-from vector_db import client, embedding_model
+from vector_db import embedding_batcher
+from vector_store import SearchHit, SearchRequest, collection_stats, vector_store
+import bm25
+from caching import LRUCache, normalize_text
+from metrics import LatencyRecorder
+from model_executor import run_in_model_executor
+from services.chunk_text_store import chunk_text_store
 import config
 
+# Latencia de las consultas al almacén vectorial (para ajustar HNSW y cuantización).
+search_latency = LatencyRecorder()
+
+# Caché de embeddings de consultas, compartida por todas las búsquedas.
+# Las preguntas en Telegram se repiten mucho ("clave fiscal", "monotributo"...).
+query_embedding_cache = LRUCache(
+    name="query_embeddings",
+    max_entries=config.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+    max_bytes=int(config.QUERY_EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=config.QUERY_EMBEDDING_CACHE_TTL or None,
+    sizeof=lambda embedding: embedding.nbytes,
+)
+
 def extract_context(query: str) -> str | None:
     # \b asegura que se busquen palabras completas (evita que "mision" coincida en "admision")
     pattern_mision = r'\b(mision(es)?|vision(es)?|valor(es)?|calidad(es)?)\b'
@@ -44,128 +63,181 @@ def extract_article_number(query: str) -> str | None:
         return match.group(1)
     return None
 
+# --- EMBEDDING DE CONSULTAS ---
+async def embed_query(query: str) -> List[float]:
+    """
+    Devuelve el embedding de la consulta, usando la caché por texto normalizado.
+    En caso de fallo, la inferencia se agrupa con otras consultas concurrentes
+    y corre fuera del event loop.
+    """
+    key = normalize_text(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = await embedding_batcher.submit(key)
+        query_embedding_cache.put(key, embedding)
+    return embedding.tolist()
+
+# --- FILTROS DE METADATOS ---
+def build_metadata_conditions(query: str) -> Dict[str, str]:
+    """
+    Decide qué filtro de metadatos corresponde a la consulta.
+    Devuelve un diccionario campo -> valor (todas las condiciones deben cumplirse).
+    Prioridad 1: Filtros legales (ley, decreto, artículo).
+    Prioridad 2: Filtros de contexto (palabras clave).
+    Sin condiciones: búsqueda semántica global.
+    """
+    key_number = extract_key_number(query)
+    article_number = extract_article_number(query)
+    subtema = extract_context(query)
+
+    conditions = {}
+    
+    # 1. PRIORIDAD: Búsqueda legal. Si se menciona ley/decreto/art, se ignora el contexto.
+    if key_number or article_number:
+        if key_number:
+            conditions["numero_normalizado"] = key_number
+        if article_number:
+            conditions["articulo"] = article_number
+            
+    # 2. SI NO ES LEGAL, ¿es de contexto?
+    elif subtema:
+        conditions["tipo_documento"] = "Contexto"
+        conditions["subtema"] = subtema
+
+    return conditions
+
+def is_exact_lookup(conditions: Dict[str, str]) -> bool:
+    """Ley y artículo determinan la respuesta: no hace falta búsqueda semántica."""
+    return "numero_normalizado" in conditions and "articulo" in conditions
+
+# --- CONSULTAS AL ALMACÉN VECTORIAL ---
+# Campo del payload con el texto del chunk (o, con CHUNK_TEXT_STORE, en el almacén local).
+TEXT_FIELD = "texto"
+
+def _payload_fields(payload_fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Campos del payload a pedir: los que usa el llamador, más el texto. None = todos."""
+    if payload_fields is None:
+        return None
+    return [*payload_fields, TEXT_FIELD]
+
+def _build_query(
+    query_embedding: List[float], query_text: str, conditions: Dict[str, str], n_results: int,
+    payload_fields: Optional[List[str]] = None,
+) -> SearchRequest:
+    """
+    Arma una consulta para el almacén. Lleva también el vector disperso (BM25) de
+    la consulta: con búsqueda híbrida, Qdrant lo combina con el denso.
+    """
+    return {
+        "vector": query_embedding,
+        "sparse": bm25.encode_query(query_text),
+        "conditions": conditions,
+        "limit": n_results,
+        "payload_fields": payload_fields,
+    }
+
+async def _run_queries(requests: List[SearchRequest]) -> List[List[SearchHit]]:
+    """Ejecuta todas las consultas juntas (con Qdrant, en un único pedido)."""
+    started_at = time.monotonic()
+    results = await vector_store.search_batch(requests)
+    search_latency.record(time.monotonic() - started_at)
+    return results
+
 # --- FUNCIÓN HELPER PARA FORMATEAR RESULTADOS ---
-def _format_qdrant_results(results: List[models.ScoredPoint]) -> Dict[str, Any]:
-    """Convierte la salida de Qdrant al formato que esperaba el router (similar a ChromaDB)."""
+async def _format_results(results: List[SearchHit]) -> Dict[str, Any]:
+    """Convierte la salida del almacén al formato que esperaba el router (similar a ChromaDB)."""
     if not results:
-        return {'documents': [[]], 'metadatas': [[]]}
+        return {'documents': [[]], 'metadatas': [[]], 'scores': [[]]}
+
+    # Los puntos ingeridos con CHUNK_TEXT_STORE no llevan el texto en el payload: se busca
+    # por id en el almacén local, aunque la opción se haya desactivado después.
+    # La lectura (y la carga del índice, la primera vez) corre fuera del event loop.
+    missing = [point.id for point in results if TEXT_FIELD not in point.payload]
+    stored_texts = await run_in_model_executor(chunk_text_store.get_many, missing) if missing else {}
 
     documents = []
     metadatas = []
     for point in results:
-        # El texto del documento está en el payload, lo extraemos.
-        documents.append(point.payload.pop("texto", "")) 
-        metadatas.append(point.payload)
+        documents.append(point.payload.get(TEXT_FIELD) or stored_texts.get(point.id, ""))
+        metadatas.append({key: value for key, value in point.payload.items() if key != TEXT_FIELD})
 
     # Devolvemos el formato anidado que el router espera: {'documents': [[doc1, doc2]], ...}
-    return {'documents': [documents], 'metadatas': [metadatas]}
+    # `scores` es None en los resultados de la búsqueda exacta (sin puntaje).
+    return {'documents': [documents], 'metadatas': [metadatas], 'scores': [[point.score for point in results]]}
 
 
 # --- FUNCIÓN DE BÚSQUEDA PRINCIPAL ---
-def perform_similarity_search(query: str, n_results: int):
+async def perform_similarity_search(query: str, n_results: int, payload_fields: Optional[List[str]] = None):
     """
     Realiza una búsqueda inteligente decidiendo el tipo de filtro a aplicar.
     Prioridad 1: Filtros legales (ley, decreto, artículo).
     Prioridad 2: Filtros de contexto (palabras clave).
     Prioridad 3: Búsqueda semántica global.
+    `payload_fields` son los metadatos que necesita el llamador (None = todos);
+    el texto de los chunks se devuelve siempre.
     """
     
-    collection_info = client.get_collection(collection_name=config.COLLECTION_NAME)
-    if collection_info.points_count == 0:
+    if await collection_stats.points_count() == 0:
         raise HTTPException(status_code=404, detail="No hay documentos en la base de datos.")
 
-    key_number = extract_key_number(query)
-    article_number = extract_article_number(query)
-    subtema = extract_context(query)
-
-    # Construcción de filtros para Qdrant
-    filter_conditions = []
-    
-    # 1. PRIORIDAD: Búsqueda legal. Si se menciona ley/decreto/art, se ignora el contexto.
-    if key_number or article_number:
-        print("Detectada búsqueda legal explícita.")
-        if key_number:
-            filter_conditions.append(models.FieldCondition(
-                key="numero_normalizado",
-                match=models.MatchValue(value=key_number)
-            ))
-        if article_number:
-            filter_conditions.append(models.FieldCondition(
-                key="articulo",
-                match=models.MatchValue(value=article_number)
-            ))
-            
-    # 2. SI NO ES LEGAL, ¿es de contexto?
-    elif subtema:
+    conditions = build_metadata_conditions(query)
+    if "subtema" in conditions:
         print("Detectada búsqueda de contexto.")
-        filter_conditions.append(models.FieldCondition(
-            key="tipo_documento",
-            match=models.MatchValue(value="Contexto")
-        ))
-        filter_conditions.append(models.FieldCondition(
-            key="subtema",
-            match=models.MatchValue(value=subtema)
-        ))
-    
-    # Construye el filtro final si hay condiciones
-    qdrant_filter = models.Filter(must=filter_conditions) if filter_conditions else None
-    
-    query_embedding = embedding_model.encode(query).tolist()
+    elif conditions:
+        print("Detectada búsqueda legal explícita.")
+
+    fields = _payload_fields(payload_fields)
+
+    # Camino rápido: "Ley 7125 artículo 5" se resuelve por metadatos, sin embedding ni búsqueda vectorial.
+    exact_miss = False
+    if is_exact_lookup(conditions):
+        records = await vector_store.lookup(conditions, n_results, fields)
+        if records:
+            print(f"Búsqueda exacta por ley y artículo: {len(records)} resultados.")
+            return await _format_results(records)
+        exact_miss = True
+
+    query_embedding = await embed_query(query)
     
-    # Intenta la búsqueda (ya sea filtrada o global)
-    if qdrant_filter:
-        print(f"Aplicando filtro de metadatos: {qdrant_filter.dict()}")
+    # La búsqueda global (fallback) solo se hace si la filtrada no encontró nada: es útil
+    # si el usuario escribió mal un número de ley, por ejemplo, y casi nunca hace falta.
+    # Si la búsqueda exacta no encontró nada, la filtrada tampoco lo hará.
+    search_results = []
+    if conditions and not exact_miss:
+        print(f"Aplicando filtro de metadatos: {conditions}")
+        (search_results,) = await _run_queries([_build_query(query_embedding, query, conditions, n_results, fields)])
+        if not search_results:
+            print("La búsqueda filtrada no encontró nada. Usando la búsqueda global como fallback.")
+    elif exact_miss:
+        print("La búsqueda exacta no encontró nada. Realizando búsqueda semántica global como fallback.")
     else:
         print("No se aplicaron filtros. Realizando búsqueda semántica global.")
+    if not search_results:
+        (search_results,) = await _run_queries([_build_query(query_embedding, query, {}, n_results, fields)])
 
-    search_results = client.search(
-        collection_name=config.COLLECTION_NAME,
-        query_vector=query_embedding,
-        query_filter=qdrant_filter,
-        limit=n_results
-    )
-
-    # Fallback: Si la búsqueda filtrada no arrojó resultados, se intenta una búsqueda global.
-    # Esto es útil si el usuario escribió mal un número de ley, por ejemplo.
-    if not search_results and qdrant_filter:
-        print("La búsqueda filtrada no encontró nada. Intentando búsqueda semántica global como fallback.")
-        search_results = client.search(
-            collection_name=config.COLLECTION_NAME,
-            query_vector=query_embedding,
-            limit=n_results
-        )
-
-    return _format_qdrant_results(search_results)
+    return await _format_results(search_results)
 
 
 # --- FUNCIÓN DE TESTEO DE FILTROS ---
-def search_with_filters(filters: dict, n_results: int, query: str = ""):
-    """Realiza una búsqueda en Qdrant usando un diccionario de filtros explícito."""
-    collection_info = client.get_collection(collection_name=config.COLLECTION_NAME)
-    if collection_info.points_count == 0:
+async def search_with_filters(filters: dict, n_results: int, query: str = "", payload_fields: Optional[List[str]] = None):
+    """Realiza una búsqueda en el almacén vectorial usando un diccionario de filtros explícito."""
+    if await collection_stats.points_count() == 0:
         raise HTTPException(status_code=404, detail="No hay documentos en la base de datos.")
 
-    filter_conditions = []
-    for key, value in filters.items():
-        db_key = "numero_normalizado" if key == "numero_documento" else key
-        filter_conditions.append(models.FieldCondition(
-            key=db_key,
-            match=models.MatchValue(value=value)
-        ))
+    conditions = {
+        ("numero_normalizado" if key == "numero_documento" else key): value
+        for key, value in filters.items()
+    }
 
-    if not filter_conditions:
+    if not conditions:
         raise HTTPException(status_code=400, detail="Se debe proveer al menos un filtro.")
 
-    qdrant_filter = models.Filter(must=filter_conditions)
-    print(f"TEST: Aplicando filtro de metadatos explícito: {qdrant_filter.dict()}")
+    print(f"TEST: Aplicando filtro de metadatos explícito: {conditions}")
 
-    query_embedding = embedding_model.encode(query if query else " ").tolist()
-    
-    search_results = client.search(
-        collection_name=config.COLLECTION_NAME,
-        query_vector=query_embedding,
-        query_filter=qdrant_filter,
-        limit=n_results
-    )
-
-    return _format_qdrant_results(search_results)
\ No newline at end of file
+    query_embedding = await embed_query(query if query else " ")
+
+    (search_results,) = await _run_queries([
+        _build_query(query_embedding, query, conditions, n_results, _payload_fields(payload_fields))
+    ])
+
+    return await _format_results(search_results)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# services/telegram_client.py
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+import config
+
+
+class TelegramRateLimiter:
+    """
+    Planificador de envíos salientes. Reserva a cada mensaje un turno que respeta
+    el límite global del bot y el intervalo mínimo por chat, de modo que las
+    ráfagas se reparten en el tiempo en lugar de recibir un 429.
+    """
+    def __init__(self, global_per_second: float, chat_interval: float, group_interval: float):
+        self._global_interval = 1.0 / global_per_second
+        self._chat_interval = chat_interval
+        self._group_interval = group_interval
+        self._next_global = 0.0
+        self._next_chat: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    def _interval_for(self, chat_id: int) -> float:
+        # En Telegram los grupos y canales tienen id negativo y un límite más estricto.
+        return self._group_interval if chat_id < 0 else self._chat_interval
+
+    async def acquire(self, chat_id: Optional[int]):
+        """
+        Espera hasta el próximo turno libre para enviar a `chat_id`.
+        Sin chat (llamadas que no son envíos) solo se respeta el límite global,
+        incluida la espera de un 429 global.
+        """
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_global)
+            if chat_id is not None:
+                slot = max(slot, self._next_chat.get(chat_id, 0.0))
+                self._next_chat[chat_id] = slot + self._interval_for(chat_id)
+            self._next_global = slot + self._global_interval
+
+            # Limpieza de chats inactivos para que el diccionario no crezca sin límite.
+            if len(self._next_chat) > 10000:
+                self._next_chat = {c: t for c, t in self._next_chat.items() if t > now}
+
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, chat_id: Optional[int], retry_after: float):
+        """Aplaza los envíos según el `retry_after` que devolvió Telegram."""
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._next_global = max(self._next_global, until)
+        else:
+            self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), until)
+
+
+rate_limiter = TelegramRateLimiter(
+    global_per_second=config.TELEGRAM_GLOBAL_RATE,
+    chat_interval=config.TELEGRAM_CHAT_INTERVAL,
+    group_interval=config.TELEGRAM_GROUP_CHAT_INTERVAL,
+)
+
+# Cliente HTTP compartido (keep-alive + HTTP/2). Se abre y cierra en el lifespan de la app.
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(config.TELEGRAM_HTTP_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=config.TELEGRAM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.TELEGRAM_MAX_CONNECTIONS,
+            keepalive_expiry=60,
+        ),
+    )
+
+async def start_telegram_client():
+    """Crea el cliente HTTP compartido para la API de Telegram."""
+    global _http_client
+    if _http_client is None:
+        _http_client = _build_http_client()
+        print("✅ Cliente HTTP de Telegram iniciado.")
+
+async def close_telegram_client():
+    """Cierra el cliente HTTP compartido y sus conexiones."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        # Por si se usa fuera del lifespan (scripts, pruebas manuales).
+        _http_client = _build_http_client()
+    return _http_client
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.json().get("parameters", {}).get("retry_after", 1))
+    except ValueError:
+        return 1.0
+
+async def call_telegram_api(method: str, payload: Dict[str, Any], chat_id: Optional[int] = None) -> Any:
+    """
+    Llama a un método de la Bot API y devuelve su `result`.
+    Respeta el planificador de envíos, reintenta los 429 esperando el `retry_after`
+    indicado por Telegram y reintenta con backoff los errores de red y 5xx.
+    Los demás errores HTTP se propagan como `httpx.HTTPStatusError`.
+    """
+    client = _get_http_client()
+    url = f"{config.TELEGRAM_API_URL}/{method}"
+
+    for attempt in range(config.TELEGRAM_MAX_RETRIES + 1):
+        is_last_attempt = attempt == config.TELEGRAM_MAX_RETRIES
+        await rate_limiter.acquire(chat_id)
+
+        try:
+            response = await client.post(url, json=payload)
+        except httpx.TransportError as e:
+            if is_last_attempt:
+                raise
+            print(f"⚠️ Error de red llamando a {method}: {e}. Reintentando...")
+            await asyncio.sleep(2 ** attempt)
+            continue
+
+        if response.status_code == 429 and not is_last_attempt:
+            retry_after = _retry_after(response)
+            print(f"⚠️ Telegram pidió esperar {retry_after}s (429) en {method}.")
+            # El próximo intento espera en `acquire` hasta que venza la penalización.
+            rate_limiter.penalize(chat_id, retry_after)
+            continue
+
+        if response.status_code >= 500 and not is_last_attempt:
+            await asyncio.sleep(2 ** attempt)
+            continue
+
+        response.raise_for_status()
+        return response.json().get("result")
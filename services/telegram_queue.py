@@ -0,0 +1,130 @@
+# services/telegram_queue.py
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import config
+from services.telegram_service import process_telegram_message
+
+
+class ChatOrderedQueue:
+    """
+    Cola de trabajo en memoria con un pool de workers en segundo plano.
+    Los mensajes de chats distintos se procesan en paralelo (hasta `concurrency`
+    a la vez), pero los de un mismo chat se procesan estrictamente en orden.
+    """
+    def __init__(self, handler: Callable[[int, Any], Awaitable[None]], concurrency: int, max_pending: int):
+        self._handler = handler
+        self._concurrency = concurrency
+        self._max_pending = max_pending
+
+        # chat_id -> mensajes pendientes (momento de encolado, mensaje).
+        # Un chat está en `_pending` mientras tenga trabajo asignado o por asignar,
+        # y aparece en `_ready` como mucho una vez: eso garantiza el orden por chat.
+        self._pending: Dict[int, Deque[Tuple[float, Any]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        # Estadísticas
+        self._depth = 0
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_processing = 0.0
+
+    async def start(self):
+        """Lanza los workers. Se llama desde el lifespan de la app."""
+        self._ready = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"telegram-worker-{i}")
+            for i in range(self._concurrency)
+        ]
+        print(f"✅ Cola de Telegram iniciada con {self._concurrency} workers.")
+
+    async def stop(self):
+        """Detiene los workers. Los mensajes que queden pendientes se descartan."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._depth:
+            print(f"⚠️ Cola de Telegram detenida con {self._depth} mensajes sin procesar.")
+
+    def enqueue(self, chat_id: int, item: Any) -> bool:
+        """
+        Encola un mensaje sin esperar a que se procese.
+        Devuelve False si la cola está llena (o no fue iniciada).
+        """
+        if self._ready is None or self._depth >= self._max_pending:
+            self._rejected += 1
+            return False
+
+        self._depth += 1
+        entry = (time.monotonic(), item)
+        if chat_id in self._pending:
+            # El chat ya tiene trabajo asignado: se respeta su orden.
+            self._pending[chat_id].append(entry)
+        else:
+            self._pending[chat_id] = deque([entry])
+            self._ready.put_nowait(chat_id)
+        return True
+
+    async def _worker(self, worker_id: int):
+        while True:
+            chat_id = await self._ready.get()
+            messages = self._pending[chat_id]
+            enqueued_at, item = messages.popleft()
+            self._depth -= 1
+
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._in_flight += 1
+            try:
+                await self._handler(chat_id, item)
+                self._processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                print(f"❌ Error procesando mensaje de Chat ID {chat_id} (worker {worker_id}): {e}")
+            finally:
+                self._in_flight -= 1
+                self._total_processing += time.monotonic() - started_at
+
+            # Si llegaron más mensajes del mismo chat, se vuelve a poner al final
+            # para repartir los workers de forma justa entre chats.
+            if messages:
+                self._ready.put_nowait(chat_id)
+            else:
+                del self._pending[chat_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola y tiempos de espera/procesamiento."""
+        finished = self._processed + self._failed
+        started = finished + self._in_flight
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._depth,
+            "chats_pending": len(self._pending),
+            "in_flight": self._in_flight,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+            "avg_processing_ms": round(self._total_processing / finished * 1000, 2) if finished else 0.0,
+        }
+
+
+# Instancia única usada por el webhook y arrancada en el lifespan de la app.
+telegram_queue = ChatOrderedQueue(
+    handler=process_telegram_message,
+    concurrency=config.TELEGRAM_WORKERS,
+    max_pending=config.TELEGRAM_QUEUE_MAX_PENDING,
+)
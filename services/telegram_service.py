@@ -3,10 +3,21 @@
 import config
 import httpx
 import re
+import time
 import llm_handler
 from services import perform_similarity_search
+from services.prevent_injection_service import is_valid_prompt
+from services.telegram_client import call_telegram_api
+from caching import normalize_text
+from services.answer_cache import answer_cache, rag_requests
+from services.context_packing import context_packer
+from services.welcome_service import welcome_message
 
 N_RESULTS_FOR_TELEGRAM = 5
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+# Metadatos que usan el contexto del LLM y la lista de fuentes (el texto viene aparte).
+TELEGRAM_PAYLOAD_FIELDS = ["tipo_documento", "numero_documento", "articulo", "subtema"]
+NO_RESULTS_RESPONSE = "Lo siento, no pude encontrar información relevante en mi base de datos para responder a tu pregunta."
 
 def escape_markdown_v2(text: str) -> str:
     """Escapa los caracteres especiales de Markdown V2."""
@@ -19,52 +30,56 @@ async def send_telegram_message(chat_id: int, text: str):
     """
     Envía un mensaje de texto a un chat específico de Telegram.
     Ahora solo se encarga de enviar, asumiendo que el texto ya está formateado.
+    Usa el cliente HTTP compartido y el planificador de envíos de telegram_client.
     """
-    async with httpx.AsyncClient() as client:
-        payload = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "MarkdownV2"
-        }
-        try:
-            response = await client.post(f"{config.TELEGRAM_API_URL}/sendMessage", json=payload)
-            response.raise_for_status()
-            print(f"Respuesta enviada a Chat ID {chat_id}")
-        except httpx.HTTPStatusError as e:
-            print(f"Error al enviar mensaje: {e.response.status_code} - {e.response.text}")
-
-def get_rag_response_for_telegram(user_query: str) -> str:
+    payload = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": "MarkdownV2"
+    }
+    try:
+        message = await call_telegram_api("sendMessage", payload, chat_id=chat_id)
+        print(f"Respuesta enviada a Chat ID {chat_id}")
+        return message
+    except httpx.HTTPStatusError as e:
+        print(f"Error al enviar mensaje: {e.response.status_code} - {e.response.text}")
+    except httpx.TransportError as e:
+        print(f"Error de red al enviar mensaje a Chat ID {chat_id}: {e}")
+
+async def edit_telegram_message(chat_id: int, message_id: int, text: str) -> bool:
     """
-    Realiza el proceso RAG completo, sanitiza los datos y formatea la salida para Telegram.
+    Reemplaza el texto de un mensaje ya enviado (editMessageText).
+    Devuelve True si el mensaje quedó con el texto indicado.
     """
-    print(f"Ejecutando búsqueda de similitud para: '{user_query}'")
-    
-    search_results = perform_similarity_search(user_query, n_results=N_RESULTS_FOR_TELEGRAM)
-    context_docs = search_results.get('documents', [[]])[0]
-    context_metadatas = search_results.get('metadatas', [[]])[0]
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "MarkdownV2"
+    }
+    try:
+        await call_telegram_api("editMessageText", payload, chat_id=chat_id)
+        return True
+    except httpx.HTTPStatusError as e:
+        # Telegram rechaza la edición si el texto no cambió; no es un error real.
+        if "message is not modified" in e.response.text:
+            return True
+        print(f"Error al editar mensaje: {e.response.status_code} - {e.response.text}")
+    except httpx.TransportError as e:
+        print(f"Error de red al editar mensaje en Chat ID {chat_id}: {e}")
+    return False
 
-    if not context_docs:
-        # Sanitizamos también los mensajes de error por si acaso
-        return escape_markdown_v2("Lo siento, no pude encontrar información relevante en mi base de datos para responder a tu pregunta.")
-
-    # ... (Construcción del full_context para el LLM sigue igual) ...
-    formatted_context_parts = []
-    for doc, meta in zip(context_docs, context_metadatas):
-        source_info = (
-            f"---\n"
-            f"Fuente: {meta.get('tipo_documento', 'N/A')} {meta.get('numero_documento', 'N/A')}\n"
-            f"Artículo: {meta.get('articulo', 'N/A')}\n"
-            f"Contenido: {doc}\n"
-            f"---"
-        )
-        formatted_context_parts.append(source_info)
-    full_context = "\n\n".join(formatted_context_parts)
-
-    print("Generando respuesta con el LLM...")
-    generated_answer = llm_handler.generate_answer_from_context(user_query, full_context)
+async def _retrieve_context_for_telegram(user_query: str):
+    """Busca el contexto para la pregunta y arma el prompt (ver context_packing). None si no hay resultados."""
+    print(f"Ejecutando búsqueda de similitud para: '{user_query}'")
     
-    # --- ✅ LÓGICA DE FORMATEO Y SANITIZACIÓN MEJORADA ---
+    search_results = await perform_similarity_search(
+        user_query, n_results=N_RESULTS_FOR_TELEGRAM, payload_fields=TELEGRAM_PAYLOAD_FIELDS
+    )
+    return context_packer.build_prompt(user_query, search_results)
 
+def _format_telegram_response(generated_answer: str, context_metadatas) -> str:
+    """Sanitiza la respuesta del LLM y le agrega la lista de fuentes consultadas."""
     # 1. Sanitizamos la respuesta del LLM primero
     safe_answer = escape_markdown_v2(generated_answer)
 
@@ -103,5 +118,98 @@ def get_rag_response_for_telegram(user_query: str) -> str:
             f"{sources_text}"
         )
 
+    return final_response
+
+async def get_rag_response_for_telegram(user_query: str) -> str:
+    """
+    Realiza el proceso RAG completo, sanitiza los datos y formatea la salida para Telegram.
+    """
+    cached = await answer_cache.lookup(user_query, N_RESULTS_FOR_TELEGRAM)
+    if cached:
+        return _format_telegram_response(cached["answer"], cached["sources"])
+    generation = answer_cache.generation
+
+    packed = await _retrieve_context_for_telegram(user_query)
+    if not packed:
+        # Sanitizamos también los mensajes de error por si acaso
+        return escape_markdown_v2(NO_RESULTS_RESPONSE)
+
+    print("Generando respuesta con el LLM...")
+    generated_answer = await llm_handler.generate_answer(packed["prompt"])
+    await answer_cache.store(user_query, N_RESULTS_FOR_TELEGRAM, generated_answer, packed["sources"], generation)
     
-    return final_response
\ No newline at end of file
+    return _format_telegram_response(generated_answer, packed["sources"])
+
+async def stream_rag_response_to_telegram(chat_id: int, message_id: int, user_query: str) -> str:
+    """
+    Realiza el proceso RAG editando el mensaje `message_id` a medida que el LLM
+    genera texto. Las ediciones se espacian según TELEGRAM_STREAM_EDIT_INTERVAL
+    para respetar los límites de Telegram. Devuelve la respuesta final formateada.
+    """
+    cached = await answer_cache.lookup(user_query, N_RESULTS_FOR_TELEGRAM)
+    if cached:
+        return _format_telegram_response(cached["answer"], cached["sources"])
+    generation = answer_cache.generation
+
+    packed = await _retrieve_context_for_telegram(user_query)
+    if not packed:
+        return escape_markdown_v2(NO_RESULTS_RESPONSE)
+
+    print("Generando respuesta con el LLM (streaming)...")
+    chunks = []
+    failed = False
+    last_edit = time.monotonic()
+    async for chunk in llm_handler.generate_answer_stream(packed["prompt"]):
+        chunks.append(chunk)
+        failed = failed or isinstance(chunk, llm_handler.StreamError)
+        partial_answer = "".join(chunks)
+        if (
+            time.monotonic() - last_edit >= config.TELEGRAM_STREAM_EDIT_INTERVAL
+            and len(partial_answer) < TELEGRAM_MAX_MESSAGE_LENGTH
+        ):
+            await edit_telegram_message(chat_id, message_id, f"{escape_markdown_v2(partial_answer)} ⏳")
+            last_edit = time.monotonic()
+
+    generated_answer = "".join(chunks)
+    # Una respuesta cortada por un error no se cachea.
+    if not failed:
+        await answer_cache.store(user_query, N_RESULTS_FOR_TELEGRAM, generated_answer, packed["sources"], generation)
+    return _format_telegram_response(generated_answer, packed["sources"])
+
+async def process_telegram_message(chat_id: int, user_message: str):
+    """
+    Procesa un mensaje de Telegram de punta a punta y envía las respuestas al chat.
+    Lo ejecutan los workers de la cola, fuera del request del webhook.
+    """
+    # Se fija si es un mensaje valido
+    is_valid = await is_valid_prompt(user_message)
+    if not is_valid:
+        response_text = "Basado en la información proporcionada, no puedo responder a esa pregunta"
+        await send_telegram_message(chat_id, response_text)
+        return
+
+    # Se fija si es un mensaje inicial
+    response_text = welcome_message(user_message)
+    if response_text != "":
+        await send_telegram_message(chat_id, response_text)
+        return
+
+    placeholder = await send_telegram_message(chat_id, "Procesando⏳")
+    # Si la misma pregunta ya se está respondiendo (en este u otro chat), se espera esa respuesta.
+    flight_key = ("telegram", normalize_text(user_message))
+
+    if config.TELEGRAM_STREAMING and placeholder:
+        # La respuesta se va mostrando sobre el mensaje "Procesando⏳"
+        # (en los chats que esperan una respuesta en curso, aparece completa al final).
+        message_id = placeholder["message_id"]
+        response_text = await rag_requests.run(
+            flight_key, lambda: stream_rag_response_to_telegram(chat_id, message_id, user_message)
+        )
+        if await edit_telegram_message(chat_id, message_id, response_text):
+            return
+    else:
+        # 1. Obtener la respuesta completa del servicio RAG
+        response_text = await rag_requests.run(flight_key, lambda: get_rag_response_for_telegram(user_message))
+
+    # 2. Enviar la respuesta formateada de vuelta al usuario
+    await send_telegram_message(chat_id, response_text)
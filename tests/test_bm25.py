@@ -0,0 +1,66 @@
+# tests/test_bm25.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bm25
+
+
+def test_tokenize_strips_accents_stopwords_and_single_chars():
+    assert bm25.tokenize("¿Qué dice la Ley 7125 sobre Ingresos Brutos y el RSP?") == [
+        "dice", "ley", "7125", "ingresos", "brutos", "rsp",
+    ]
+    assert bm25.tokenize("Artículo 5º: Dirección") == ["articulo", "5o", "direccion"]
+
+
+# Los vectores dispersos guardados en la colección usan estos índices: si cambian,
+# las consultas dejan de coincidir con los documentos ya cargados.
+@pytest.mark.parametrize("token, index", [
+    ("ley", 266321196),
+    ("7125", 1389494513),
+    ("monotributo", 1390790089),
+    ("ingresos", 382360026),
+    ("brutos", 1402764177),
+])
+def test_token_index_is_stable(token, index):
+    assert bm25._index(token) == index
+
+
+def test_token_index_is_the_same_in_another_process():
+    # A diferencia de hash(), no depende de PYTHONHASHSEED (los workers de parseo son otros procesos).
+    code = "import bm25; print(bm25._index('monotributo'))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONHASHSEED": "123"}, cwd=os.path.dirname(bm25.__file__),
+    ).stdout
+    assert int(output) == bm25._index("monotributo")
+
+
+def test_query_terms_weigh_one():
+    indices, values = bm25.encode_query("Ley 7125 ley")
+    assert indices == sorted([bm25._index("ley"), bm25._index("7125")])
+    assert values == [1.0, 1.0]
+
+
+def test_document_weights_follow_bm25_term_frequency():
+    indices, values = bm25.encode_document("ley ley impuesto", avg_doc_length=3.0)
+    weights = dict(zip(indices, values))
+    # Largo igual al promedio: tf * (k1 + 1) / (tf + k1).
+    assert weights[bm25._index("ley")] == pytest.approx(2 * 2.2 / (2 + 1.2))
+    assert weights[bm25._index("impuesto")] == pytest.approx(1.0)
+    # Documentos más largos que el promedio pesan menos por término.
+    _, longer = bm25.encode_document("ley impuesto", avg_doc_length=1.0)
+    _, shorter = bm25.encode_document("ley impuesto", avg_doc_length=4.0)
+    assert longer[0] < shorter[0]
+
+
+def test_colliding_tokens_add_their_weights(monkeypatch):
+    monkeypatch.setattr(bm25, "_index", lambda token: 7)
+    assert bm25.encode_query("ley decreto") == ([7], [2.0])
+
+
+def test_empty_text_encodes_to_an_empty_vector():
+    assert bm25.encode_document("y de la", avg_doc_length=100) == ([], [])
+    assert bm25.encode_query("") == ([], [])
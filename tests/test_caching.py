@@ -0,0 +1,83 @@
+# tests/test_caching.py
+import asyncio
+
+import pytest
+
+from caching import SingleFlight
+
+
+def test_single_flight_coalesces_identical_calls():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "respuesta"
+
+    async def main():
+        flight = SingleFlight(name="test")
+        results = await asyncio.gather(*(flight.run("clave", compute) for _ in range(5)))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == ["respuesta"] * 5
+    assert calls == 1
+    assert stats["coalesced"] == 4 and stats["in_flight"] == 0
+
+
+def test_single_flight_shares_exceptions():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("falló")
+
+    async def main():
+        flight = SingleFlight(name="test")
+        return await asyncio.gather(flight.run("clave", fail), flight.run("clave", fail), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_single_flight_leader_cancelled_followers_retry():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        flight = SingleFlight(name="test")
+        leader = asyncio.create_task(flight.run("clave", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.run("clave", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    # Los que esperaban no se cancelan: uno repite la computación y el resto la comparte.
+    assert asyncio.run(main()) == [2, 2, 2]
+    assert calls == 2
+
+
+def test_single_flight_follower_cancel_keeps_computation():
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        flight = SingleFlight(name="test")
+        leader = asyncio.create_task(flight.run("clave", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run("clave", compute))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "ok"
@@ -0,0 +1,35 @@
+# tests/test_chunk_text_store.py
+import os
+
+from services.chunk_text_store import ChunkTextStore
+
+
+def test_put_and_get_after_reload(tmp_path):
+    store = ChunkTextStore(directory=str(tmp_path))
+    store.put_many([("a", "artículo uno"), ("b", "artículo dos")])
+
+    assert ChunkTextStore(directory=str(tmp_path)).get_many(["a", "b", "c"]) == {
+        "a": "artículo uno", "b": "artículo dos",
+    }
+
+
+def test_index_entries_past_the_data_file_are_skipped(tmp_path):
+    store = ChunkTextStore(directory=str(tmp_path))
+    store.put_many([("a", "uno"), ("b", "dos")])
+    # Simula un corte: el índice llegó a disco pero el último texto no.
+    with open(os.path.join(tmp_path, "texts.bin"), "r+b") as data:
+        data.truncate(len("uno"))
+
+    reloaded = ChunkTextStore(directory=str(tmp_path))
+    assert reloaded.get_many(["a", "b"]) == {"a": "uno"}
+    assert reloaded.stats()["texts"] == 1
+
+
+def test_delete_and_compact(tmp_path):
+    store = ChunkTextStore(directory=str(tmp_path), compact_min_bytes=1, compact_garbage_ratio=0.5)
+    store.put_many([("a", "x" * 10), ("b", "y" * 10), ("c", "z" * 10)])
+    store.delete_many(["a", "b"])
+
+    assert store.maybe_compact()
+    assert store.stats()["garbage_bytes"] == 0
+    assert ChunkTextStore(directory=str(tmp_path)).get_many(["a", "b", "c"]) == {"c": "z" * 10}
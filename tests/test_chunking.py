@@ -0,0 +1,136 @@
+# tests/test_chunking.py
+# Los ids de los puntos ({archivo}_{artículo}_{i}) dependen de los cortes: los chunkers
+# por páginas tienen que producir lo mismo que el corte anterior sobre el texto completo.
+import bisect
+import random
+import re
+import uuid
+
+import pytest
+
+from services.chunking import iter_article_chunks, iter_semantic_chunks
+from services.ingestion_service import (
+    CONTEXT_CHUNK_OVERLAP, CONTEXT_CHUNK_SIZE, chunk_pdf, chunk_pdf_context, split_text_into_chunks,
+)
+
+
+# --- Implementación anterior (texto completo), como referencia ---
+def _reference_article_chunks(pages):
+    full_text = "".join(pages)
+    page_starts, offset = [], 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page)
+
+    chunks, offset = [], 0
+    for raw in re.split(r'(?=Artículo\s*[\dºª]+\b)', full_text, flags=re.IGNORECASE):
+        chunk = raw.strip()
+        if chunk and len(chunk) > 50:
+            start = offset + len(raw) - len(raw.lstrip())
+            match = re.search(r"Artículo (\d+)", chunk, re.IGNORECASE)
+            chunks.append({
+                "text": chunk,
+                "article": match.group(1) if match else None,
+                "page": bisect.bisect_right(page_starts, start),
+            })
+        offset += len(raw)
+    return chunks
+
+def _reference_semantic_chunks(text, chunk_size, chunk_overlap):
+    if not text:
+        return []
+    chunks = []
+    current_chunk = ""
+    for paragraph in text.split('\n\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(current_chunk) + len(paragraph) + 1 > chunk_size and current_chunk:
+            chunks.append(current_chunk)
+            overlap_text = current_chunk[-chunk_overlap:]
+            current_chunk = overlap_text + " ... " + paragraph
+        else:
+            if current_chunk:
+                current_chunk += "\n\n" + paragraph
+            else:
+                current_chunk = paragraph
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+def _point_id(key):
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, key))
+
+def _reference_article_ids(pages, filename):
+    return [
+        _point_id(f"{filename}_{chunk['article'] or f'parrafo_{i}'}_{i}")
+        for i, chunk in enumerate(_reference_article_chunks(pages))
+    ]
+
+
+BODY = "El contribuyente deberá presentar la declaración jurada dentro del plazo establecido. "
+
+ARTICLE_CASES = {
+    "una_pagina": [f"LEY 7125\n\nArtículo 1 {BODY}\nArtículo 2 {BODY}\nARTÍCULO 3º {BODY}"],
+    "encabezado_entre_paginas": [f"Artículo 1 {BODY}\nArtí", f"culo 2 {BODY}", f"Artículo 3 {BODY}"],
+    "numero_en_la_pagina_siguiente": [f"Artículo 1 {BODY}\nArtículo", f" 2 {BODY}"],
+    "numero_partido_entre_paginas": [f"Artículo 1 {BODY}\nArtículo 1", f"2 {BODY}"],
+    "encabezado_al_final_del_documento": [f"Artículo 1 {BODY}", "\nArtículo 2"],
+    "preambulo_y_articulos_cortos": [f"Considerando: {BODY}", "Artículo 1 corto.\n", f"Artículo 2 {BODY}"],
+    "articulo_ordinal_sin_numero_capturable": [f"Artículo 1º {BODY}", f"Artículoº {BODY}"],
+    "paginas_vacias": ["", f"Artículo 1 {BODY}", "", f"Artículo 2 {BODY}", ""],
+    "sin_articulos": [BODY * 3],
+}
+
+@pytest.mark.parametrize("pages", ARTICLE_CASES.values(), ids=ARTICLE_CASES.keys())
+def test_article_chunks_match_reference(pages):
+    assert list(iter_article_chunks(pages)) == _reference_article_chunks(pages)
+
+@pytest.mark.parametrize("pages", ARTICLE_CASES.values(), ids=ARTICLE_CASES.keys())
+def test_article_point_ids_match_reference(pages):
+    chunks = list(chunk_pdf(pages, "ley.pdf"))
+    assert [chunk["id"] for chunk in chunks] == _reference_article_ids(pages, "ley.pdf")
+
+
+def _paragraph(size):
+    return ("p" * (size - 1)) + "."
+
+SEMANTIC_CASES = {
+    # El segundo párrafo entra justo: len(actual) + len(párrafo) + 1 == chunk_size.
+    "justo_en_el_limite": [_paragraph(600) + "\n\n" + _paragraph(599)],
+    # Uno más y se corta, con superposición del final del chunk anterior.
+    "un_caracter_de_mas": [_paragraph(600) + "\n\n" + _paragraph(600)],
+    "superposicion_mayor_que_el_chunk": ["corto\n\n" + _paragraph(1300) + "\n\n" + _paragraph(100)],
+    "separador_entre_paginas": [_paragraph(700) + "\n", "\n" + _paragraph(700) + "\n\n", _paragraph(300)],
+    "parrafo_entre_paginas": [_paragraph(500) + "\n\n" + "mitad de", " un párrafo\n\n" + _paragraph(900)],
+    "parrafos_en_blanco": ["\n\n  \n\n" + _paragraph(100), "\n\n\n\n", _paragraph(1200)],
+    "vacio": ["", ""],
+}
+
+@pytest.mark.parametrize("pages", SEMANTIC_CASES.values(), ids=SEMANTIC_CASES.keys())
+def test_semantic_chunks_match_reference(pages):
+    expected = _reference_semantic_chunks("".join(pages), CONTEXT_CHUNK_SIZE, CONTEXT_CHUNK_OVERLAP)
+    chunks = list(chunk_pdf_context(pages, "DGR.pdf"))
+    assert [chunk["payload"]["texto"] for chunk in chunks] == expected
+    assert [chunk["id"] for chunk in chunks] == [_point_id(f"DGR.pdf_context_{i}") for i in range(len(expected))]
+    assert split_text_into_chunks("".join(pages), CONTEXT_CHUNK_SIZE, CONTEXT_CHUNK_OVERLAP) == expected
+
+
+TOKENS = [
+    "Artículo 1", "ARTÍCULO 2º", "artículo 3ª", "Artículo", " 45", "Artí", "culo 6", "Art. 7",
+    "\n\n", "\n", " ", "texto", BODY, "la ley", "º", "12",
+]
+
+def _random_pages(rng):
+    text = "".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 300)))
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 8))))
+    return [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)])]
+
+@pytest.mark.parametrize("seed", range(200))
+def test_randomized_pages_match_reference(seed):
+    rng = random.Random(seed)
+    pages = _random_pages(rng)
+    assert list(iter_article_chunks(pages)) == _reference_article_chunks(pages)
+    chunk_size, overlap = rng.choice([(80, 20), (200, 50), (CONTEXT_CHUNK_SIZE, CONTEXT_CHUNK_OVERLAP)])
+    semantic = [chunk["text"] for chunk in iter_semantic_chunks(pages, chunk_size, overlap)]
+    assert semantic == _reference_semantic_chunks("".join(pages), chunk_size, overlap)
@@ -0,0 +1,84 @@
+# tests/test_context_packing.py
+from services.context_packing import ContextPacker
+
+
+def _meta(article):
+    return {"tipo_documento": "Ley", "numero_documento": "7125", "articulo": str(article)}
+
+def _text(letter, size=100):
+    return letter * size
+
+def _chunk_cost(packer, article, size=100):
+    # Texto más encabezado (una fuente nueva suma su encabezado y el formato del bloque).
+    return size + packer.estimate_tokens(packer._header(_meta(article))) + 4
+
+
+def test_budget_keeps_the_best_scored_chunks():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    packer.max_tokens = _chunk_cost(packer, 1) + _chunk_cost(packer, 3) + 10
+    packed = packer.pack(
+        [_text("a"), _text("b"), _text("c")],
+        [_meta(1), _meta(2), _meta(3)],
+        [0.9, 0.1, 0.5],
+    )
+    assert [source["articulo"] for source in packed["sources"]] == ["1", "3"]
+    assert packed["dropped_by_budget"] == 1
+    assert "b" * 100 not in packed["context"]
+
+
+def test_best_chunk_is_truncated_when_nothing_fits():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    header_cost = _chunk_cost(packer, 1, size=0)
+    packer.max_tokens = header_cost + 30
+    packed = packer.pack([_text("a"), _text("b")], [_meta(1), _meta(2)], [0.2, 0.8])
+    # Entra el de mayor puntaje, recortado a lo que deja el encabezado; el otro queda afuera.
+    assert [source["articulo"] for source in packed["sources"]] == ["2"]
+    assert "b" * 30 in packed["context"] and "b" * 31 not in packed["context"]
+    assert packed["dropped_by_budget"] == 1
+
+
+def test_results_without_scores_keep_their_order():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    packer.max_tokens = _chunk_cost(packer, 1) + 10
+    packed = packer.pack([_text("a"), _text("b")], [_meta(1), _meta(2)], [None, None])
+    # Búsqueda exacta: sin puntajes, manda el orden del almacén.
+    assert [source["articulo"] for source in packed["sources"]] == ["1"]
+
+
+def test_missing_scores_rank_as_zero():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    packed = packer.pack([_text("a"), _text("b"), _text("c")], [_meta(1), _meta(2), _meta(3)], [None, 0.4, -0.1])
+    assert [source["articulo"] for source in packed["sources"]] == ["2", "1", "3"]
+
+
+def test_zero_budget_is_unlimited():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    documents = [_text(letter, 5000) for letter in "abcde"]
+    packed = packer.pack(documents, [_meta(i) for i in range(5)], [0.1] * 5)
+    assert packed["chunks_used"] == 5 and packed["dropped_by_budget"] == 0
+    assert packed["context_tokens"] > 25000
+
+
+def test_duplicates_and_overlap_are_removed():
+    packer = ContextPacker(max_tokens=0, chars_per_token=1)
+    first = "Primer párrafo del documento.\n\nSegundo párrafo con la cola compartida"
+    second = "cola compartida ... Tercer párrafo nuevo."
+    packed = packer.pack([first, first.upper(), second], [_meta(1), _meta(1), _meta(1)], [0.9, 0.8, 0.7])
+    assert packed["duplicates"] == 1
+    assert packed["overlap_chars_removed"] == len("cola compartida ... ")
+    assert "Contenido: " + first + "\n[...]\nTercer párrafo nuevo." in packed["context"]
+
+
+def test_build_prompt_without_usable_chunks_returns_none():
+    packer = ContextPacker(max_tokens=100, chars_per_token=1)
+    assert packer.build_prompt("pregunta", {"documents": [[]], "metadatas": [[]], "scores": [[]]}) is None
+    only_blank = {"documents": [["  ", ""]], "metadatas": [[_meta(1), _meta(2)]], "scores": [[0.5, 0.4]]}
+    assert packer.build_prompt("pregunta", only_blank) is None
+
+
+def test_build_prompt_counts_the_prompt_tokens():
+    packer = ContextPacker(max_tokens=0, chars_per_token=4)
+    packed = packer.build_prompt("¿Qué dice?", {"documents": [[_text("a")]], "metadatas": [[_meta(1)]], "scores": [[None]]})
+    assert "¿Qué dice?" in packed["prompt"] and _text("a") in packed["prompt"]
+    assert packed["prompt_tokens"] > packed["context_tokens"]
+    assert packer.stats()["prompts"] == 1
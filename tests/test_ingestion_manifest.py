@@ -0,0 +1,168 @@
+# tests/test_ingestion_manifest.py
+import hashlib
+import sqlite3
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import config
+from services import ingestion_service
+from services.chunk_text_store import ChunkTextStore
+from services.ingestion_manifest import IngestionManifest
+from vector_store import NumpyVectorStore
+
+BODY = "El contribuyente deberá presentar la declaración jurada dentro del plazo establecido."
+
+
+def _law(*articles):
+    """Texto de una ley falsa; las páginas se separan con \\f."""
+    return "LEY 7125\n\f" + "\f".join(f"Artículo {number} {BODY} ({version})" for number, version in articles)
+
+
+class _FakeExtractor:
+    """Los "PDFs" de las pruebas son texto plano con las páginas separadas por \\f."""
+    backend = SimpleNamespace(name="fake")
+
+    def iter_pages(self, pdf_file, file_hash=None):
+        return iter(pdf_file.read().decode("utf-8").split("\f"))
+
+
+class _FakeModel:
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=None):
+        self.encoded += len(texts)
+        return np.array([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:16], dtype=np.uint8).astype(np.float32) + 1
+            for text in texts
+        ])
+
+
+class _ThreadParsePool(ThreadPoolExecutor):
+    """El parseo corre en hilos: los procesos "spawn" no verían los reemplazos de las pruebas."""
+    def __init__(self, max_workers, mp_context=None):
+        super().__init__(max_workers=max_workers)
+
+
+@pytest.fixture
+def ingestion(tmp_path, monkeypatch):
+    store = NumpyVectorStore(directory=str(tmp_path / "store"), ivf_min_points=0, ivf_nprobe=1)
+    model = _FakeModel()
+    monkeypatch.setattr(ingestion_service, "vector_store", store)
+    monkeypatch.setattr(ingestion_service, "chunk_text_store", ChunkTextStore(directory=str(tmp_path / "texts")))
+    monkeypatch.setattr(ingestion_service, "pdf_extractor", _FakeExtractor())
+    monkeypatch.setattr(ingestion_service, "get_embedding_model", lambda: model)
+    monkeypatch.setattr(ingestion_service, "ProcessPoolExecutor", _ThreadParsePool)
+    monkeypatch.setattr(config, "COLLECTION_NAME", "pruebas")
+    monkeypatch.setattr(config, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(config, "CHUNK_TEXT_STORE", False)
+    manifest = IngestionManifest(path=str(tmp_path / "manifest.sqlite3"), model_name="modelo-falso")
+
+    def run(files):
+        zip_path = tmp_path / "carga.zip"
+        with zipfile.ZipFile(zip_path, "w") as zip_ref:
+            for filename, text in files.items():
+                zip_ref.writestr(filename, text)
+        workspace = tmp_path / "workspace"
+        workspace.mkdir(exist_ok=True)
+        pipeline = ingestion_service.IngestionPipeline(
+            parse_workers=2, embed_batch_size=4, upsert_batch_size=2, upsert_concurrency=2, manifest=manifest,
+        )
+        return pipeline.run(str(zip_path), [(name, name) for name in files], False, str(workspace))
+
+    return SimpleNamespace(run=run, store=store, manifest=manifest, model=model)
+
+
+def _stored_articles(store, filename):
+    hits = store.lookup_sync({"nombre_archivo": filename}, 100, ["articulo", "texto"])
+    return sorted((hit.payload["articulo"], hit.payload["texto"][-3:]) for hit in hits)
+
+
+def test_unchanged_files_are_skipped(ingestion):
+    files = {"a.pdf": _law((1, "v1"), (2, "v1")), "b.pdf": _law((1, "v1"))}
+    first = ingestion.run(files)
+    assert first["points_upserted"] == 3 and first["documents_unchanged"] == 0
+
+    second = ingestion.run(files)
+    assert second["documents_unchanged"] == 2
+    assert second["points_upserted"] == 0 and second["points_deleted"] == 0
+    assert ingestion.store.describe_sync()["points_count"] == 3
+
+
+def test_changed_file_is_reprocessed_and_removed_articles_deleted(ingestion):
+    ingestion.run({"a.pdf": _law((1, "v1"), (2, "v1"), (3, "v1")), "b.pdf": _law((1, "v1"))})
+    encoded = ingestion.model.encoded
+
+    stats = ingestion.run({"a.pdf": _law((1, "v1"), (3, "v2")), "b.pdf": _law((1, "v1"))})
+    assert stats["documents_unchanged"] == 1
+    assert stats["points_upserted"] == 2
+    # El artículo 2 ya no existe y el 3 cambió de id (ahora es el segundo chunk).
+    assert stats["points_deleted"] == 2
+    # Solo el texto nuevo (artículo 3) se embebe otra vez.
+    assert ingestion.model.encoded - encoded == 1
+    assert _stored_articles(ingestion.store, "a.pdf") == [("1", "v1)"), ("3", "v2)")]
+    assert len(ingestion.manifest.file_point_ids("a.pdf")) == 2
+
+
+def test_file_missing_from_upload_keeps_its_points(ingestion):
+    ingestion.run({"a.pdf": _law((1, "v1")), "b.pdf": _law((1, "v1"), (2, "v1"))})
+
+    stats = ingestion.run({"a.pdf": _law((1, "v1"))})
+    # Las cargas se suman a lo que ya hay: un archivo que no vino no se borra.
+    assert stats["documents_unchanged"] == 1 and stats["points_deleted"] == 0
+    assert _stored_articles(ingestion.store, "b.pdf") == [("1", "v1)"), ("2", "v1)")]
+    assert len(ingestion.manifest.file_point_ids("b.pdf")) == 2
+
+
+def test_fingerprint_change_reprocesses_unchanged_files(ingestion, monkeypatch):
+    files = {"a.pdf": _law((1, "v1"), (2, "v1"))}
+    ingestion.run(files)
+    old_fingerprint = ingestion_service.pipeline_fingerprint(False)
+    encoded = ingestion.model.encoded
+
+    monkeypatch.setattr(ingestion_service, "CHUNKER_VERSION", ingestion_service.CHUNKER_VERSION + 1)
+    new_fingerprint = ingestion_service.pipeline_fingerprint(False)
+    assert new_fingerprint != old_fingerprint
+    assert ingestion.manifest.file_hashes(new_fingerprint) == {}
+
+    stats = ingestion.run(files)
+    assert stats["documents_unchanged"] == 0
+    assert stats["points_upserted"] == 2 and stats["points_deleted"] == 0
+    # Mismos textos: los embeddings salen del manifiesto.
+    assert stats["embeddings_reused"] == 2 and ingestion.model.encoded == encoded
+    assert set(ingestion.manifest.file_hashes(new_fingerprint)) == {"a.pdf"}
+    assert ingestion.manifest.file_hashes(old_fingerprint) == {}
+
+    assert ingestion.run(files)["documents_unchanged"] == 1
+
+
+def test_failed_flush_records_nothing(ingestion, monkeypatch):
+    def fail():
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(ingestion.store, "flush", fail)
+    with pytest.raises(RuntimeError):
+        ingestion.run({"a.pdf": _law((1, "v1"))})
+    assert ingestion.manifest.file_hashes(ingestion_service.pipeline_fingerprint(False)) == {}
+
+
+def test_manifest_without_fingerprint_column_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "COLLECTION_NAME", "pruebas")
+    path = str(tmp_path / "manifest.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE files (collection TEXT, filename TEXT, content_hash TEXT, point_ids TEXT,"
+            " updated_at REAL, PRIMARY KEY (collection, filename))"
+        )
+        conn.execute("INSERT INTO files VALUES ('pruebas', 'a.pdf', 'hash', '[\"id\"]', 0)")
+
+    manifest = IngestionManifest(path=path, model_name="modelo-falso")
+    # Sin huella registrada, el archivo se vuelve a procesar una vez.
+    assert manifest.file_hashes("huella") == {}
+    assert manifest.file_point_ids("a.pdf") == ["id"]
+    manifest.record_file("a.pdf", "hash", "huella", ["id"])
+    assert manifest.file_hashes("huella") == {"a.pdf": "hash"}
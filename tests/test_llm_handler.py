@@ -0,0 +1,37 @@
+# tests/test_llm_handler.py
+import asyncio
+
+import llm_handler
+from llm_handler import ConcurrencyLimitedLLM, OllamaLLM, StreamError
+
+
+class _BrokenStreamClient:
+    """Cliente de Ollama falso: entrega un fragmento y después se corta la conexión."""
+    async def chat(self, **request):
+        async def parts():
+            yield {"message": {"content": "Según el artículo 5"}}
+            raise ConnectionError("conexión cerrada")
+        return parts()
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_failure_ends_with_stream_error():
+    llm = OllamaLLM(model="modelo")
+    llm.async_client = _BrokenStreamClient()
+
+    chunks = asyncio.run(_collect(ConcurrencyLimitedLLM(llm, 1).generate_stream("pregunta")))
+    assert chunks[0] == "Según el artículo 5"
+    assert not isinstance(chunks[0], StreamError)
+    assert isinstance(chunks[-1], StreamError) and len(chunks) == 2
+
+
+def test_answer_stream_without_provider_ends_with_stream_error(monkeypatch):
+    def fail():
+        raise ValueError("sin proveedor")
+
+    monkeypatch.setattr(llm_handler, "get_llm_instance", fail)
+    chunks = asyncio.run(_collect(llm_handler.generate_answer_stream("prompt")))
+    assert len(chunks) == 1 and isinstance(chunks[0], StreamError)
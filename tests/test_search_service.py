@@ -0,0 +1,56 @@
+# tests/test_search_service.py
+import asyncio
+
+import pytest
+
+from services import search_service
+from vector_store import NumpyVectorStore
+
+
+class _FakeStats:
+    async def points_count(self):
+        return 3
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = NumpyVectorStore(directory=str(tmp_path), ivf_min_points=0, ivf_nprobe=1)
+    store.upsert([
+        {"id": "a", "vector": [1.0, 0.0], "payload": {"numero_normalizado": "7125", "articulo": "1", "texto": "uno"}},
+        {"id": "b", "vector": [0.8, 0.2], "payload": {"numero_normalizado": "7125", "articulo": "2", "texto": "dos"}},
+        {"id": "c", "vector": [0.0, 1.0], "payload": {"numero_normalizado": "6611", "articulo": "1", "texto": "tres"}},
+    ])
+    batches = []
+    search_batch = store.search_batch
+
+    async def recording_search_batch(requests):
+        batches.append([request["conditions"] for request in requests])
+        return await search_batch(requests)
+
+    monkeypatch.setattr(store, "search_batch", recording_search_batch)
+    store.batches = batches
+
+    async def embed_query(query):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(search_service, "vector_store", store)
+    monkeypatch.setattr(search_service, "collection_stats", _FakeStats())
+    monkeypatch.setattr(search_service, "embed_query", embed_query)
+    return store
+
+
+def test_filtered_hits_skip_the_global_search(store):
+    results = asyncio.run(search_service.perform_similarity_search("¿Qué dice la Ley 7125?", 5))
+    assert results["documents"] == [["uno", "dos"]]
+    assert store.batches == [[{"numero_normalizado": "7125"}]]
+
+
+def test_filtered_miss_falls_back_to_global_search(store):
+    results = asyncio.run(search_service.perform_similarity_search("¿Qué dice la Ley 9999?", 5))
+    assert results["documents"] == [["uno", "dos", "tres"]]
+    assert store.batches == [[{"numero_normalizado": "9999"}], [{}]]
+
+
+def test_query_without_filters_runs_one_global_search(store):
+    asyncio.run(search_service.perform_similarity_search("hola", 2))
+    assert store.batches == [[{}]]
@@ -0,0 +1,170 @@
+# tests/test_vector_store.py
+import asyncio
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from vector_store import NumpyVectorStore
+
+
+def _store(directory, ivf_min_points=0, ivf_nprobe=2):
+    return NumpyVectorStore(directory=str(directory), ivf_min_points=ivf_min_points, ivf_nprobe=ivf_nprobe)
+
+def _point(point_id, vector, **payload):
+    return {"id": point_id, "vector": vector, "payload": payload}
+
+def _request(vector, conditions=None, limit=3, payload_fields=None):
+    return {"vector": vector, "sparse": None, "conditions": conditions or {}, "limit": limit, "payload_fields": payload_fields}
+
+def _search(store, *args, **kwargs):
+    (hits,) = store.search_batch_sync([_request(*args, **kwargs)])
+    return hits
+
+def _sample_points():
+    return [
+        _point("a", [1.0, 0.0, 0.0], articulo="1", nombre_archivo="ley.pdf", texto="uno"),
+        _point("b", [0.9, 0.1, 0.0], articulo="2", nombre_archivo="ley.pdf", texto="dos"),
+        _point("c", [0.0, 1.0, 0.0], articulo="1", nombre_archivo="decreto.pdf", texto="tres"),
+        _point("d", [0.0, 0.0, 1.0], subtema="DGR", tipo_documento="Contexto", texto="cuatro"),
+    ]
+
+
+def test_upsert_and_search(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+
+    hits = _search(store, [1.0, 0.0, 0.0])
+    assert [hit.id for hit in hits] == ["a", "b", "c"]
+    assert hits[0].score == pytest.approx(1.0)
+    assert hits[0].payload["texto"] == "uno"
+
+    # Mismo id: se reemplaza el punto, no se agrega otro.
+    store.upsert([_point("a", [0.0, 1.0, 0.0], articulo="1", nombre_archivo="ley.pdf", texto="uno bis")])
+    assert store.describe_sync()["points_count"] == 4
+    assert _search(store, [1.0, 0.0, 0.0], limit=1)[0].id == "b"
+    assert {hit.payload["texto"] for hit in _search(store, [0.0, 1.0, 0.0], limit=2)} == {"uno bis", "tres"}
+
+
+def test_filter_bitmaps(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+
+    hits = _search(store, [1.0, 0.0, 0.0], conditions={"articulo": "1"})
+    assert [hit.id for hit in hits] == ["a", "c"]
+    hits = _search(store, [1.0, 0.0, 0.0], conditions={"articulo": "1", "nombre_archivo": "decreto.pdf"})
+    assert [hit.id for hit in hits] == ["c"]
+    assert _search(store, [1.0, 0.0, 0.0], conditions={"articulo": "99"}) == []
+
+    # Campo sin bitmap: se filtra recorriendo los payloads.
+    hits = _search(store, [1.0, 0.0, 0.0], conditions={"texto": "cuatro"})
+    assert [hit.id for hit in hits] == ["d"]
+
+    records = store.lookup_sync({"subtema": "DGR", "tipo_documento": "Contexto"}, limit=10, payload_fields=["subtema"])
+    assert [(record.id, record.score, record.payload) for record in records] == [("d", None, {"subtema": "DGR"})]
+
+
+def test_delete(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+    store.delete(["a", "missing"])
+
+    assert store.describe_sync()["points_count"] == 3
+    assert "a" not in [hit.id for hit in _search(store, [1.0, 0.0, 0.0], limit=10)]
+    assert [hit.id for hit in _search(store, [1.0, 0.0, 0.0], conditions={"articulo": "1"})] == ["c"]
+
+    # Un id borrado se puede volver a agregar.
+    store.upsert([_point("a", [1.0, 0.0, 0.0], articulo="1")])
+    assert _search(store, [1.0, 0.0, 0.0], limit=1)[0].id == "a"
+
+
+def test_reload_after_flush(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+    store.delete(["b"])
+    store.flush()
+
+    reloaded = _store(tmp_path)
+    assert reloaded.describe_sync()["points_count"] == 3
+    hits = _search(reloaded, [1.0, 0.0, 0.0], conditions={"articulo": "1"}, payload_fields=["articulo"])
+    assert [(hit.id, hit.payload) for hit in hits] == [("a", {"articulo": "1"}), ("c", {"articulo": "1"})]
+
+    # Los cambios sobre un almacén cargado con mmap se guardan en una versión nueva.
+    reloaded.upsert([_point("e", [0.5, 0.5, 0.0], articulo="3")])
+    reloaded.flush()
+    versions = [entry for entry in os.listdir(tmp_path) if entry != "CURRENT"]
+    assert len(versions) == 1
+    assert _store(tmp_path).describe_sync()["points_count"] == 4
+
+
+def test_unflushed_changes_are_not_persisted(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+    store.flush()
+    store.delete(["a", "b"])
+
+    assert _store(tmp_path).describe_sync()["points_count"] == 4
+
+
+def test_load_rejects_mismatched_rows(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+    store.flush()
+    with open(tmp_path / "CURRENT", encoding="utf-8") as f:
+        version = tmp_path / f.read().strip()
+    with open(version / "points.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "extra", "payload": {}}) + "\n")
+
+    with pytest.raises(ValueError):
+        _store(tmp_path).describe_sync()
+
+
+def test_setup_rejects_other_dimension(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+    with pytest.raises(ValueError):
+        asyncio.run(store.setup(8))
+
+
+def test_ivf(tmp_path):
+    rng = np.random.default_rng(1)
+    centers = np.eye(8, dtype=np.float32)
+    points = []
+    for i in range(400):
+        vector = centers[i % 8] + rng.normal(scale=0.05, size=8)
+        points.append(_point(f"p{i}", vector.tolist(), nombre_archivo=f"doc{i % 8}.pdf"))
+    store = _store(tmp_path, ivf_min_points=100, ivf_nprobe=2)
+    store.upsert(points)
+
+    for cluster in range(8):
+        hits = _search(store, centers[cluster].tolist(), limit=5)
+        assert len(hits) == 5
+        assert all(int(hit.id[1:]) % 8 == cluster for hit in hits)
+    assert store.settings()["ivf_lists"] == 20
+
+    # Los puntos nuevos se asignan a una lista del índice ya entrenado.
+    store.upsert([_point("new", centers[3].tolist(), nombre_archivo="doc3.pdf")])
+    assert _search(store, centers[3].tolist(), limit=1)[0].id == "new"
+
+    # Con filtro la búsqueda es exacta, sin IVF.
+    hits = _search(store, centers[0].tolist(), conditions={"nombre_archivo": "doc5.pdf"}, limit=3)
+    assert all(hit.payload["nombre_archivo"] == "doc5.pdf" for hit in hits)
+
+
+def test_describe_runs_off_the_event_loop(tmp_path):
+    store = _store(tmp_path)
+    store.upsert(_sample_points())
+
+    async def main():
+        loop_thread = threading.get_ident()
+        calls = []
+        describe_sync = store.describe_sync
+        store.describe_sync = lambda: calls.append(threading.get_ident()) or describe_sync()
+        stats = await store.describe()
+        return stats, calls[0] != loop_thread
+
+    stats, off_loop = asyncio.run(main())
+    assert stats["points_count"] == 4
+    assert off_loop
@@ -1,33 +1,227 @@
 # vector_db.py
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+import threading
+from typing import Any, Dict, Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from batching import MicroBatcher
 import config
 
-print("Cargando el modelo de embeddings. Esto puede tardar unos momentos...")
-# El modelo de embeddings no cambia, es independiente de la base de datos
-embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
-vector_size = embedding_model.get_sentence_embedding_dimension()
-print("✅ Modelo de embeddings cargado.")
-
-# Inicializa el cliente de Qdrant. Asume que Qdrant corre localmente.
-# Puedes mover host y port a tu archivo config.py
-client = QdrantClient(host="localhost", port=6333)
-
-# Verifica si la colección ya existe. Si no, la crea.
-try:
-    collection_info = client.get_collection(collection_name=config.COLLECTION_NAME)
-    print(f"✅ Colección '{config.COLLECTION_NAME}' ya existe.")
-except Exception:
-    print(f"Creando colección '{config.COLLECTION_NAME}'...")
-    client.create_collection(
-        collection_name=config.COLLECTION_NAME,
-        vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
-    )
-    print(f"✅ Colección '{config.COLLECTION_NAME}' creada exitosamente.")
-
-# Opcional: Para obtener el conteo de documentos al iniciar
-try:
-    count = client.get_collection(collection_name=config.COLLECTION_NAME).points_count
-    print(f"La colección tiene actualmente {count} puntos/documentos.")
-except Exception as e:
-    print(f"No se pudo obtener el conteo de la colección: {e}")
\ No newline at end of file
+# El modelo de embeddings se carga de forma diferida (ver get_embedding_model),
+# así importar este módulo no cuesta decenas de segundos.
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """
+    Devuelve el modelo de embeddings, cargándolo la primera vez.
+    Es seguro llamarlo desde varios hilos: el modelo se carga una sola vez.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                # Import diferido: sentence_transformers arrastra torch.
+                from sentence_transformers import SentenceTransformer
+
+                print("Cargando el modelo de embeddings. Esto puede tardar unos momentos...")
+                # El modelo de embeddings no cambia, es independiente de la base de datos
+                _embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
+                print("✅ Modelo de embeddings cargado.")
+    return _embedding_model
+
+def is_embedding_model_loaded() -> bool:
+    return _embedding_model is not None
+
+# Agrupa las consultas concurrentes en un único `encode` por lote.
+# Las búsquedas lo usan con `await embedding_batcher.submit(texto)`.
+embedding_batcher = MicroBatcher(
+    name="embeddings",
+    batch_fn=lambda texts: get_embedding_model().encode(texts, batch_size=len(texts)),
+    max_batch_size=config.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=config.EMBEDDING_BATCH_MAX_WAIT_MS,
+)
+
+# Inicializa los clientes de Qdrant con el host y puerto definidos en config.py.
+# Los usa el backend Qdrant de vector_store.py (VECTOR_STORE_BACKEND=qdrant).
+# Crearlos no abre conexiones; la colección se prepara en el lifespan de la app.
+# El cliente síncrono se usa en la ingesta (que corre en hilos aparte);
+# el asíncrono en los endpoints, para no bloquear el event loop.
+client = QdrantClient(host=config.QDRANT_HOST, port=config.QDRANT_PORT)
+async_client = AsyncQdrantClient(host=config.QDRANT_HOST, port=config.QDRANT_PORT)
+
+# Campos del payload por los que se filtra en las búsquedas. Sin índice,
+# Qdrant tiene que recorrer los payloads de los puntos para aplicar el filtro.
+PAYLOAD_INDEXES = {
+    "numero_normalizado": models.PayloadSchemaType.KEYWORD,
+    "articulo": models.PayloadSchemaType.KEYWORD,
+    "tipo_documento": models.PayloadSchemaType.KEYWORD,
+    "subtema": models.PayloadSchemaType.KEYWORD,
+    "nombre_archivo": models.PayloadSchemaType.KEYWORD,
+}
+
+async def ensure_payload_indexes(collection_info: models.CollectionInfo):
+    """Crea los índices de payload que falten (también en colecciones ya existentes)."""
+    existing = collection_info.payload_schema or {}
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        print(f"Creando índice de payload '{field_name}'...")
+        await async_client.create_payload_index(
+            collection_name=config.COLLECTION_NAME,
+            field_name=field_name,
+            field_schema=schema,
+            wait=True,
+        )
+
+# --- ALMACENAMIENTO E ÍNDICE HNSW ---
+# Cuantización, parámetros HNSW y almacenamiento en disco, según config.py.
+def quantization_config():
+    if config.QDRANT_QUANTIZATION == "int8":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=config.QDRANT_QUANTIZATION_QUANTILE,
+            always_ram=config.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if config.QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=config.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    return None
+
+def _quantization_settings(quantization) -> Optional[tuple]:
+    """Lo que define una cuantización (tipo y parámetros), para comparar la actual con la deseada."""
+    if quantization is None:
+        return None
+    if isinstance(quantization, models.ScalarQuantization):
+        scalar = quantization.scalar
+        return ("int8", scalar.quantile, bool(scalar.always_ram))
+    if isinstance(quantization, models.BinaryQuantization):
+        return ("binary", bool(quantization.binary.always_ram))
+    return (type(quantization).__name__,)
+
+def hnsw_config() -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(m=config.QDRANT_HNSW_M, ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT)
+
+def search_params() -> Optional[models.SearchParams]:
+    """Parámetros de búsqueda densa: `hnsw_ef` y re-puntuación de los vectores cuantizados."""
+    quantization = None
+    if quantization_config() is not None:
+        quantization = models.QuantizationSearchParams(
+            rescore=config.QDRANT_RESCORE, oversampling=config.QDRANT_OVERSAMPLING,
+        )
+    if not config.QDRANT_HNSW_EF and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=config.QDRANT_HNSW_EF or None, quantization=quantization)
+
+async def migrate_collection_config(collection_info: models.CollectionInfo):
+    """
+    Aplica a una colección existente la configuración de config.py (cuantización,
+    HNSW, vectores y payload en disco). Qdrant reconstruye los índices en segundo plano.
+    """
+    params = collection_info.config.params
+    current_hnsw = collection_info.config.hnsw_config
+    current_quantization = collection_info.config.quantization_config
+    changes = {}
+
+    dense = params.vectors if isinstance(params.vectors, models.VectorParams) else None
+    if dense is not None and bool(dense.on_disk) != config.QDRANT_VECTORS_ON_DISK:
+        changes["vectors_config"] = {"": models.VectorParamsDiff(on_disk=config.QDRANT_VECTORS_ON_DISK)}
+    if bool(params.on_disk_payload) != config.QDRANT_PAYLOAD_ON_DISK:
+        changes["collection_params"] = models.CollectionParamsDiff(on_disk_payload=config.QDRANT_PAYLOAD_ON_DISK)
+    if (current_hnsw.m, current_hnsw.ef_construct) != (config.QDRANT_HNSW_M, config.QDRANT_HNSW_EF_CONSTRUCT):
+        changes["hnsw_config"] = hnsw_config()
+
+    desired_quantization = quantization_config()
+    if desired_quantization is None and current_quantization is not None:
+        changes["quantization_config"] = models.Disabled.DISABLED
+    elif desired_quantization is not None and (
+        _quantization_settings(current_quantization) != _quantization_settings(desired_quantization)
+    ):
+        changes["quantization_config"] = desired_quantization
+
+    if changes:
+        print(f"🔧 Actualizando la configuración de la colección: {', '.join(changes)}.")
+        await async_client.update_collection(collection_name=config.COLLECTION_NAME, **changes)
+
+def estimate_memory(points: int) -> Dict[str, Any]:
+    """
+    Estimación aproximada de la RAM que ocupan los vectores densos y el grafo HNSW,
+    para `points` puntos y para un millón. No incluye payloads ni vectores dispersos.
+    """
+    dimension = get_embedding_model().get_sentence_embedding_dimension() if is_embedding_model_loaded() else None
+
+    def estimate(count: int) -> Optional[Dict[str, int]]:
+        if dimension is None:
+            return None
+        original = 0 if config.QDRANT_VECTORS_ON_DISK else count * dimension * 4
+        quantized = {"int8": count * dimension, "binary": count * dimension // 8}.get(config.QDRANT_QUANTIZATION, 0)
+        if not config.QDRANT_QUANTIZATION_ALWAYS_RAM:
+            quantized = 0
+        # Capa 0 del grafo: hasta 2*m enlaces de 4 bytes por punto (las capas superiores son despreciables).
+        hnsw = count * config.QDRANT_HNSW_M * 2 * 4
+        return {
+            "vectors_bytes": original,
+            "quantized_bytes": quantized,
+            "hnsw_bytes": hnsw,
+            "total_mb": round((original + quantized + hnsw) / 1024 / 1024, 1),
+        }
+
+    return {
+        "dimension": dimension,
+        "points": points,
+        "current": estimate(points),
+        "per_million_points": estimate(1_000_000),
+    }
+
+# --- BÚSQUEDA HÍBRIDA ---
+# Los puntos guardan, junto al vector denso (sin nombre), un vector disperso BM25
+# con este nombre. Qdrant le aplica el IDF (modificador IDF de la colección).
+SPARSE_VECTOR_NAME = "bm25"
+
+# Se activa recién en setup_collection, cuando la colección confirma que tiene
+# vectores dispersos BM25. Hasta entonces (o si falló la preparación) la búsqueda
+# y los upserts son solo densos: una colección creada sin vectores dispersos no puede agregarlos.
+_hybrid_enabled = False
+
+def is_hybrid_enabled() -> bool:
+    return _hybrid_enabled
+
+async def setup_collection(vector_size: int):
+    """Verifica si la colección ya existe. Si no, la crea. Luego asegura sus índices de payload."""
+    global _hybrid_enabled
+    if await async_client.collection_exists(collection_name=config.COLLECTION_NAME):
+        print(f"✅ Colección '{config.COLLECTION_NAME}' ya existe.")
+    else:
+        print(f"Creando colección '{config.COLLECTION_NAME}'...")
+        await async_client.create_collection(
+            collection_name=config.COLLECTION_NAME,
+            vectors_config=models.VectorParams(
+                size=vector_size, distance=models.Distance.COSINE, on_disk=config.QDRANT_VECTORS_ON_DISK,
+            ),
+            hnsw_config=hnsw_config(),
+            quantization_config=quantization_config(),
+            on_disk_payload=config.QDRANT_PAYLOAD_ON_DISK,
+            sparse_vectors_config={
+                SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF),
+            } if config.HYBRID_SEARCH else None,
+        )
+        print(f"✅ Colección '{config.COLLECTION_NAME}' creada exitosamente.")
+
+    collection_info = await async_client.get_collection(collection_name=config.COLLECTION_NAME)
+    has_sparse = SPARSE_VECTOR_NAME in (collection_info.config.params.sparse_vectors or {})
+    _hybrid_enabled = config.HYBRID_SEARCH and has_sparse
+    if config.HYBRID_SEARCH and not has_sparse:
+        print(
+            f"⚠️ La colección no tiene vectores dispersos '{SPARSE_VECTOR_NAME}': se usa solo búsqueda densa. "
+            "Para activar la búsqueda híbrida hay que recrear la colección y volver a cargar los documentos."
+        )
+
+    await migrate_collection_config(collection_info)
+    await ensure_payload_indexes(collection_info)
+
+async def is_qdrant_reachable() -> bool:
+    """Comprueba que Qdrant responde."""
+    try:
+        await async_client.get_collections()
+        return True
+    except Exception:
+        return False
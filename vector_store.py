@@ -0,0 +1,674 @@
+# vector_store.py
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from qdrant_client import models
+
+import config
+import vector_db
+from model_executor import run_in_model_executor
+
+
+class SearchHit(NamedTuple):
+    """Un punto devuelto por el almacén: id, puntaje (None en búsquedas por metadatos) y payload."""
+    id: str
+    score: Optional[float]
+    payload: Dict[str, Any]
+
+
+# Una consulta vectorial, igual para todos los backends:
+# {"vector": [...], "sparse": (indices, valores) o None, "conditions": {campo: valor},
+#  "limit": n, "payload_fields": [...] o None (= todos)}
+SearchRequest = Dict[str, Any]
+
+# Un punto a guardar: {"id", "vector", "sparse" (opcional), "payload"}
+StorePoint = Dict[str, Any]
+
+
+class VectorStore(ABC):
+    """
+    Almacén de vectores usado por la búsqueda y la ingesta. Los filtros se
+    expresan como condiciones campo -> valor (ver build_metadata_conditions),
+    así cada backend los traduce a su propio formato.
+    Los métodos async los usan los endpoints; los síncronos, los hilos de ingesta.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def setup(self, vector_size: int):
+        pass
+
+    @abstractmethod
+    async def describe(self) -> Dict[str, Any]:
+        """Cantidad de puntos y estado de la colección."""
+        pass
+
+    @abstractmethod
+    def describe_sync(self) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def search_batch(self, requests: List[SearchRequest]) -> List[List[SearchHit]]:
+        pass
+
+    @abstractmethod
+    async def lookup(self, conditions: Dict[str, str], limit: int, payload_fields: Optional[List[str]]) -> List[SearchHit]:
+        """Puntos que cumplen las condiciones, sin búsqueda vectorial."""
+        pass
+
+    @abstractmethod
+    def upsert(self, points: List[StorePoint]):
+        pass
+
+    @abstractmethod
+    def delete(self, point_ids: List[str]):
+        pass
+
+    @abstractmethod
+    def settings(self) -> Dict[str, Any]:
+        """Parámetros del índice (para /stats/search)."""
+        pass
+
+    @abstractmethod
+    def estimate_memory(self, points: int) -> Dict[str, Any]:
+        """RAM aproximada del índice para `points` puntos y para un millón."""
+        pass
+
+    def flush(self):
+        """Persiste los cambios pendientes (al terminar una ingesta). Por defecto no hace nada."""
+
+    async def is_reachable(self) -> bool:
+        return True
+
+
+# --- BACKEND QDRANT ---
+class QdrantVectorStore(VectorStore):
+    """Colección de Qdrant (servidor), con búsqueda híbrida y los parámetros de vector_db.py."""
+    name = "qdrant"
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    async def setup(self, vector_size: int):
+        await vector_db.setup_collection(vector_size)
+
+    @staticmethod
+    def _from_info(info: models.CollectionInfo) -> Dict[str, Any]:
+        return {
+            "points_count": info.points_count or 0,
+            "indexed_vectors_count": info.indexed_vectors_count,
+            "status": str(info.status.value if hasattr(info.status, "value") else info.status),
+        }
+
+    async def describe(self) -> Dict[str, Any]:
+        return self._from_info(await vector_db.async_client.get_collection(collection_name=self.collection_name))
+
+    def describe_sync(self) -> Dict[str, Any]:
+        return self._from_info(vector_db.client.get_collection(collection_name=self.collection_name))
+
+    @staticmethod
+    def _filter(conditions: Dict[str, str]) -> Optional[models.Filter]:
+        """Convierte las condiciones campo -> valor en un filtro de Qdrant."""
+        if not conditions:
+            return None
+        return models.Filter(must=[
+            models.FieldCondition(key=key, match=models.MatchValue(value=value))
+            for key, value in conditions.items()
+        ])
+
+    @staticmethod
+    def _with_payload(payload_fields: Optional[List[str]]):
+        return True if payload_fields is None else payload_fields
+
+    def _query(self, request: SearchRequest) -> models.QueryRequest:
+        """
+        Arma una consulta para `query_batch_points`. Con búsqueda híbrida, los candidatos
+        de la búsqueda densa y de la dispersa (BM25) se combinan con RRF, así los términos
+        exactos ("RSP", "SIPOT") pesan aunque el embedding no los distinga.
+        """
+        qdrant_filter = self._filter(request["conditions"])
+        with_payload = self._with_payload(request["payload_fields"])
+        params = vector_db.search_params()
+        indices, values = request.get("sparse") or ([], [])
+        if not vector_db.is_hybrid_enabled() or not indices:
+            return models.QueryRequest(
+                query=request["vector"], filter=qdrant_filter, params=params,
+                limit=request["limit"], with_payload=with_payload,
+            )
+
+        prefetch_limit = max(config.HYBRID_PREFETCH_LIMIT, request["limit"])
+        return models.QueryRequest(
+            prefetch=[
+                models.Prefetch(query=request["vector"], filter=qdrant_filter, params=params, limit=prefetch_limit),
+                models.Prefetch(
+                    query=models.SparseVector(indices=indices, values=values),
+                    using=vector_db.SPARSE_VECTOR_NAME,
+                    filter=qdrant_filter,
+                    limit=prefetch_limit,
+                ),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=request["limit"],
+            with_payload=with_payload,
+        )
+
+    async def search_batch(self, requests: List[SearchRequest]) -> List[List[SearchHit]]:
+        """Todas las consultas viajan juntas en un único pedido a Qdrant."""
+        responses = await vector_db.async_client.query_batch_points(
+            collection_name=self.collection_name, requests=[self._query(request) for request in requests],
+        )
+        return [
+            [SearchHit(str(point.id), point.score, point.payload or {}) for point in response.points]
+            for response in responses
+        ]
+
+    async def lookup(self, conditions: Dict[str, str], limit: int, payload_fields: Optional[List[str]]) -> List[SearchHit]:
+        """Usa los índices de payload de la colección (ver vector_db.PAYLOAD_INDEXES)."""
+        records, _ = await vector_db.async_client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=self._filter(conditions),
+            limit=limit,
+            with_payload=self._with_payload(payload_fields),
+            with_vectors=False,
+        )
+        return [SearchHit(str(record.id), None, record.payload or {}) for record in records]
+
+    @staticmethod
+    def _vectors(point: StorePoint):
+        """Vector denso y, si la colección usa búsqueda híbrida, el disperso BM25."""
+        if not vector_db.is_hybrid_enabled() or not point.get("sparse"):
+            return point["vector"]
+        indices, values = point["sparse"]
+        return {"": point["vector"], vector_db.SPARSE_VECTOR_NAME: models.SparseVector(indices=indices, values=values)}
+
+    def upsert(self, points: List[StorePoint]):
+        vector_db.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                models.PointStruct(id=point["id"], vector=self._vectors(point), payload=point["payload"])
+                for point in points
+            ],
+            wait=True,
+        )
+
+    def delete(self, point_ids: List[str]):
+        vector_db.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=list(point_ids)),
+            wait=True,
+        )
+
+    async def is_reachable(self) -> bool:
+        return await vector_db.is_qdrant_reachable()
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "quantization": config.QDRANT_QUANTIZATION,
+            "quantization_always_ram": config.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            "hnsw_m": config.QDRANT_HNSW_M,
+            "hnsw_ef_construct": config.QDRANT_HNSW_EF_CONSTRUCT,
+            "hnsw_ef": config.QDRANT_HNSW_EF or None,
+            "vectors_on_disk": config.QDRANT_VECTORS_ON_DISK,
+            "payload_on_disk": config.QDRANT_PAYLOAD_ON_DISK,
+            "hybrid": vector_db.is_hybrid_enabled(),
+        }
+
+    def estimate_memory(self, points: int) -> Dict[str, Any]:
+        return vector_db.estimate_memory(points)
+
+
+# --- BACKEND LOCAL (NUMPY) ---
+class NumpyVectorStore(VectorStore):
+    """
+    Índice vectorial en el mismo proceso, para despliegues chicos: sin red ni servicio aparte.
+    - Vectores normalizados en una matriz float32; la búsqueda es exacta (producto
+      punto = coseno) o, desde `ivf_min_points` puntos, IVF: k-means sobre los vectores
+      y solo se recorren las `ivf_nprobe` listas más cercanas a la consulta.
+    - Por cada campo de `FILTER_FIELDS`, un bitmap (array booleano) por valor:
+      un filtro es el AND de los bitmaps de sus condiciones.
+    - Se persiste en `directory` al terminar cada ingesta (`flush`): cada versión es un
+      subdirectorio con `vectors.npy` y `points.jsonl`, y el archivo `CURRENT` nombra
+      la vigente; reemplazar `CURRENT` publica los dos archivos de una sola vez.
+      `vectors.npy` se abre con mmap al arrancar y se copia a RAM recién al primer cambio.
+    No usa los vectores dispersos: la búsqueda es solo densa.
+    """
+    name = "numpy"
+
+    # Campos con bitmap: los que usan build_metadata_conditions y la ingesta.
+    FILTER_FIELDS = ("numero_normalizado", "articulo", "subtema", "tipo_documento", "nombre_archivo")
+    LEGACY_FILES = ("vectors.npy", "points.jsonl")
+
+    def __init__(self, directory: str, ivf_min_points: int, ivf_nprobe: int):
+        self._directory = directory
+        self._current_path = os.path.join(directory, "CURRENT")
+        self.ivf_min_points = ivf_min_points
+        self.ivf_nprobe = ivf_nprobe
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        self._size = 0
+        # IVF: centroides y lista de cada fila (-1 = sin asignar). Se entrena en la primera búsqueda.
+        self._centroids: Optional[np.ndarray] = None
+        self._lists = np.zeros(0, dtype=np.int32)
+
+    # --- Carga y persistencia ---
+    def _current_version(self) -> Optional[str]:
+        """Directorio de la versión vigente (None si todavía no se guardó nada)."""
+        if not os.path.exists(self._current_path):
+            # Formato anterior, sin versiones: los dos archivos en `directory`.
+            legacy = [os.path.join(self._directory, name) for name in self.LEGACY_FILES]
+            return self._directory if all(os.path.exists(path) for path in legacy) else None
+        with open(self._current_path, encoding="utf-8") as f:
+            return os.path.join(self._directory, f.read().strip())
+
+    def _load(self):
+        if self._loaded:
+            return
+        version = self._current_version()
+        if version is not None:
+            vectors = np.load(os.path.join(version, "vectors.npy"), mmap_mode="r")
+            with open(os.path.join(version, "points.jsonl"), encoding="utf-8") as f:
+                points = [json.loads(line) for line in f]
+            if vectors.ndim != 2 or len(vectors) != len(points):
+                raise ValueError(
+                    f"El almacén local en '{version}' está inconsistente: {len(vectors)} vectores "
+                    f"y {len(points)} puntos. Hay que borrarlo y volver a cargar los documentos."
+                )
+            self._reset(len(points), vectors.shape[1])
+            self._vectors = vectors
+            for row, point in enumerate(points):
+                self._set_row(row, point["id"], point["payload"])
+            self._size = len(points)
+        self._loaded = True
+
+    def _reset(self, capacity: int, dimension: int):
+        self._vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self._ids = [None] * capacity
+        self._payloads = [None] * capacity
+        self._rows = {}
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._bitmaps = {field: {} for field in self.FILTER_FIELDS}
+        self._lists = np.full(capacity, -1, dtype=np.int32)
+        self._centroids = None
+        self._size = 0
+
+    def _grow(self, needed: int, dimension: int):
+        """Asegura capacidad para `needed` filas (y saca la matriz del mmap: pasa a ser escribible)."""
+        if self._vectors is None or self._vectors.shape[1] != dimension:
+            if self._size:
+                raise ValueError(f"Dimensión {dimension} distinta a la del almacén ({self._vectors.shape[1]}).")
+            self._reset(max(needed, 1024), dimension)
+        capacity = len(self._ids)
+        if needed > capacity or not self._vectors.flags.writeable:
+            capacity = max(needed, capacity * 2 if needed > capacity else capacity)
+            vectors = np.zeros((capacity, dimension), dtype=np.float32)
+            vectors[:self._size] = self._vectors[:self._size]
+            self._vectors = vectors
+            extra = capacity - len(self._ids)
+            self._ids += [None] * extra
+            self._payloads += [None] * extra
+            self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+            self._lists = np.concatenate([self._lists, np.full(extra, -1, dtype=np.int32)])
+            for values in self._bitmaps.values():
+                for value, bitmap in values.items():
+                    values[value] = np.concatenate([bitmap, np.zeros(extra, dtype=bool)])
+
+    def _set_row(self, row: int, point_id: str, payload: Dict[str, Any]):
+        self._ids[row] = point_id
+        self._payloads[row] = payload
+        self._rows[point_id] = row
+        self._alive[row] = True
+        for field in self.FILTER_FIELDS:
+            value = payload.get(field)
+            if value is None:
+                continue
+            bitmap = self._bitmaps[field].get(str(value))
+            if bitmap is None:
+                bitmap = self._bitmaps[field][str(value)] = np.zeros(len(self._alive), dtype=bool)
+            bitmap[row] = True
+
+    def _clear_row(self, row: int):
+        payload = self._payloads[row] or {}
+        for field in self.FILTER_FIELDS:
+            bitmap = self._bitmaps[field].get(str(payload.get(field)))
+            if bitmap is not None:
+                bitmap[row] = False
+        del self._rows[self._ids[row]]
+        self._ids[row] = None
+        self._payloads[row] = None
+        self._alive[row] = False
+
+    def flush(self):
+        """
+        Guarda las filas vivas (compactadas) en un directorio de versión nuevo y lo
+        publica reemplazando `CURRENT`. Si el proceso se corta antes, sigue vigente
+        la versión anterior completa: vectores y payloads nunca quedan desparejos.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            if not self._vectors.flags.writeable:
+                # Se suelta el mmap antes de borrar la versión anterior (en Windows no se puede si está mapeado).
+                self._vectors = np.array(self._vectors)
+            rows = np.flatnonzero(self._alive[:self._size])
+            os.makedirs(self._directory, exist_ok=True)
+            name = f"v{time.time_ns()}"
+            version = os.path.join(self._directory, name)
+            os.makedirs(version)
+            with open(os.path.join(version, "vectors.npy"), "wb") as f:
+                np.save(f, np.asarray(self._vectors[rows]))
+                f.flush()
+                os.fsync(f.fileno())
+            with open(os.path.join(version, "points.jsonl"), "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps({"id": self._ids[row], "payload": self._payloads[row]}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            current_tmp = f"{self._current_path}.tmp"
+            with open(current_tmp, "w", encoding="utf-8") as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(current_tmp, self._current_path)
+            self._dirty = False
+            # Versiones anteriores y las que hayan quedado de un flush interrumpido.
+            for entry in os.scandir(self._directory):
+                if entry.is_dir() and entry.name != name and entry.name.startswith("v") and entry.name[1:].isdigit():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                elif entry.name in self.LEGACY_FILES:
+                    os.remove(entry.path)
+
+    # --- Escritura ---
+    def upsert(self, points: List[StorePoint]):
+        if not points:
+            return
+        vectors = np.asarray([point["vector"] for point in points], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._load()
+            self._grow(self._size + len(points), vectors.shape[1])
+            for point, vector in zip(points, vectors):
+                point_id = str(point["id"])
+                row = self._rows.get(point_id)
+                if row is not None:
+                    self._clear_row(row)
+                else:
+                    row = self._size
+                    self._size += 1
+                self._vectors[row] = vector
+                self._set_row(row, point_id, point["payload"])
+                if self._centroids is not None:
+                    self._lists[row] = int(np.argmax(self._centroids @ vector))
+            self._dirty = True
+
+    def delete(self, point_ids: List[str]):
+        with self._lock:
+            self._load()
+            for point_id in point_ids:
+                row = self._rows.get(str(point_id))
+                if row is not None:
+                    self._clear_row(row)
+                    self._dirty = True
+
+    # --- Lectura ---
+    def _mask(self, conditions: Dict[str, str]) -> np.ndarray:
+        """Filas vivas que cumplen todas las condiciones."""
+        mask = self._alive[:self._size].copy()
+        for field, value in conditions.items():
+            if field in self._bitmaps:
+                bitmap = self._bitmaps[field].get(str(value))
+                if bitmap is None:
+                    return np.zeros(self._size, dtype=bool)
+                mask &= bitmap[:self._size]
+            else:
+                # Campo sin bitmap: se recorre el payload.
+                mask &= np.fromiter(
+                    ((self._payloads[row] or {}).get(field) == value for row in range(self._size)),
+                    dtype=bool, count=self._size,
+                )
+        return mask
+
+    def _hit(self, row: int, score: Optional[float], payload_fields: Optional[List[str]]) -> SearchHit:
+        payload = self._payloads[row]
+        if payload_fields is not None:
+            payload = {key: payload[key] for key in payload_fields if key in payload}
+        return SearchHit(self._ids[row], score, payload)
+
+    def _train_ivf(self):
+        """k-means (pocas iteraciones) sobre una muestra de los vectores vivos."""
+        rows = np.flatnonzero(self._alive[:self._size])
+        list_count = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        sample = self._vectors[rng.choice(rows, size=min(len(rows), list_count * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=list_count, replace=False)]
+        for _ in range(10):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(list_count):
+                members = sample[assignment == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1)
+        self._centroids = centroids
+        self._lists[:self._size] = -1
+        self._lists[rows] = np.argmax(self._vectors[rows] @ centroids.T, axis=1)
+        print(f"🧭 Índice IVF local entrenado: {list_count} listas para {len(rows)} puntos.")
+
+    def _search(self, request: SearchRequest) -> List[SearchHit]:
+        query = np.asarray(request["vector"], dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        mask = self._mask(request["conditions"])
+        use_ivf = self.ivf_min_points and int(self._alive[:self._size].sum()) >= self.ivf_min_points
+        if use_ivf and not request["conditions"]:
+            # Con filtro, los candidatos ya son pocos: se recorren todos (búsqueda exacta).
+            if self._centroids is None:
+                self._train_ivf()
+            probes = np.argsort(-(self._centroids @ query))[:self.ivf_nprobe]
+            mask &= np.isin(self._lists[:self._size], probes)
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+        scores = self._vectors[rows] @ query
+        limit = min(request["limit"], len(rows))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [self._hit(rows[i], float(scores[i]), request["payload_fields"]) for i in top]
+
+    def search_batch_sync(self, requests: List[SearchRequest]) -> List[List[SearchHit]]:
+        with self._lock:
+            self._load()
+            return [self._search(request) for request in requests]
+
+    def lookup_sync(self, conditions: Dict[str, str], limit: int, payload_fields: Optional[List[str]]) -> List[SearchHit]:
+        with self._lock:
+            self._load()
+            rows = np.flatnonzero(self._mask(conditions))[:limit]
+            return [self._hit(row, None, payload_fields) for row in rows]
+
+    async def search_batch(self, requests: List[SearchRequest]) -> List[List[SearchHit]]:
+        # Trabajo de CPU: corre en el pool de modelos para no bloquear el event loop.
+        return await run_in_model_executor(self.search_batch_sync, requests)
+
+    async def lookup(self, conditions: Dict[str, str], limit: int, payload_fields: Optional[List[str]]) -> List[SearchHit]:
+        return await run_in_model_executor(self.lookup_sync, conditions, limit, payload_fields)
+
+    async def setup(self, vector_size: int):
+        with self._lock:
+            self._load()
+            dimension = self._vectors.shape[1] if self._vectors is not None and self._size else vector_size
+        if dimension != vector_size:
+            raise ValueError(
+                f"El almacén local tiene vectores de dimensión {dimension} y el modelo produce {vector_size}: "
+                f"hay que borrar '{self._directory}' y volver a cargar los documentos."
+            )
+        print(f"✅ Almacén vectorial local en '{self._directory}'.")
+
+    def describe_sync(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            points = int(self._alive[:self._size].sum())
+            return {
+                "points_count": points,
+                "indexed_vectors_count": points if self._centroids is not None else 0,
+                "status": "green",
+            }
+
+    async def describe(self) -> Dict[str, Any]:
+        # Puede leer los archivos y espera el mismo lock que la ingesta: fuera del event loop.
+        return await run_in_model_executor(self.describe_sync)
+
+    def settings(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self._directory,
+                "ivf_min_points": self.ivf_min_points or None,
+                "ivf_nprobe": self.ivf_nprobe,
+                "ivf_lists": len(self._centroids) if self._centroids is not None else None,
+                "filter_fields": list(self.FILTER_FIELDS),
+            }
+
+    def estimate_memory(self, points: int) -> Dict[str, Any]:
+        """
+        Matriz float32 de vectores, un byte por fila en cada bitmap de filtro y, con IVF,
+        la lista de cada fila y los centroides. No incluye payloads.
+        """
+        with self._lock:
+            self._load()
+            dimension = self._vectors.shape[1] if self._vectors is not None and self._size else None
+            bitmaps = sum(len(values) for values in self._bitmaps.values())
+        if dimension is None and vector_db.is_embedding_model_loaded():
+            dimension = vector_db.get_embedding_model().get_sentence_embedding_dimension()
+
+        def estimate(count: int) -> Optional[Dict[str, int]]:
+            if dimension is None:
+                return None
+            vectors = count * dimension * 4
+            filters = count * bitmaps
+            ivf = 0
+            if self.ivf_min_points and count >= self.ivf_min_points:
+                ivf = count * 4 + int(np.sqrt(count)) * dimension * 4
+            return {
+                "vectors_bytes": vectors,
+                "bitmaps_bytes": filters,
+                "ivf_bytes": ivf,
+                "total_mb": round((vectors + filters + ivf) / 1024 / 1024, 1),
+            }
+
+        return {
+            "dimension": dimension,
+            "points": points,
+            "bitmaps": bitmaps,
+            "current": estimate(points),
+            "per_million_points": estimate(1_000_000),
+        }
+
+
+def create_vector_store() -> VectorStore:
+    if config.VECTOR_STORE_BACKEND == NumpyVectorStore.name:
+        return NumpyVectorStore(
+            directory=config.LOCAL_VECTOR_STORE_DIR,
+            ivf_min_points=config.LOCAL_VECTOR_STORE_IVF_MIN_POINTS,
+            ivf_nprobe=config.LOCAL_VECTOR_STORE_IVF_NPROBE,
+        )
+    return QdrantVectorStore(collection_name=config.COLLECTION_NAME)
+
+vector_store = create_vector_store()
+
+
+class CollectionStats:
+    """
+    Caché de los datos de la colección (cantidad de puntos, estado), para no
+    consultar al almacén en cada búsqueda solo para saber si está vacío.
+    Se refresca en segundo plano cada `refresh_seconds` y la ingesta la
+    invalida al modificar la colección; la siguiente lectura vuelve a consultar.
+    """
+    def __init__(self, store: VectorStore, refresh_seconds: float):
+        self._store = store
+        self._refresh_seconds = refresh_seconds
+        self._stats: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refreshes = 0
+        self._invalidations = 0
+
+    def _update(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        self._stats = {**stats, "refreshed_at": time.time()}
+        self._refreshes += 1
+        return self._stats
+
+    async def refresh(self) -> Dict[str, Any]:
+        return self._update(await self._store.describe())
+
+    def refresh_sync(self) -> Dict[str, Any]:
+        """Igual que `refresh`, en forma síncrona (para los hilos de ingesta)."""
+        return self._update(self._store.describe_sync())
+
+    async def get(self) -> Dict[str, Any]:
+        """Datos de la colección; solo consulta al almacén si no hay datos vigentes."""
+        stats = self._stats
+        return stats if stats is not None else await self.refresh()
+
+    async def points_count(self) -> int:
+        count = (await self.get())["points_count"]
+        if count == 0:
+            # Una colección vacía no es el caso frecuente: se confirma con el almacén
+            # para no rechazar búsquedas hasta el próximo refresco si ya se cargaron datos.
+            count = (await self.refresh())["points_count"]
+        return count
+
+    def invalidate(self):
+        """La colección cambió (ingesta): la próxima lectura consulta al almacén."""
+        self._stats = None
+        self._invalidations += 1
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="collection-stats")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Si el almacén no responde se conservan los últimos datos.
+                print(f"⚠️ No se pudieron refrescar los datos de la colección: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self._store.name,
+            "collection": self._stats,
+            "refresh_seconds": self._refresh_seconds,
+            "refreshes": self._refreshes,
+            "invalidations": self._invalidations,
+        }
+
+collection_stats = CollectionStats(store=vector_store, refresh_seconds=config.COLLECTION_STATS_REFRESH_SECONDS)
+
+
+async def setup_vector_store(vector_size: int):
+    """Prepara el almacén y deja en caché la cantidad de puntos."""
+    await vector_store.setup(vector_size)
+    try:
+        count = (await collection_stats.refresh())["points_count"]
+        print(f"La colección tiene actualmente {count} puntos/documentos.")
+    except Exception as e:
+        print(f"No se pudo obtener el conteo de la colección: {e}")